@@ -200,6 +200,7 @@ if __debug__:
     debug.register('DG',   "Data generators")
     debug.register('LAZY', "Miscelaneous 'lazy' evaluations")
     debug.register('LOOP', "Support's loop construct")
+    debug.register('PARALLEL', "Threaded parallel_map")
     debug.register('PLR',  "PLR call")
     debug.register('NBH',  "Neighborhood estimations")
     debug.register('SLC',  "Searchlight call")
@@ -218,6 +219,7 @@ if __debug__:
     debug.register('DS_ID',   "ID Datasets")
     debug.register('DS_STATS',"Datasets statistics")
     debug.register('SPL',   "*Splitter")
+    debug.register('CV',    "Cross-validation")
 
     debug.register('TRAN',  "Transformers")
     debug.register('TRAN_', "Transformers (verbose)")
@@ -292,6 +294,7 @@ if __debug__:
 
     debug.register('GPR',     "GPR")
     debug.register('GPR_WEIGHTS', "Track progress of GPRWeights computation")
+    debug.register('DIST',    "Distance functions (mvpa.clfs.distance)")
     debug.register('KRN',     "Kernels module (mvpa.kernels)")
     debug.register('KRN_SG',  "Shogun kernels module (mvpa.kernels.sg)")
     debug.register('SAL',     "Samples lookup (for cached kernels)")
@@ -230,3 +230,149 @@ class Learner(Node):
     is_forcedtraining = property(fget=lambda x:x.__forced_train,
                           doc="Whether the Learner enforces training upon every"
                               "called.")
+
+
+
+class SufficientStatsLearner(object):
+    """Mixin for learners fully determined by additive sufficient statistics.
+
+    Models like GNB, LDA or ridge regression depend on the training data
+    only through statistics (e.g. per-class sums, or X^T X and X^T y),
+    which could be summed across batches of samples, and batches could be
+    subtracted again.  Such learners could be updated with new samples
+    (`partial_train`), have samples removed (`partial_untrain`), or be
+    combined with learners trained on other samples (`merge`) without
+    retraining from scratch.  Cross-validation could also make use of it
+    (see `CrossValidation`).
+
+    Derived classes must obtain statistics while training via
+    ``_get_stats()`` and store them in ``self._stats`` (``None`` if
+    untrained).  Learners which train without computing the statistics
+    could instead pass the training dataset to ``_defer_stats()``, so the
+    statistics get computed only once they are needed.  Derived classes
+    must implement:
+
+    - ``_compute_stats(ds)`` returning statistics of the samples
+    - ``_merge_stats(stats1, stats2, subtract=False)`` combining them
+    - ``_get_stats_nfeatures(stats)`` and ``_get_stats_nsamples(stats)``
+    - ``_set_estimates()`` computing the model from ``self._stats``
+    """
+
+    _stats_provider = None
+    """Optional callable to provide precomputed statistics for a dataset"""
+
+    _stats_ds = None
+    """Training dataset whose statistics were not computed yet"""
+
+    _stats_ca = ('trained_targets', 'trained_dataset', 'training_stats',
+                 'training_time')
+    """Conditional attributes describing the training data, which become
+    stale whenever statistics get updated"""
+
+    def _get_provided_stats(self, ds):
+        """Precomputed statistics of the samples, or None if not available"""
+        if self._stats_provider is None:
+            return None
+        return self._stats_provider(self, ds)
+
+
+    def _get_stats(self, ds):
+        """Statistics of the samples -- precomputed ones if available"""
+        stats = self._get_provided_stats(ds)
+        if stats is None:
+            stats = self._compute_stats(ds)
+        return stats
+
+
+    def _defer_stats(self, ds):
+        """Postpone computation of statistics of the training dataset
+
+        Only a reference to `ds` is kept, so it must not be modified
+        in-place before the statistics are needed.
+        """
+        self._stats = None
+        self._stats_ds = ds
+
+
+    def _get_trained_stats(self):
+        """Statistics of the training data (None if untrained)"""
+        if self._stats is None and self._stats_ds is not None:
+            self._stats = self._compute_stats(self._stats_ds)
+            self._stats_ds = None
+        return self._stats
+
+
+    def _set_stats_provider(self, provider):
+        """Assign a callable(learner, ds) providing statistics for `ds`
+
+        The callable might return None if it cannot provide statistics
+        for a given dataset, so they get computed as usual.
+        """
+        self._stats_provider = provider
+
+
+    def _update_stats(self, stats, subtract=False):
+        """Merge `stats` into the trained ones and recompute estimates"""
+        self._stats = self._merge_stats(self._get_trained_stats(), stats,
+                                        subtract=subtract)
+        self._set_estimates()
+        ca = self.ca
+        for key in self._stats_ca:
+            if ca.has_key(key):
+                ca.reset(key)
+        if ca.has_key('trained_nsamples'):
+            ca.trained_nsamples = self._get_stats_nsamples(self._stats)
+
+
+    def _check_nfeatures(self, nfeatures):
+        """Verify that statistics are compatible with the trained ones"""
+        trained_nfeatures = self._get_stats_nfeatures(
+                                self._get_trained_stats())
+        if trained_nfeatures != nfeatures:
+            raise ValueError, "%s was trained on %d features, got %d" \
+                  % (self, trained_nfeatures, nfeatures)
+
+
+    def partial_train(self, ds):
+        """Update the trained learner with additional samples
+
+        Resulting learner is the same as if it was trained on all the
+        samples at once.  If the learner was not trained yet, it simply
+        gets trained on `ds`.
+        """
+        if self._get_trained_stats() is None:
+            self.train(ds)
+            return
+        stats = self._compute_stats(ds)
+        self._check_nfeatures(self._get_stats_nfeatures(stats))
+        self._update_stats(stats)
+
+
+    def partial_untrain(self, ds):
+        """Remove samples the learner was trained on
+
+        Resulting learner is the same as if it was trained without the
+        samples of `ds` (e.g. without a single chunk for leave-one-chunk-out
+        cross-validation).
+        """
+        if self._get_trained_stats() is None:
+            raise RuntimeError, "%s must be trained first" % self
+        stats = self._compute_stats(ds)
+        self._check_nfeatures(self._get_stats_nfeatures(stats))
+        self._update_stats(stats, subtract=True)
+
+
+    def merge(self, other):
+        """Add the statistics of another trained learner
+
+        Allows to train learners of the same kind on independent parts of
+        the data (e.g. in parallel) and to combine them afterwards.
+        """
+        if not isinstance(other, self.__class__) \
+               or other._get_trained_stats() is None:
+            raise ValueError, "Can merge only trained %s, got %s" \
+                  % (self.__class__.__name__, other)
+        if self._get_trained_stats() is None:
+            raise RuntimeError, "%s must be trained first" % self
+        self._check_nfeatures(other._get_stats_nfeatures(other._stats))
+        self._update_stats(other._stats)
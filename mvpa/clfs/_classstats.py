@@ -0,0 +1,200 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the PyMVPA package for the
+#   copyright and license terms.
+#
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Mergeable per-class sufficient statistics. For internal use only
+
+Gaussian classifiers (GNB, LDA, QDA) are fully determined by the number of
+samples, the means and the sums of squared deviations from the means (or
+the scatter matrices) of every class.  Such statistics of two batches of
+samples can be combined exactly (and a batch can be removed again) without
+access to the samples themselves, which allows for incremental training.
+"""
+
+__docformat__ = 'restructuredtext'
+
+import numpy as np
+
+from mvpa.base.learner import SufficientStatsLearner
+
+if __debug__:
+    from mvpa.base import debug
+
+
+def get_class_stats(X, labels, full=False, dtype=np.float64):
+    """Compute per-class sufficient statistics of the samples
+
+    Parameters
+    ----------
+    X : array
+      Samples (first axis).  All other dimensions get flattened.
+    labels : array
+      Label of every sample.
+    full : bool
+      Either to compute full scatter matrices, or only the sums of
+      squared deviations per feature.
+    dtype : dtype
+      Floating point type to compute statistics in.
+
+    Returns
+    -------
+    tuple
+      (unique labels, number of samples, means, sums of squared deviations)
+      of every class.  Means are (nlabels x nfeatures), sums of squared
+      deviations are either of the same shape or (nlabels x nfeatures x
+      nfeatures) if `full`.
+    """
+    ulabels = np.unique(labels)
+    nlabels = len(ulabels)
+    label_ids = np.searchsorted(ulabels, labels)
+
+    X = np.asanyarray(X, dtype=dtype).reshape((len(X), -1))
+    if full:
+        counts = np.zeros((nlabels,), dtype=dtype)
+        means = np.zeros((nlabels, X.shape[1]), dtype=dtype)
+        sqdevs = np.zeros((nlabels, X.shape[1], X.shape[1]), dtype=dtype)
+        for il in xrange(nlabels):
+            Xl = X[label_ids == il]
+            counts[il] = len(Xl)
+            means[il] = np.mean(Xl, axis=0)
+            Xldm = Xl - means[il]
+            sqdevs[il] = np.dot(Xldm.T, Xldm)
+    else:
+        # samples sorted by label, so sums within each label are sums over
+        # contiguous ranges of rows.  This is the only copy of the samples,
+        # which gets centered and squared in place
+        Xs = X[np.argsort(label_ids, kind='mergesort')]
+        counts = np.bincount(label_ids, minlength=nlabels).astype(dtype)
+        starts = np.r_[0, np.cumsum(counts[:-1])].astype(int)
+        means = np.add.reduceat(Xs, starts, axis=0) / counts[:, None]
+        for il in xrange(nlabels):
+            Xs[starts[il]:starts[il] + int(counts[il])] -= means[il]
+        Xs *= Xs
+        sqdevs = np.add.reduceat(Xs, starts, axis=0)
+    return ulabels, counts, means, sqdevs
+
+
+def _expand_class_stats(stats, ulabels):
+    """Place statistics into arrays for (a superset of) labels `ulabels`
+    """
+    labels, counts, means, sqdevs = stats
+    ids = np.searchsorted(ulabels, labels)
+    nlabels = len(ulabels)
+    counts_ = np.zeros((nlabels,), dtype=counts.dtype)
+    means_ = np.zeros((nlabels,) + means.shape[1:], dtype=means.dtype)
+    sqdevs_ = np.zeros((nlabels,) + sqdevs.shape[1:], dtype=sqdevs.dtype)
+    counts_[ids] = counts
+    means_[ids] = means
+    sqdevs_[ids] = sqdevs
+    return counts_, means_, sqdevs_
+
+
+def merge_class_stats(stats1, stats2, subtract=False):
+    """Combine per-class statistics of two batches of samples
+
+    Parameters
+    ----------
+    stats1, stats2 : tuple
+      Statistics as returned by `get_class_stats`.
+    subtract : bool
+      If True, samples of `stats2` are removed from `stats1` (thus
+      they must be a part of them) instead of being added.  Classes
+      which are left without samples are removed.
+
+    Returns
+    -------
+    tuple
+      Statistics of the combined samples in the same format as
+      `get_class_stats` returns.
+    """
+    if stats1[2].shape[1:] != stats2[2].shape[1:]:
+        raise ValueError, "Cannot merge statistics of samples with " \
+              "different number of features (%d and %d)" \
+              % (stats1[2].shape[1], stats2[2].shape[1])
+    if subtract:
+        ulabels = stats1[0]
+        if not np.all(np.in1d(stats2[0], ulabels)):
+            raise ValueError, "Cannot remove samples of labels %s which " \
+                  "were never added" % np.setdiff1d(stats2[0], ulabels)
+    else:
+        ulabels = np.union1d(stats1[0], stats2[0])
+    n1, m1, s1 = _expand_class_stats(stats1, ulabels)
+    n2, m2, s2 = _expand_class_stats(stats2, ulabels)
+    full = s1.ndim > m1.ndim
+    # broadcast per-class factors along features
+    fshape = (-1,) + (1,) * (m1.ndim - 1)
+    sshape = (-1,) + (1,) * (s1.ndim - 1)
+
+    def outer(d):
+        if full:
+            return d[:, :, None] * d[:, None, :]
+        return d * d
+
+    if subtract:
+        n = n1 - n2
+        if np.any(n < 0):
+            raise ValueError, "Cannot remove more samples than were added"
+        keep = n > 0
+        if not np.any(keep):
+            raise ValueError, "Cannot remove all samples"
+        ulabels, n, n1, n2, m1, m2, s1, s2 = \
+            [x[keep] for x in (ulabels, n, n1, n2, m1, m2, s1, s2)]
+        m = (n1.reshape(fshape) * m1 - n2.reshape(fshape) * m2) \
+            / n.reshape(fshape)
+        s = s1 - s2 - outer(m2 - m) * (n * n2 / n1).reshape(sshape)
+        if not full:
+            s = np.maximum(s, 0)
+    else:
+        n = n1 + n2
+        d = m2 - m1
+        m = m1 + d * (n2 / n).reshape(fshape)
+        s = s1 + s2 + outer(d) * (n1 * n2 / n).reshape(sshape)
+    if __debug__:
+        debug('CLF_', "%s statistics for %d labels"
+              % (('Merged', 'Subtracted')[int(subtract)], len(ulabels)))
+    return ulabels, n, m, s
+
+
+class ClassStatsLearner(SufficientStatsLearner):
+    """Mixin for classifiers which are fully determined by per-class
+    statistics as computed by `get_class_stats`.
+
+    Derived classes must implement ``_set_estimates()`` which computes
+    all the estimates from ``self._stats``.
+    """
+
+    _full_stats = False
+    """Either full scatter matrices are necessary"""
+
+    def _get_stats_dtype(self):
+        """Floating point type to compute statistics in"""
+        return np.float64
+
+
+    def _compute_stats(self, ds):
+        return get_class_stats(ds.samples,
+                               ds.sa[self.get_space()].value,
+                               full=self._full_stats,
+                               dtype=self._get_stats_dtype())
+
+
+    def _merge_stats(self, stats1, stats2, subtract=False):
+        return merge_class_stats(stats1, stats2, subtract=subtract)
+
+
+    def _get_stats_nfeatures(self, stats):
+        return stats[2].shape[1]
+
+
+    def _get_stats_nsamples(self, stats):
+        return int(np.sum(stats[1]))
+
+
+    def _update_stats(self, stats, subtract=False):
+        super(ClassStatsLearner, self)._update_stats(stats, subtract=subtract)
+        if self.ca.is_enabled('trained_targets'):
+            self.ca.trained_targets = self._stats[0]
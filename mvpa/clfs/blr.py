@@ -14,6 +14,7 @@ __docformat__ = 'restructuredtext'
 
 import numpy as np
 
+from mvpa.base.learner import SufficientStatsLearner
 from mvpa.base.state import ConditionalAttribute
 from mvpa.clfs.base import Classifier, accepts_dataset_as_samples
 
@@ -21,9 +22,12 @@ if __debug__:
     from mvpa.misc import debug
 
 
-class BLR(Classifier):
+class BLR(SufficientStatsLearner, Classifier):
     """Bayesian Linear Regression (BLR).
 
+    Since the posterior depends on the data only through X^T X and X^T y,
+    the regression could be trained incrementally (see
+    `SufficientStatsLearner`).
     """
 
     predicted_variances = ConditionalAttribute(enabled=False,
@@ -50,6 +54,7 @@ class BLR(Classifier):
 
         # pylint happiness
         self.w = None
+        self._stats = None
 
         # It does not make sense to calculate a confusion matrix for a
         # BLR:
@@ -88,32 +93,63 @@ class BLR(Classifier):
     def _train(self, data):
         """Train regression using `data` (`Dataset`).
         """
+        self._stats = self._get_stats(data)
+        self._set_estimates()
+
+
+    def _compute_stats(self, data):
         # BLR relies on numerical labels
         train_labels = self._attrmap.to_numeric(data.sa[self.get_space()].value)
+        # add one fake column of '1.0' to model the intercept:
+        samples_train = np.hstack([data.samples,
+                                   np.ones((data.samples.shape[0], 1))])
+        return (data.nsamples,
+                np.dot(samples_train.T, samples_train),
+                np.dot(samples_train.T, train_labels))
+
+
+    def _merge_stats(self, stats1, stats2, subtract=False):
+        if subtract:
+            if stats2[0] >= stats1[0]:
+                raise ValueError, "Cannot remove all samples"
+            return tuple([s1 - s2 for s1, s2 in zip(stats1, stats2)])
+        return tuple([s1 + s2 for s1, s2 in zip(stats1, stats2)])
+
+
+    def _get_stats_nfeatures(self, stats):
+        return len(stats[1]) - 1
+
+
+    def _get_stats_nsamples(self, stats):
+        return stats[0]
+
+
+    def _set_estimates(self):
+        """Compute posterior of the weights given statistics
+        """
+        nsamples, xtx, xty = self._stats
+        # number of weights including the intercept
+        nweights = len(xtx)
         # provide a basic (i.e. identity matrix) and correct prior
         # sigma_p, if not provided before or not compliant to 'data':
-        if self.sigma_p == None: # case: not provided
-            self.sigma_p = np.eye(data.samples.shape[1]+1)
-        elif self.sigma_p.shape[1] != (data.samples.shape[1]+1): # case: wrong dimensions
-            self.sigma_p = np.eye(data.samples.shape[1]+1)
+        if self.sigma_p is None: # case: not provided
+            self.sigma_p = np.eye(nweights)
+        elif not isinstance(self.sigma_p, np.ndarray): # if sigma_p is a number...
+            self.sigma_p = np.eye(nweights)*self.sigma_p # convert in matrix
+        elif self.sigma_p.shape[1] != nweights: # case: wrong dimensions
+            self.sigma_p = np.eye(nweights)
         else:
             # ...then everything is OK :)
             pass
 
-        # add one fake column of '1.0' to model the intercept:
-        self.samples_train = np.hstack([data.samples,np.ones((data.samples.shape[0],1))])
-        if type(self.sigma_p)!=type(self.samples_train): # if sigma_p is a number...
-            self.sigma_p = np.eye(self.samples_train.shape[1])*self.sigma_p # convert in matrix
-            pass
-
-        self.A_inv = np.linalg.inv(1.0/(self.sigma_noise**2) *
-                                  np.dot(self.samples_train.T,
-                                        self.samples_train) +
+        self.A_inv = np.linalg.inv(1.0/(self.sigma_noise**2) * xtx +
                                   np.linalg.inv(self.sigma_p))
-        self.w = 1.0/(self.sigma_noise**2) * np.dot(self.A_inv,
-                                                   np.dot(self.samples_train.T,
-                                                         train_labels))
-        pass
+        self.w = 1.0/(self.sigma_noise**2) * np.dot(self.A_inv, xty)
+
+
+    def _untrain(self):
+        self._stats = None
+        super(BLR, self)._untrain()
 
 
     @accepts_dataset_as_samples
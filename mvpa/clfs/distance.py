@@ -19,6 +19,9 @@ __docformat__ = 'restructuredtext'
 import numpy as np
 from mvpa.base import externals
 
+# not worthy of externals checking
+_has_argpartition = hasattr(np, 'argpartition')
+
 if __debug__:
     from mvpa.base import debug, warning
 
@@ -212,6 +215,107 @@ def squared_euclidean_distance(data1, data2=None, weight=None):
     return squared_euclidean_distance_matrix
 
 
+def smallest_k(dists, k):
+    """Column indices of the `k` smallest values in each row of `dists`
+
+    Indices are not ordered by the value they refer to, which allows for
+    a linear time partial sort (if available in NumPy) instead of a full
+    sort.
+    """
+    if k >= dists.shape[1]:
+        return np.repeat(np.arange(dists.shape[1])[None],
+                         len(dists), axis=0)
+    if _has_argpartition:
+        return np.argpartition(dists, k - 1, axis=1)[:, :k]
+    return dists.argsort(axis=1)[:, :k]
+
+
+# Number of distance-matrix sized arrays alive at once while computing
+# distances (result, temporaries of e.g. squared_euclidean_distance and
+# the running top-k merge)
+_BLOCK_MEMORY_FACTOR = 4
+
+def k_nearest_neighbors(data1, data2, k, dfx=squared_euclidean_distance,
+                        memory_limit=None):
+    """Find the `k` nearest samples of `data1` for each sample of `data2`
+
+    Distances are computed between blocks of samples of both datasets,
+    keeping only the running `k` nearest neighbors for each sample of
+    `data2`, so the full distance matrix is never allocated.
+
+    Parameters
+    ----------
+    data1 : np.ndarray
+      Samples to search neighbors among (e.g. training samples).
+    data2 : np.ndarray
+      Samples to search neighbors for (e.g. testing samples).
+    k : int
+      Number of neighbors.  If larger than the number of samples in
+      `data1`, all of them are returned.
+    dfx : functor
+      Function to compute the distance matrix between samples of two
+      arrays.
+    memory_limit : int or None
+      Approximate amount of memory (in bytes) to be used for the
+      distance computation.  If None, all distances get computed at once.
+
+    Returns
+    -------
+    ids, dists : np.ndarray
+      (number of samples in `data2` x `k`) arrays with indices of the
+      nearest samples in `data1` and corresponding distances.  Neighbors
+      are not ordered by their distance.
+    """
+    n1, n2 = len(data1), len(data2)
+    k = min(k, n1)
+
+    if memory_limit is None:
+        block1, block2 = n1, n2
+    else:
+        # how many distances we could afford to have at once
+        itemsize = np.dtype(np.result_type(data1, data2, float)).itemsize
+        nvalues = max(int(memory_limit
+                          / (_BLOCK_MEMORY_FACTOR * itemsize)), 1)
+        if nvalues >= n1 + k:
+            # all samples of data1 fit at once for some samples of data2
+            block1 = n1
+            block2 = max(nvalues // (n1 + k), 1)
+        else:
+            # even a single sample of data2 needs to go by pieces
+            block1 = max(nvalues - k, 1)
+            block2 = 1
+    if __debug__:
+        debug('DIST', "Searching for %d nearest neighbors among %d samples "
+              "for %d samples in blocks of %dx%d" % (k, n1, n2, block1, block2))
+
+    ids = np.empty((n2, k), dtype=int)
+    dists = None
+    for start2 in xrange(0, n2, block2):
+        stop2 = min(start2 + block2, n2)
+        rows = np.arange(stop2 - start2)[:, None]
+        best_ids, best_dists = None, None
+        for start1 in xrange(0, n1, block1):
+            stop1 = min(start1 + block1, n1)
+            # distances stored row-wise per sample of data2
+            d = dfx(data1[start1:stop1], data2[start2:stop2]).T
+            block_ids = np.arange(start1, stop1)[None].repeat(len(d), axis=0)
+            if best_dists is not None:
+                # merge with the running neighbors
+                d = np.hstack((best_dists, d))
+                block_ids = np.hstack((best_ids, block_ids))
+            nearest = smallest_k(d, k)
+            best_dists = d[rows, nearest]
+            best_ids = block_ids[rows, nearest]
+        if dists is None:
+            dists = np.empty((n2, k), dtype=best_dists.dtype)
+        ids[start2:stop2] = best_ids
+        dists[start2:stop2] = best_dists
+    if dists is None:
+        # there were no samples in data2
+        dists = np.empty((0, k))
+    return ids, dists
+
+
 def one_minus_correlation(X, Y):
     """Return one minus the correlation matrix between the rows of two matrices.
 
@@ -33,6 +33,7 @@ from mvpa.clfs.base import Classifier, accepts_dataset_as_samples
 from mvpa.base.learner import DegenerateInputError
 from mvpa.base.param import Parameter
 from mvpa.base.state import ConditionalAttribute
+from mvpa.clfs._classstats import ClassStatsLearner
 #from mvpa.measures.base import Sensitivity
 
 
@@ -41,13 +42,19 @@ if __debug__:
 
 __all__ = [ "LDA", "QDA" ]
 
-class GDA(Classifier):
+class GDA(ClassStatsLearner, Classifier):
     """Gaussian Discriminant Analysis -- base for LDA and QDA
 
+    Since classifiers are fully determined by the number of samples,
+    means and scatter matrices of each class, they could be updated
+    with new samples (`partial_train`), have samples removed
+    (`partial_untrain`), or combined with classifiers trained on other
+    samples (`merge`) without retraining from scratch.
     """
 
     __tags__ = ['binary', 'multiclass']
 
+    _full_stats = True
 
     prior = Parameter('laplacian_smoothing',
              allowedtype='basestring',
@@ -76,6 +83,7 @@ class GDA(Classifier):
 
         # Define internal state of classifier
         self._norm_weight = None
+        self._stats = None
 
     def _get_priors(self, nlabels, nsamples, nsamples_per_class):
         """Return prior probabilities given data
@@ -98,55 +106,39 @@ class GDA(Classifier):
     def _train(self, dataset):
         """Train the classifier using `dataset` (`Dataset`).
         """
-        params = self.params
-        targets_sa_name = self.get_space()
-        targets_sa = dataset.sa[targets_sa_name]
-
-        # get the dataset information into easy vars
-        X = dataset.samples
-        labels = targets_sa.value
-        self.ulabels = ulabels = targets_sa.unique
-        nlabels = len(ulabels)
-        label2index = dict((l, il) for il, l in enumerate(ulabels))
-
-        # set the feature dimensions
-        nsamples = len(X)
-        nfeatures = dataset.nfeatures
-
-        self.means = means = \
-                     np.zeros((nlabels, nfeatures))
-        # degenerate dimension are added for easy broadcasting later on
-        # XXX might want to remove -- for now taken from GNB as is
-        self.nsamples_per_class = nsamples_per_class \
-                                  = np.zeros((nlabels, 1))
-        self.cov = cov = \
-                     np.zeros((nlabels, nfeatures, nfeatures))
-
-
-        # Estimate cov
-        # better loop than repmat! ;)
-        for l, il in label2index.iteritems():
-            Xl = X[labels == l]
-            nsamples_per_class[il] = len(Xl)
-            # TODO: degenerate case... no samples for known label for
-            #       some reason?
-            means[il] = np.mean(Xl, axis=0)
-            # since we have means already lets do manually cov here
-            Xldm = Xl - means[il]
-            cov[il] = np.dot(Xldm.T, Xldm)
-            # scaling will be done correspondingly in LDA or QDA
-
-        # Store prior probabilities
-        self.priors = self._get_priors(nlabels, nsamples, nsamples_per_class)
+        # Estimate number of samples, means and scatter matrices per label
+        self._stats = self._get_stats(dataset)
+        self._set_estimates()
 
         if __debug__ and 'GDA' in debug.active:
+            X = dataset.samples
             debug('GDA', "training finished on data.shape=%s " % (X.shape, )
                   + "min:max(data)=%f:%f" % (np.min(X), np.max(X)))
 
 
+    def _set_estimates(self):
+        """Compute all estimates from the per-class statistics
+        """
+        self.ulabels, counts, means, scatters = self._stats
+        nlabels = len(self.ulabels)
+        nsamples = np.sum(counts)
+
+        self.means = means
+        # degenerate dimension are added for easy broadcasting later on
+        # XXX might want to remove -- for now taken from GNB as is
+        self.nsamples_per_class = counts[:, None]
+        # scaling will be done correspondingly in LDA or QDA
+        self.cov = scatters.copy()
+
+        # Store prior probabilities
+        self.priors = self._get_priors(nlabels, nsamples,
+                                       self.nsamples_per_class)
+
+
     def _untrain(self):
         """Untrain classifier and reset all learnt params
         """
+        self._stats = None
         self.means = None
         self.cov = None
         self.ulabels = None
@@ -187,8 +179,8 @@ class LDA(GDA):
         super(LDA, self)._untrain()
 
 
-    def _train(self, dataset):
-        super(LDA, self)._train(dataset)
+    def _set_estimates(self):
+        super(LDA, self)._set_estimates()
         nlabels = len(self.ulabels)
         # Sum and scale the covariance
         self.cov = cov = \
@@ -228,8 +220,8 @@ class QDA(GDA):
         self._b = None
         super(QDA, self)._untrain()
 
-    def _train(self, dataset):
-        super(QDA, self)._train(dataset)
+    def _set_estimates(self):
+        super(QDA, self)._set_estimates()
 
         # XXX should we drag cov around at all then?
         self._icov = np.zeros(self.cov.shape)
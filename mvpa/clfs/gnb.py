@@ -27,6 +27,7 @@ from mvpa.base import warning, externals
 from mvpa.clfs.base import Classifier, accepts_dataset_as_samples
 from mvpa.base.param import Parameter
 from mvpa.base.state import ConditionalAttribute
+from mvpa.clfs._classstats import ClassStatsLearner
 #from mvpa.measures.base import Sensitivity
 
 
@@ -35,7 +36,7 @@ if __debug__:
 
 __all__ = [ "GNB" ]
 
-class GNB(Classifier):
+class GNB(ClassStatsLearner, Classifier):
     """Gaussian Naive Bayes `Classifier`.
 
     `GNB` is a probabilistic classifier relying on Bayes rule to
@@ -49,13 +50,18 @@ class GNB(Classifier):
     aspects could be improved, but it has its own advantages:
 
     - implementation is simple and straightforward
-    - no data copying while considering samples of specific class
+    - per-class statistics are estimated in a single pass via grouped
+      reductions over label-sorted samples, so training is not
+      Python-bound
     - provides alternative ways to assess prior distribution of the
       classes in the case of unbalanced sets of samples (see parameter
       `prior`)
     - makes use of NumPy broadcasting mechanism, so should be
       relatively efficient
     - should work for any dimensionality of samples
+    - could be updated with new samples (`partial_train`), have samples
+      removed (`partial_untrain`), or combined with a `GNB` trained on
+      other samples (`merge`) without retraining from scratch
 
     `GNB` is listed both as linear and non-linear classifier, since
     specifics of separating boundary depends on the data and/or
@@ -92,6 +98,11 @@ class GNB(Classifier):
              exponentiation and loose precision.
              If set, logprobs are stored in `values`""")
 
+    single_precision = Parameter(False, allowedtype='bool',
+             doc="""Estimate means and variances in single precision
+             (float32).  Halves memory demands and speeds up training on
+             large datasets at the cost of precision.""")
+
     normalize = Parameter(False, allowedtype='bool',
              doc="""Normalize (log)prob by P(data).  Requires probabilities thus
              for `logprob` case would require exponentiation of 'logprob's, thus
@@ -117,6 +128,8 @@ class GNB(Classifier):
 
         # Define internal state of classifier
         self._norm_weight = None
+        self._stats = None
+        self._s_shape = None
 
     def _get_priors(self, nlabels, nsamples, nsamples_per_class):
         """Return prior probabilities given data
@@ -135,58 +148,54 @@ class GNB(Classifier):
                 % self.params.prior)
         return priors
 
+    def _get_stats_dtype(self):
+        if self.params.single_precision:
+            return np.float32
+        return np.float64
+
+
     def _train(self, dataset):
         """Train the classifier using `dataset` (`Dataset`).
         """
-        params = self.params
-        targets_sa_name = self.get_space()
-        targets_sa = dataset.sa[targets_sa_name]
-
-        # get the dataset information into easy vars
         X = dataset.samples
-        labels = targets_sa.value
-        self.ulabels = ulabels = targets_sa.unique
-        nlabels = len(ulabels)
-        label2index = dict((l, il) for il, l in enumerate(ulabels))
-
-        # set the feature dimensions
-        nsamples = len(X)
-        s_shape = X.shape[1:]           # shape of a single sample
-
-        self.means = means = \
-                     np.zeros((nlabels, ) + s_shape)
-        self.variances = variances = \
-                     np.zeros((nlabels, ) + s_shape)
-        # degenerate dimension are added for easy broadcasting later on
-        nsamples_per_class = np.zeros((nlabels,) + (1,)*len(s_shape))
+        # shape of a single sample
+        self._s_shape = X.shape[1:]
+        # Estimate number of samples, means and sums of squared
+        # deviations per each label in a single pass over the data
+        self._stats = self._get_stats(dataset)
+        self._set_estimates()
+
+        if __debug__ and 'GNB' in debug.active:
+            debug('GNB', "training finished on data.shape=%s " % (X.shape, )
+                  + "min:max(data)=%f:%f" % (np.min(X), np.max(X)))
 
-        # Estimate means and number of samples per each label
-        for s, l in zip(X, labels):
-            il = label2index[l]         # index of the label
-            nsamples_per_class[il] += 1
-            means[il] += s
 
-        ## Actually compute the means
-        non0labels = (nsamples_per_class.squeeze() != 0)
-        means[non0labels] /= nsamples_per_class[non0labels]
+    def _set_estimates(self):
+        """Compute all estimates from the per-class statistics
+        """
+        params = self.params
+        self.ulabels, counts, means, sqdevs = self._stats
+        nlabels = len(self.ulabels)
+        nsamples = np.sum(counts)
+        s_shape = self._s_shape
+
+        # degenerate dimension are added for easy broadcasting later on
+        nsamples_per_class = counts.reshape((nlabels,) + (1,)*len(s_shape))
 
         # Store prior probabilities
         self.priors = self._get_priors(nlabels, nsamples, nsamples_per_class)
 
-        # Estimate variances
-        # better loop than repmat! ;)
-        for s, l in zip(X, labels):
-            il = label2index[l]         # index of the label
-            variances[il] += (s - means[il])**2
-
         ## Actually compute the variances
         if params.common_variance:
             # we need to get global std
-            cvar = np.sum(variances, axis=0)/nsamples # sum across labels
-            # broadcast the same variance across labels
-            variances[:] = cvar
+            variances = np.zeros(sqdevs.shape, dtype=sqdevs.dtype)
+            # sum across labels and broadcast the same variance across labels
+            variances[:] = np.sum(sqdevs, axis=0) / nsamples
         else:
-            variances[non0labels] /= nsamples_per_class[non0labels]
+            variances = sqdevs / counts[:, None]
+
+        self.means = means.reshape((nlabels, ) + s_shape)
+        self.variances = variances = variances.reshape((nlabels, ) + s_shape)
 
         # Precompute and store weighting coefficient for Gaussian
         if params.logprob:
@@ -195,14 +204,11 @@ class GNB(Classifier):
         else:
             self._norm_weight = 1.0/np.sqrt(2*np.pi*variances)
 
-        if __debug__ and 'GNB' in debug.active:
-            debug('GNB', "training finished on data.shape=%s " % (X.shape, )
-                  + "min:max(data)=%f:%f" % (np.min(X), np.max(X)))
-
 
     def _untrain(self):
         """Untrain classifier and reset all learnt params
         """
+        self._stats = None
         self.means = None
         self.variances = None
         self.ulabels = None
@@ -24,6 +24,7 @@ from mvpa.kernels.np import SquaredExponentialKernel, GeneralizedLinearKernel, \
 from mvpa.measures.base import Sensitivity
 from mvpa.misc.exceptions import InvalidHyperparameterError
 from mvpa.datasets import Dataset, dataset_wizard
+from mvpa.misc.support import idhash
 
 if externals.exists("scipy", raise_=True):
     from scipy.linalg import cho_solve as SLcho_solve
@@ -64,6 +65,7 @@ def _SLcholesky_autoreg(C, nsteps=None, **kwargs):
         epsilon = epsilon_value * np.eye(C.shape[0])
         try:
             result = SLcholesky(C + epsilon, lower=True)
+            break
         except SLAError, e:
             warning("Cholesky decomposition lead to failure: %s.  "
                     "As requested, performing auto-regularization but "
@@ -128,6 +130,27 @@ class GPR(Classifier):
         Increase this when the kernel matrix is not positive definite. If None,
         some regularization will be provided upon necessity""")
 
+    ninducing = Parameter(None, min=1, allowedtype='None or int',
+        doc="""Number of inducing points (randomly selected training samples)
+        for the low-rank subset-of-regressors approximation, which trains
+        in O(n m^2) and does not need the test-test kernel for predicted
+        variances.  If None (or not less than the number of training
+        samples), exact GPR is performed.""")
+
+    seed = Parameter(None, allowedtype='None or int',
+        doc="""Seed to be used to initialize random generator for the
+        selection of inducing points, might be used to replicate the
+        run""")
+
+    cache_eigen = Parameter(False, allowedtype='bool',
+        doc="""Use (and cache) eigendecomposition of the train kernel
+        matrix instead of Cholesky decomposition.  While data and kernel
+        parameters stay the same, retraining with different `sigma_noise`
+        or `lm` costs only O(n^2), and
+        `compute_log_marginal_likelihood_grid` evaluates the whole grid of
+        noise levels at once.  Negative eigenvalues (due to numerical
+        reasons) are clipped to 0.""")
+
 
     def __init__(self, kernel=None, **kwargs):
         """Initialize a GPR regression analysis.
@@ -169,6 +192,9 @@ class GPR(Classifier):
         # they would raise an exception self.predicted_variances =
         # None self.log_marginal_likelihood = None
         self._init_internals()
+        # (key, eigenvalues, eigenvectors) of the train kernel -- survives
+        # untraining to be reused when training on the same data again
+        self._eigen_cache = None
         pass
 
 
@@ -184,6 +210,10 @@ class GPR(Classifier):
         self._alpha = None
         self._L = None
         self._LL = None
+        self._inducing_fv = None
+        self._L_mm = None
+        self._V = None
+        self._eig_d = None
         # XXX EO: useful for model selection but not working in general
         # self.__kernel.reset()
         pass
@@ -202,6 +232,12 @@ class GPR(Classifier):
         """
         if __debug__:
             debug("GPR", "Computing log_marginal_likelihood")
+        if self._inducing_fv is not None:
+            return self._compute_log_marginal_likelihood_low_rank()
+        if self._eig_d is not None:
+            self.ca.log_marginal_likelihood = \
+                self._log_marginal_likelihood_eigen(self._eig_d)
+            return self.ca.log_marginal_likelihood
         self.ca.log_marginal_likelihood = \
                                  -0.5*Ndot(self._train_labels, self._alpha) - \
                                   Nlog(self._L.diagonal()).sum() - \
@@ -225,9 +261,10 @@ class GPR(Classifier):
         # gradient again. COULD THIS BE TAKEN INTO ACCOUNT BY THE
         # NEW CACHED KERNEL INFRASTRUCTURE?
 
+        self._assure_exact("Gradient of log marginal likelihood")
         # self.Kinv = np.linalg.inv(self._C)
         # Faster:
-        Kinv = SLcho_solve(self._LL, np.eye(self._L.shape[0]))
+        Kinv = self._solve_C(np.eye(len(self._alpha)))
 
         alphalphaT = np.dot(self._alpha[:,None], self._alpha[None,:])
         tmp = alphalphaT - Kinv
@@ -250,9 +287,10 @@ class GPR(Classifier):
         hyperparameters are in logscale. This version use a more
         compact formula provided by Williams and Rasmussen book.
         """
+        self._assure_exact("Gradient of log marginal likelihood")
         # Kinv = np.linalg.inv(self._C)
         # Faster:
-        Kinv = SLcho_solve(self._LL, np.eye(self._L.shape[0]))
+        Kinv = self._solve_C(np.eye(len(self._alpha)))
         alphalphaT = np.dot(self._alpha[:,None], self._alpha[None,:])
         tmp = alphalphaT - Kinv
         grad_LML_log_hypers = \
@@ -267,6 +305,222 @@ class GPR(Classifier):
         return lml_gradient
 
 
+    def compute_log_marginal_likelihood_grid(self, sigma_noise, lm=0.0):
+        """Compute log marginal likelihood for a grid of noise levels
+
+        Requires GPR trained with `cache_eigen`, so that each grid point
+        costs only O(n) while kernel parameters stay the same.
+
+        Parameters
+        ----------
+        sigma_noise : float or sequence of float
+          Standard deviations of the gaussian noise.
+        lm : float or sequence of float
+          Regularization terms added along with sigma_noise**2.
+
+        Returns
+        -------
+        ndarray
+          Log marginal likelihoods of shape (len(sigma_noise), len(lm)).
+        """
+        if self._eig_d is None:
+            raise RuntimeError, \
+                  "GPR must be trained with cache_eigen=True to compute " \
+                  "log marginal likelihood on a grid"
+        shift = np.atleast_1d(sigma_noise)[:, None] ** 2 \
+                + np.atleast_1d(lm)[None, :]
+        return self._log_marginal_likelihood_eigen(
+            self._eigen_cache[1] + shift[..., None])
+
+
+    def compute_alphas(self, targets):
+        """Compute alpha for multiple target vectors at once
+
+        Decomposition from the last training gets reused, so alphas for
+        many target vectors (e.g. permutations of the targets) cost a
+        single solve instead of separate trainings.
+
+        For low-rank GPR alphas are computed for the inducing points
+        (as its `_alpha`), reusing the decomposition of the m x m
+        matrices.
+
+        Parameters
+        ----------
+        targets : ndarray
+          Target vectors as columns of a (nsamples x ntargets) array.
+        """
+        targets = np.asanyarray(targets, dtype=float)
+        if self._inducing_fv is not None:
+            beta = SLcho_solve(self._LL, Ndot(self._V, targets))
+            return SL.solve_triangular(self._L_mm.T, beta, lower=False)
+        return self._solve_C(targets)
+
+
+    def _log_marginal_likelihood_eigen(self, d):
+        """Log marginal likelihood given eigenvalues `d` of C along last axis
+        """
+        return -0.5 * (self._Uty ** 2 / d).sum(-1) \
+               - 0.5 * Nlog(d).sum(-1) - len(self._Uty) * _halflog2pi
+
+
+    def _solve_C(self, B):
+        """Solve C x = B using Cholesky or cached eigendecomposition"""
+        if self._eig_d is None:
+            return SLcho_solve(self._LL, B)
+        U = self._eigen_cache[2]
+        return Ndot(U, (Ndot(U.T, B).T / self._eig_d).T)
+
+
+    def _assure_exact(self, what):
+        """Raise if GPR was trained with the low-rank approximation"""
+        if self._inducing_fv is not None:
+            raise ValueError, \
+                  "%s is not available for low-rank GPR (ninducing=%d)" \
+                  % (what, len(self._inducing_fv))
+
+
+    def _compute_log_marginal_likelihood_low_rank(self):
+        """Log marginal likelihood of the subset-of-regressors model
+
+        With V = L_mm^-1 K_mn and B = sigma_noise^2 I + V V^T, covariance
+        Q = V^T V + sigma_noise^2 I has |Q| = sigma_noise^(2(n-m)) |B|.
+        """
+        y = self._train_labels
+        n, m = len(y), len(self._inducing_fv)
+        sigma2 = self.params.sigma_noise ** 2
+        ytQinvy = (Ndot(y, y) - Ndot(self._Vy, self._beta)) / sigma2
+        logdetQ = 2 * Nlog(self._L.diagonal()).sum() + (n - m) * Nlog(sigma2)
+        self.ca.log_marginal_likelihood = \
+                -0.5 * ytQinvy - 0.5 * logdetQ - n * _halflog2pi
+        return self.ca.log_marginal_likelihood
+
+
+    def _cholesky(self, C):
+        """Cholesky of C regularized according to `lm`"""
+        lm = self.params.lm
+        try:
+            if lm is not None:
+                return SLcholesky(C + lm * np.eye(C.shape[0]), lower=True)
+            else:
+                return _SLcholesky_autoreg(C, nsteps=None, lower=True)
+        except SLAError:
+            raise SLAError("Kernel matrix is not positive, definite. "
+                           "Try increasing the lm parameter.")
+
+
+    def _train_eigen(self, data):
+        """Train using (cached) eigendecomposition of the train kernel
+        """
+        params = self.params
+        kernel = self.__kernel
+        self._train_fv = train_fv = data.samples
+        self._train_labels = train_labels = data.sa[self.get_space()].value
+
+        key = (idhash(train_fv), kernel.__class__,
+               [(k, idhash(v.value)) for k, v in kernel.params.iteritems()])
+        eigen_cache = self._eigen_cache
+        reused = eigen_cache is not None and eigen_cache[0] == key
+        if not reused:
+            if __debug__:
+                debug("GPR", "Computing eigendecomposition of train train "
+                      "kernel matrix")
+            kernel.compute(train_fv)
+            w, U = SL.eigh(asarray(kernel))
+            kernel.cleanup()
+            self._eigen_cache = eigen_cache = (key, np.maximum(w, 0), U)
+        elif __debug__:
+            debug("GPR", "Reusing cached eigendecomposition")
+
+        w, U = eigen_cache[1:]
+        # eigenvalues of C = K + (sigma_noise^2 + lm) I
+        self._eig_d = d = w + params.sigma_noise ** 2 + (params.lm or 0.0)
+        self._Uty = Ndot(U.T, train_labels)
+        self._alpha = Ndot(U, self._Uty / d)
+        self._km_train_train = None
+        self._km_train_test = None
+
+        if self.ca.is_enabled('log_marginal_likelihood'):
+            self.compute_log_marginal_likelihood()
+
+        if params.retrainable:
+            self.ca.retrained = reused
+
+
+    def _train_low_rank(self, data):
+        """Train subset-of-regressors approximation on `ninducing` points
+        """
+        params = self.params
+        kernel = self.__kernel
+        train_fv = data.samples
+        train_labels = data.sa[self.get_space()].value
+        n, m = len(train_fv), params.ninducing
+
+        ids = np.sort(np.random.RandomState(params.seed).permutation(n)[:m])
+        self._inducing_fv = inducing_fv = train_fv[ids]
+        if __debug__:
+            debug("GPR", "Training low-rank GPR on %d out of %d samples"
+                  % (m, n))
+
+        kernel.compute(inducing_fv, train_fv)
+        Kmn = asarray(kernel)
+        kernel.compute(inducing_fv)
+        Kmm = asarray(kernel)
+        kernel.cleanup()
+
+        # decompose only m x m matrices:  V = L_mm^-1 K_mn and
+        # B = sigma_noise^2 I + V V^T = L_mm^-1 A L_mm^-T, where
+        # A = sigma_noise^2 K_mm + K_mn K_nm
+        self._L_mm = L_mm = self._cholesky(Kmm)
+        # V is kept to solve for other targets in compute_alphas
+        self._V = V = SL.solve_triangular(L_mm, Kmn, lower=True)
+        del Kmn
+        self._L = self._cholesky(params.sigma_noise ** 2 * np.eye(m)
+                                 + Ndot(V, V.T))
+        self._LL = (self._L, True)
+        self._Vy = Ndot(V, train_labels)
+        self._beta = SLcho_solve(self._LL, self._Vy)
+        # alpha = A^-1 K_mn y, so predictions are K_*m alpha
+        self._alpha = SL.solve_triangular(L_mm.T, self._beta, lower=False)
+
+        # all training samples are needed only for exact GPR
+        self._train_fv = None
+        self._train_labels = train_labels
+        self._km_train_train = None
+
+        if self.ca.is_enabled('log_marginal_likelihood'):
+            self.compute_log_marginal_likelihood()
+
+        if params.retrainable:
+            # nothing gets reused
+            self.ca.retrained = False
+
+
+    def _predict_low_rank(self, data):
+        """Predict using subset-of-regressors approximation
+        """
+        ca = self.ca
+        kernel = self.__kernel
+        kernel.compute(self._inducing_fv, data)
+        Kmt = asarray(kernel)
+        kernel.cleanup()
+
+        predictions = Ndot(Kmt.T, self._alpha)
+
+        if ca.is_enabled('predicted_variances'):
+            if __debug__:
+                debug("GPR", "Computing predicted variances of low-rank GPR")
+            # sigma_noise^2 K_*m A^-1 K_m* without the test-test kernel
+            Vt = SL.solve_triangular(self._L_mm, Kmt, lower=True)
+            sigma2 = self.params.sigma_noise ** 2
+            ca.predicted_variances = \
+                sigma2 * (Vt * SLcho_solve(self._LL, Vt)).sum(0) + sigma2
+
+        if self.params.retrainable:
+            ca.repredicted = False
+        ca.estimates = predictions
+        return predictions
+
+
     ##REF: Name was automagically refactored
     def get_sensitivity_analyzer(self, flavor='auto', **kwargs):
         """Returns a sensitivity analyzer for GPR.
@@ -310,6 +564,12 @@ class GPR(Classifier):
     def _train(self, data):
         """Train the classifier using `data` (`Dataset`).
         """
+        self._inducing_fv = self._eig_d = None
+        if self.params.ninducing is not None \
+               and self.params.ninducing < data.nsamples:
+            return self._train_low_rank(data)
+        if self.params.cache_eigen:
+            return self._train_eigen(data)
 
         # local bindings for faster lookup
         params = self.params
@@ -327,7 +587,8 @@ class GPR(Classifier):
         self._train_labels = train_labels
 
         if not retrainable or _changedData['traindata'] \
-               or _changedData.get('kernel_params', False):
+               or _changedData.get('kernel_params', False) \
+               or self._km_train_train is None:
             if __debug__:
                 debug("GPR", "Computing train train kernel matrix")
             self.__kernel.compute(train_fv)
@@ -428,6 +689,9 @@ class GPR(Classifier):
         """
         Predict the output for the provided data.
         """
+        if self._inducing_fv is not None:
+            return self._predict_low_rank(data)
+
         retrainable = self.params.retrainable
         ca = self.ca
 
@@ -466,11 +730,15 @@ class GPR(Classifier):
 
             if __debug__:
                 debug("GPR", "Computing predicted variances")
-            L = self._L
-            # v = NLAsolve(L, km_train_test)
-            # Faster:
-            piv = np.arange(L.shape[0])
-            v = SL.lu_solve((L.T, piv), km_train_test, trans=1)
+            if self._eig_d is not None:
+                v = Ndot(self._eigen_cache[2].T, km_train_test) \
+                    / np.sqrt(self._eig_d)[:, None]
+            else:
+                L = self._L
+                # v = NLAsolve(L, km_train_test)
+                # Faster:
+                piv = np.arange(L.shape[0])
+                v = SL.lu_solve((L.T, piv), km_train_test, trans=1)
             # self.predicted_variances = \
             #     Ndiag(km_test_test - Ndot(v.T, v)) \
             #     + self.sigma_noise**2
@@ -537,6 +805,24 @@ class GPRLinearWeights(Sensitivity):
 
     _LEGAL_CLFS = [ GPR ]
 
+    def __init__(self, clf, targets=None, **kwargs):
+        """Initialize the analyzer with the GPR to use.
+
+        Parameters
+        ----------
+        clf : GPR
+          Classifier to use.
+        targets : ndarray or callable, optional
+          Target vectors (columns of a nsamples x ntargets array), or a
+          callable returning them given the training dataset (e.g.
+          permutations of its targets).  If provided, weights get
+          computed for each of those target vectors (one per row) in a
+          single batched solve, instead of for the actual targets.
+        """
+        Sensitivity.__init__(self, clf, **kwargs)
+        self._targets = targets
+
+
 
     def _call(self, dataset):
         """Extract weights from GPR
@@ -545,18 +831,29 @@ class GPRLinearWeights(Sensitivity):
         clf = self.clf
         kernel = clf.kernel
         train_fv = clf._train_fv
+        if train_fv is None:
+            # low-rank GPR has alpha only for the inducing points
+            train_fv = clf._inducing_fv
         if isinstance(kernel, LinearKernel):
             Sigma_p = 1.0
         else:
             Sigma_p = kernel.params.Sigma_p
 
+        alpha = clf._alpha
+        targets = self._targets
+        if targets is not None:
+            if callable(targets):
+                targets = targets(dataset)
+            # weights for all the target vectors at once
+            alpha = clf.compute_alphas(targets)
+
         weights = Ndot(Sigma_p,
-                        Ndot(train_fv.T, clf._alpha))
+                        Ndot(train_fv.T, alpha))
 
         if self.ca.is_enabled('variances'):
+            clf._assure_exact("Variances of the weights")
             # super ugly formulas that can be quite surely improved:
-            tmp = np.linalg.inv(clf._L)
-            Kyinv = Ndot(tmp.T, tmp)
+            Kyinv = clf._solve_C(np.eye(len(clf._alpha)))
             # XXX in such lengthy matrix manipulations you might better off
             #     using np.matrix where * is a matrix product
             self.ca.variances = Ndiag(
@@ -565,7 +862,7 @@ class GPRLinearWeights(Sensitivity):
                       Ndot(train_fv.T,
                             Ndot(Kyinv,
                                   Ndot(train_fv, Sigma_p)))))
-        return Dataset(np.atleast_2d(weights))
+        return Dataset(np.atleast_2d(weights.T))
 
 
 if externals.exists('openopt'):
@@ -10,10 +10,6 @@
 
 __docformat__ = 'restructuredtext'
 
-import sys
-# not worthy of externals checking
-_dict_has_key = sys.version_info >= (2, 5)
-
 import numpy as np
 
 from mvpa.base import warning
@@ -22,7 +18,8 @@ from mvpa.misc.support import indent_doc
 from mvpa.base.state import ConditionalAttribute
 
 from mvpa.clfs.base import Classifier, accepts_dataset_as_samples
-from mvpa.clfs.distance import squared_euclidean_distance
+from mvpa.clfs.distance import squared_euclidean_distance, \
+     smallest_k, k_nearest_neighbors
 
 __all__ = [ 'kNN' ]
 
@@ -60,7 +57,7 @@ class kNN(Classifier):
                       'notrain2predict' ]
 
     def __init__(self, k=2, dfx=squared_euclidean_distance,
-                 voting='weighted', **kwargs):
+                 voting='weighted', memory_limit=None, **kwargs):
         """
         Parameters
         ----------
@@ -74,6 +71,12 @@ class kNN(Classifier):
           Possible values are 'majority' (simple majority of classes
           determines vote) and 'weighted' (votes are weighted according to the
           relative frequencies of each class in the training data).
+        memory_limit : int or None
+          If not None, distances between training and test samples are
+          computed block-wise using approximately this amount of memory
+          (in bytes), and only the nearest neighbors of each test sample
+          are kept.  Conditional attribute `distances` is then not
+          available.
         **kwargs
           Additonal arguments are passed to the base class.
         """
@@ -84,12 +87,16 @@ class kNN(Classifier):
         self.__k = k
         self.__dfx = dfx
         self.__voting = voting
+        self.__memory_limit = memory_limit
         self.__data = None
+        self.__label_ids = None
 
 
     def __repr__(self, prefixes=[]):
         """Representation of the object
         """
+        if self.__memory_limit is not None:
+            prefixes = ["memory_limit=%r" % self.__memory_limit] + prefixes
         return super(kNN, self).__repr__(
             ["k=%d" % self.__k, "dfx=%s" % self.__dfx,
              "voting=%s" % repr(self.__voting)]
@@ -116,10 +123,11 @@ class kNN(Classifier):
                         " floating datatype if any error is reported.")
         self.__weights = None
 
-        # create dictionary with an item for each condition
-        uniquelabels = data.sa[self.get_space()].unique
-        self.__votes_init = dict(zip(uniquelabels,
-                                     [0] * len(uniquelabels)))
+        # integer-code the labels (indices into unique labels) so votes
+        # could be counted for all test samples at once
+        targets_sa = data.sa[self.get_space()]
+        self.__label_ids = np.searchsorted(targets_sa.unique,
+                                           targets_sa.value)
 
 
     @accepts_dataset_as_samples
@@ -140,20 +148,27 @@ class kNN(Classifier):
                 raise ValueError, "Length of data samples (features) does " \
                                   "not match the classifier."
 
-        # compute the distance matrix between training and test data with
-        # distances stored row-wise, ie. distances between test sample [0]
-        # and all training samples will end up in row 0
-        dists = self.__dfx(self.__data.samples, data).T
-        if self.ca.is_enabled('distances'):
-            # TODO: theoretically we should have used deepcopy for sa
-            #       here
-            self.ca.distances = Dataset(dists, fa=self.__data.sa.copy())
-
-        # determine the k nearest neighbors per test sample
-        knns = dists.argsort(axis=1)[:, :self.__k]
-
-        # predicted class labels will go here
-        predicted = []
+        if self.__memory_limit is None:
+            # compute the distance matrix between training and test data
+            # with distances stored row-wise, ie. distances between test
+            # sample [0] and all training samples will end up in row 0
+            dists = self.__dfx(self.__data.samples, data).T
+            if self.ca.is_enabled('distances'):
+                # TODO: theoretically we should have used deepcopy for sa
+                #       here
+                self.ca.distances = Dataset(dists, fa=self.__data.sa.copy())
+
+            # determine the k nearest neighbors per test sample
+            knns = smallest_k(dists, self.__k)
+        else:
+            if self.ca.is_enabled('distances'):
+                warning("kNN: distances are not stored when "
+                        "memory_limit is set, since full distance matrix "
+                        "is never computed")
+            # find the k nearest neighbors block-wise
+            knns = k_nearest_neighbors(self.__data.samples, data, self.__k,
+                                       dfx=self.__dfx,
+                                       memory_limit=self.__memory_limit)[0]
 
         if self.__voting == 'majority':
             vfx = self.get_majority_vote
@@ -163,61 +178,80 @@ class kNN(Classifier):
             raise ValueError, "kNN told to perform unknown voting '%s'." \
                   % self.__voting
 
-        # perform voting
-        results = [vfx(knn) for knn in knns]
-
-        # extract predictions
-        predicted = [r[0] for r in results]
+        # perform voting for all test samples at once
+        predicted, votes = vfx(knns)
+        predicted = list(predicted)
 
         # store the predictions in the state. Relies on State._setitem to do
         # nothing if the relevant state member is not enabled
         self.ca.predictions = predicted
-        self.ca.estimates = np.array([r[1] for r in results])
+        self.ca.estimates = votes
 
         return predicted
 
 
-    ##REF: Name was automagically refactored
-    def get_majority_vote(self, knn_ids):
-        """Simple voting by choosing the majority of class neighbors.
+    def _count_votes(self, knn_ids):
+        """Count neighbors of each class for every row of `knn_ids`
+
+        Returns
+        -------
+        ndarray
+          (number of rows in `knn_ids` x number of unique labels) array
+          with counts for classes in the order of unique labels.
         """
-        # local bindings
-        _data = self.__data
+        nlabels = len(self.__data.sa[self.get_space()].unique)
+        nn_label_ids = self.__label_ids[knn_ids]
+        # offset label ids of each row, so a single bincount over the
+        # flattened array counts labels for all rows
+        offsets = nlabels * np.arange(len(nn_label_ids))[:, None]
+        nbins = nlabels * len(nn_label_ids)
+        # bincount insists on positive minlength, thus max and trim back
+        counts = np.bincount((nn_label_ids + offsets).ravel(),
+                             minlength=max(nbins, 1))[:nbins]
+        return counts.reshape(len(nn_label_ids), nlabels)
 
-        targets_sa_name = self.get_space()
-        targets_sa = _data.sa[targets_sa_name]
 
-        labels = targets_sa.value
-        uniquelabels = targets_sa.unique
+    ##REF: Name was automagically refactored
+    def get_majority_vote(self, knn_ids):
+        """Simple voting by choosing the majority of class neighbors.
 
-        # number of occerences for each unique class in kNNs
-        votes = self.__votes_init.copy()
-        for nn in knn_ids:
-            votes[labels[nn]] += 1
+        Parameters
+        ----------
+        knn_ids : ndarray
+          (number of test samples x k) array of indices of the nearest
+          training samples.
+
+        Returns
+        -------
+        predictions, votes
+          Winning label per test sample, and number of votes per class
+          (in the order of unique labels).
+        """
+        uniquelabels = self.__data.sa[self.get_space()].unique
+        votes = self._count_votes(knn_ids)
 
         # find the class with most votes
         # return votes as well to store them in the state
-        if _dict_has_key:
-            # approx 5% faster implementation than below
-            maxvotes = max(votes.iteritems(), key=lambda x:x[1])[0]
-        else:
-            # no key keyword for max in elderly versions
-            maxvotes = max([(v, k) for k, v in votes.iteritems()])[1]
-
-        return maxvotes, \
-                [votes[ul] for ul in uniquelabels] # transform into lists
+        return uniquelabels[votes.argmax(axis=1)], votes
 
 
     ##REF: Name was automagically refactored
     def get_weighted_vote(self, knn_ids):
         """Vote with classes weighted by the number of samples per class.
-        """
-        # local bindings
-        _data = self.__data
-        targets_sa_name = self.get_space()
-        targets_sa = _data.sa[targets_sa_name]
 
-        uniquelabels = targets_sa.unique
+        Parameters
+        ----------
+        knn_ids : ndarray
+          (number of test samples x k) array of indices of the nearest
+          training samples.
+
+        Returns
+        -------
+        predictions, votes
+          Winning label per test sample, and weighted votes per class
+          (in the order of unique labels).
+        """
+        uniquelabels = self.__data.sa[self.get_space()].unique
 
         # Lazy evaluation
         if self.__weights is None:
@@ -225,37 +259,23 @@ class kNN(Classifier):
             # It seemed to Yarik that this has to be evaluated just once per
             # training dataset.
             #
-            self.__labels = labels = targets_sa.value
-            Nlabels = len(labels)
-            Nuniquelabels = len(uniquelabels)
-
-            # TODO: To get proper speed up for the next line only,
-            #       histogram should be computed
-            #       via sorting + counting "same" elements while reducing.
-            #       Guaranteed complexity is NlogN whenever now it is N^2
+            Nlabels = len(self.__label_ids)
             # compute the relative proportion of samples belonging to each
-            # class (do it in one loop to improve speed and reduce readability
-            self.__weights = \
-                [ 1.0 - ((labels == label).sum() / Nlabels) \
-                    for label in uniquelabels ]
-            self.__weights = dict(zip(uniquelabels, self.__weights))
-
-        labels = self.__labels
-        # number of occerences for each unique class in kNNs
-        votes = self.__votes_init.copy()
-        for nn in knn_ids:
-            votes[labels[nn]] += 1
+            # class
+            counts = np.bincount(self.__label_ids,
+                                 minlength=len(uniquelabels))
+            self.__weights = 1.0 - (counts / float(Nlabels))
 
         # weight votes
-        votes = [ self.__weights[ul] * votes[ul] for ul in uniquelabels]
+        votes = self.__weights * self._count_votes(knn_ids)
 
         # find the class with most votes
         # return votes as well to store them in the state
-        return uniquelabels[np.asarray(votes).argmax()], \
-               votes
+        return uniquelabels[votes.argmax(axis=1)], votes
 
 
     def _untrain(self):
         """Reset trained state"""
         self.__data = None
+        self.__label_ids = None
         super(kNN, self)._untrain()
@@ -30,11 +30,42 @@ elif sys.platform == 'darwin':
 else:
     smlrlib = np.ctypeslib.load_library('smlrc', os.path.dirname(__file__))
 
+def openmp_enabled():
+    """Whether the library was built with OpenMP support"""
+    return bool(smlrlib.smlr_openmp_enabled())
+
 # wrap the stepwise function
-def stepwise_regression(*args):
+def stepwise_regression(w, X, XY, Xw, E, auto_corr, lambda_over_2_auto_corr,
+                        S, M, maxiter, convergence_tol, resamp_decay,
+                        min_resamp, verbose, seed, has_bias=False,
+                        nthreads=1):
+    """Run SMLR's stepwise regression in C
+
+    Samples `X` might be either float32 or float64 and are used as is,
+    i.e. views with arbitrary strides (e.g. Fortran-ordered) are not
+    copied.  If `has_bias`, `X` must not contain a column of ones -- the
+    last row of `w` corresponds to the implicit bias term then.
+    Sums over samples are computed by `nthreads` threads (0 for all
+    available cores) if the library was built with OpenMP.
+    """
+    if X.dtype == np.float32:
+        X_is_float = 1
+    elif X.dtype == np.float64:
+        X_is_float = 0
+    else:
+        raise ValueError, "Samples must be float32 or float64, got %s" \
+              % X.dtype
+    if X.ndim != 2 or len(w) != X.shape[1] + int(has_bias):
+        raise ValueError, "Shape of samples %s does not match weights %s" \
+              % (X.shape, w.shape)
+    if seed is None:
+        # C code seeds from the current time then
+        seed = 0
     func = smlrlib.stepwise_regression
     func.argtypes = [C.c_int, C.c_int, c_darray,
-                     C.c_int, C.c_int, c_darray,
+                     C.c_int, C.c_int, C.c_void_p,
+                     C.c_long, C.c_long, C.c_int,
+                     C.c_int,
                      C.c_int, C.c_int, c_darray,
                      C.c_int, C.c_int, c_darray,
                      C.c_int, C.c_int, c_darray,
@@ -46,11 +77,20 @@ def stepwise_regression(*args):
                      C.c_double,
                      C.c_float,
                      C.c_float,
-                     C.c_int64]
+                     C.c_int,
+                     C.c_int64,
+                     C.c_int]
     func.restype = C.c_long
 
     # get the new arglist
-    arglist = extend_args(*args)
+    arglist = extend_args(w) \
+              + [X.shape[0], X.shape[1], X.ctypes.data,
+                 X.strides[0], X.strides[1], X_is_float,
+                 int(has_bias)] \
+              + extend_args(XY, Xw, E, auto_corr, lambda_over_2_auto_corr,
+                            S, M, maxiter, convergence_tol, resamp_decay,
+                            min_resamp, verbose, seed) \
+              + [nthreads]
     return func(*arglist)
 
 if __debug__:
@@ -9,9 +9,99 @@
 
 #include <Python.h>
 
+#ifdef _OPENMP
+#include <omp.h>
+#endif
+
+/* Samples are passed as a raw buffer of either float or double values with
+ * arbitrary strides (in bytes), so that neither single precision data nor
+ * non-contiguous (e.g. Fortran-ordered) views need to be copied.  Optional
+ * bias is handled as an implicit last basis of ones.  All accumulations are
+ * done in double precision.
+ */
+
+/* Sums over samples are split into blocks of a fixed size, which get
+ * distributed across threads.  Partial sums are combined in the order of
+ * the blocks, so the results do not depend on the number of threads (or on
+ * OpenMP being available at all).
+ */
+#define SAMPLES_BLOCK 256
+
+/* sum_{i=start}^{stop-1} X[i][basis] * E[i][m] / S[i] */
+static double
+column_dot_p(const char *Xcol, long X_stride_row, int X_is_float, int is_bias,
+	     int start, int stop, int E_cols, double E[][E_cols], int m,
+	     double S[])
+{
+  double XdotP = 0.0;
+  int i;
+
+  if (is_bias)
+    for (i=start; i<stop; i++)
+      XdotP += E[i][m]/S[i];
+  else if (X_is_float)
+    for (i=start; i<stop; i++)
+      XdotP += (double)*(const float *)(Xcol + i*X_stride_row) * E[i][m]/S[i];
+  else
+    for (i=start; i<stop; i++)
+      XdotP += *(const double *)(Xcol + i*X_stride_row) * E[i][m]/S[i];
+
+  return XdotP;
+}
+
+/* column_dot_p over all samples, blockwise across threads */
+static double
+column_dot_p_blocked(const char *Xcol, long X_stride_row, int X_is_float,
+		     int is_bias, int ns, int E_cols, double E[][E_cols], int m,
+		     double S[], double partial[], int nthreads)
+{
+  int nblocks = (ns + SAMPLES_BLOCK - 1) / SAMPLES_BLOCK;
+  double XdotP = 0.0;
+  int b;
+
+#pragma omp parallel for num_threads(nthreads) schedule(static) \
+  if (nthreads > 1 && nblocks > 1)
+  for (b=0; b<nblocks; b++)
+  {
+    int stop = (b+1)*SAMPLES_BLOCK;
+    partial[b] = column_dot_p(Xcol, X_stride_row, X_is_float, is_bias,
+			      b*SAMPLES_BLOCK, stop < ns ? stop : ns,
+			      E_cols, E, m, S);
+  }
+
+  for (b=0; b<nblocks; b++)
+    XdotP += partial[b];
+
+  return XdotP;
+}
+
+/* X[i][basis] value */
+static inline double
+x_value(const char *Xcol, long X_stride_row, int X_is_float, int is_bias, int i)
+{
+  if (is_bias)
+    return 1.0;
+  if (X_is_float)
+    return (double)*(const float *)(Xcol + i*X_stride_row);
+  return *(const double *)(Xcol + i*X_stride_row);
+}
+
+/* Whether the library was built with OpenMP support */
+DL_EXPORT(int)
+smlr_openmp_enabled(void)
+{
+#ifdef _OPENMP
+  return 1;
+#else
+  return 0;
+#endif
+}
+
 DL_EXPORT(int)
 stepwise_regression(int w_rows, int w_cols, double w[w_rows][w_cols],
-			int X_rows, int X_cols, double X[X_rows][X_cols],
+			int X_rows, int X_cols, const char *X,
+			long X_stride_row, long X_stride_col, int X_is_float,
+			int has_bias,
 			int XY_rows, int XY_cols, double XY[XY_rows][XY_cols],
 			int Xw_rows, int Xw_cols, double Xw[Xw_rows][Xw_cols],
 			int E_rows, int E_cols, double E[E_rows][E_cols],
@@ -24,7 +114,8 @@ stepwise_regression(int w_rows, int w_cols, double w[w_rows][w_cols],
 			float resamp_decay,
 			float min_resamp,
 			int verbose,
-			long long int seed)
+			long long int seed,
+			int nthreads)
 {
   // initialize the iterative optimization
   double incr = DBL_MAX;
@@ -47,9 +138,27 @@ stepwise_regression(int w_rows, int w_cols, double w[w_rows][w_cols],
   int nd = w_rows;
   int ns = E_rows;
 
+  // samples of the current basis
+  const char *Xcol;
+  int is_bias;
+
   // loop indexes
   int i = 0;
 
+  // per-block partial sums over samples
+  double* partial = (double *)calloc((ns + SAMPLES_BLOCK - 1) / SAMPLES_BLOCK,
+				     sizeof(double));
+
+  // 0 stands for all available cores
+  if (nthreads <= 0)
+  {
+#ifdef _OPENMP
+    nthreads = omp_get_max_threads();
+#else
+    nthreads = 1;
+#endif
+  }
+
   // prob of resample each weight
   // allocate everything in heap -- not on stack
   float** p_resamp = (float **)calloc(w_rows, sizeof(float*));
@@ -63,7 +172,7 @@ stepwise_regression(int w_rows, int w_cols, double w[w_rows][w_cols],
 
   if (verbose)
   {
-    fprintf(stdout, "SMLR: random seed=%lld\n", seed);
+    fprintf(stdout, "SMLR: random seed=%lld ; threads=%d\n", seed, nthreads);
     fflush(stdout);
   }
 
@@ -102,12 +211,13 @@ stepwise_regression(int w_rows, int w_cols, double w[w_rows][w_cols],
 	rval = (float)rand()/(float)RAND_MAX;
 	if ((w_old != 0) || (rval < p_resamp[basis][m]))
 	{
+	  // the last basis is the implicit bias
+	  is_bias = has_bias && (basis == X_cols);
+	  Xcol = X + basis*X_stride_col;
+
 	  // calc the probability
-	  XdotP = 0.0;
-	  for (i=0; i<ns; i++)
-	  {
-	    XdotP += X[i][basis] * E[i][m]/S[i];
-	  }
+	  XdotP = column_dot_p_blocked(Xcol, X_stride_row, X_is_float, is_bias,
+				       ns, E_cols, E, m, S, partial, nthreads);
 
 	  // get the gradient
 	  grad = XY[basis][m] - XdotP;
@@ -185,9 +295,13 @@ stepwise_regression(int w_rows, int w_cols, double w[w_rows][w_cols],
 	  {
 	    // update the expected values
 	    w_diff = w_new - w_old;
+	    // samples are independent, so threads do not alter the results
+#pragma omp parallel for num_threads(nthreads) schedule(static) \
+	    private(E_new_m) if (nthreads > 1 && ns > SAMPLES_BLOCK)
 	    for (i=0; i<ns; i++)
 	    {
-	      Xw[i][m] += X[i][basis]*w_diff;
+	      Xw[i][m] += x_value(Xcol, X_stride_row, X_is_float, is_bias, i)
+		* w_diff;
 	      E_new_m = exp(Xw[i][m]);
 	      S[i] += E_new_m - E[i][m];
 	      E[i][m] = E_new_m;
@@ -231,6 +345,7 @@ stepwise_regression(int w_rows, int w_cols, double w[w_rows][w_cols],
     free(p_resamp[i]);
 
   free(p_resamp);
+  free(partial);
 
   return cycle;
 }
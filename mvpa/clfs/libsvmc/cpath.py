@@ -0,0 +1,190 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the PyMVPA package for the
+#   copyright and license terms.
+#
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Cross-validation of LIBSVM's SVMs along a path of C values."""
+
+__docformat__ = 'restructuredtext'
+
+import operator
+import numpy as np
+
+from mvpa.base.state import ConditionalAttribute
+from mvpa.clfs.distance import squared_euclidean_distance
+from mvpa.datasets.base import Dataset
+from mvpa.generators.splitters import _get_split_masks
+from mvpa.measures.base import Measure
+from mvpa.misc.errorfx import mean_mismatch_error
+
+from mvpa.clfs.libsvmc import _svm
+from mvpa.clfs.libsvmc.svm import SVM
+
+if __debug__:
+    from mvpa.base import debug
+
+__all__ = [ 'CPathCrossValidation' ]
+
+
+def _ls_kernel_matrix(kernel, data1, data2):
+    """Compute kernel matrix the way LIBSVM would do for a given `LSKernel`
+    """
+    kp = kernel.params
+    name = kernel.__kernel_name__
+    if name == 'linear':
+        return np.dot(data1, data2.T)
+    elif name == 'rbf':
+        return np.exp(-kp.gamma * squared_euclidean_distance(data1, data2))
+    elif name == 'poly':
+        return np.power(kp.gamma * np.dot(data1, data2.T) + kp.coef0,
+                        kp.degree)
+    elif name == 'sigmoid':
+        return np.tanh(kp.gamma * np.dot(data1, data2.T) + kp.coef0)
+    raise ValueError, "Do not know how to precompute kernel %s" % kernel
+
+
+class CPathCrossValidation(Measure):
+    """Cross-validate a LIBSVM SVM for a whole sequence of C values.
+
+    Tuning C via a plain `CrossValidation` per each candidate value
+    recomputes the kernel matrix and reconverts the data into LIBSVM
+    representation for every fold and every C.  This measure computes
+    the kernel matrix for the full dataset only once, and for every
+    fold constructs the LIBSVM problem from its precomputed
+    sub-matrix once, so that all C values of a fold share the same
+    kernel values.  The result is a dataset with one sample per fold
+    and one feature per C value, i.e. the per-C error curve of every
+    fold, thus it could readily be used for (nested) selection of C.
+
+    Notes
+    -----
+    LIBSVM provides no means to initialize the solver with a previous
+    solution, thus each C value is still solved from scratch.
+
+    Generated datasets might contain any subset of the samples in any
+    order (e.g. when balanced), since they are related back to the
+    precomputed kernel matrix via a sample attribute `idattr`.
+    """
+
+    idattr = 'cpath_sample_ids'
+    """Sample attribute storing the index of a sample in the original
+    dataset"""
+
+    best_C = ConditionalAttribute(enabled=True, doc=
+       """C value providing the lowest error averaged across all folds""")
+
+    is_trained = True
+    """Indicate that this measure is always trained."""
+
+    def __init__(self, clf, generator, Cs, errorfx=mean_mismatch_error,
+                 **kwargs):
+        """
+        Parameters
+        ----------
+        clf : SVM
+          LIBSVM-based SVM with a C parameter (e.g. C-SVM or epsilon-SVR)
+          which serves as a template: all its parameters besides C are
+          used as is.
+        generator : Node
+          Generator used to partition the input dataset into multiple
+          instances.  The ``space`` of this generator determines the
+          attribute which is used to split each generated dataset into
+          training and testing sets.
+        Cs : sequence of float
+          C values to evaluate.  As for `SVM`, negative values get
+          scaled by the default C estimated from the training data.
+          Per-class C values or weights are not supported.
+        errorfx : callable
+          Custom implementation of an error function. The callable needs to
+          accept two arguments (1. predicted values, 2. target values).
+        """
+        Measure.__init__(self, **kwargs)
+        if not isinstance(clf, SVM) or not clf.params.has_key('C'):
+            raise ValueError, "%s requires a LIBSVM SVM with parameter C, " \
+                  "got %s" % (self.__class__.__name__, clf)
+        C = clf.params.C
+        if (operator.isSequenceType(C) and len(C) > 1) \
+               or len(clf.params.weight) or len(clf.params.weight_label):
+            raise ValueError, "%s does not support per-class C values or " \
+                  "weights, got %s" % (self.__class__.__name__, clf)
+        self._clf = clf
+        self._generator = generator
+        self._Cs = np.asanyarray(Cs, dtype=float)
+        self._errorfx = errorfx
+
+
+    def _call(self, ds):
+        clf = self._clf
+        generator = self._generator
+        errorfx = self._errorfx
+        Cs = self._Cs
+        is_regression = clf.__is_regression__
+        space = clf.get_space()
+
+        samples = ds.samples
+        # libsvm cannot handle literal labels
+        utargets = ds.sa[space].unique
+
+        # kernel matrix is computed only once for all folds and all Cs
+        kernel = _ls_kernel_matrix(clf.params.kernel, samples, samples)
+        libsvm_param = clf._get_libsvm_param(kernel_type=_svm.PRECOMPUTED)
+
+        # mark samples to relate generated datasets to the kernel matrix
+        ds = ds.copy(deep=False)
+        ds.sa[self.idattr] = np.arange(len(ds))
+
+        errors = []
+        for sds in generator.generate(ds):
+            train_mask, test_mask = _get_split_masks(sds,
+                                                     generator.get_space())
+            # rows of the kernel matrix
+            ids = sds.sa[self.idattr].value
+            train = ids[train_mask]
+            test = ids[test_mask]
+            # targets as provided by the generator (e.g. permuted ones)
+            targets = sds.sa[space].value
+            if is_regression:
+                labels = np.asanyarray(targets[train_mask], dtype=float)
+            else:
+                labels = np.searchsorted(utargets, targets[train_mask])
+            if __debug__:
+                debug('SVM', "C-path: fold with %d training and %d testing "
+                      "samples" % (len(train), len(test)))
+
+            # in precomputed mode, 0th element of a sample is its serial
+            # number within the training set
+            train_kernel = np.hstack((np.arange(1, len(train) + 1)[:, None],
+                                      kernel[np.ix_(train, train)]))
+            svmprob = _svm.SVMProblem(labels.tolist(), train_kernel)
+            test_nodes = [_svm.seq_to_svm_node(np.r_[0, k])
+                          for k in kernel[np.ix_(test, train)]]
+
+            fold_errors = []
+            default_c = None
+            for C in Cs:
+                if C < 0:
+                    if default_c is None:
+                        default_c = clf._get_default_c(samples[train])
+                    C = default_c * abs(C)
+                libsvm_param._set_parameter('C', C)
+                model = _svm.SVMModel(svmprob, libsvm_param)
+                predictions = [_svm.svmc.svm_predict(model.model, n)
+                               for n in test_nodes]
+                del model
+                predictions = np.asanyarray(predictions)
+                if not is_regression:
+                    predictions = utargets[predictions.astype(int)]
+                fold_errors.append(errorfx(predictions, targets[test_mask]))
+            for n in test_nodes:
+                _svm.svmc.svm_node_array_destroy(n)
+            del svmprob
+            errors.append(fold_errors)
+
+        errors = np.array(errors)
+        self.ca.best_C = Cs[np.argmin(np.mean(errors, axis=0))]
+        return Dataset(errors,
+                       sa={'cvfolds': np.arange(len(errors))},
+                       fa={'C': Cs})
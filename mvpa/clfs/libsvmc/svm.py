@@ -120,20 +120,15 @@ class SVM(_SVM):
 
 
 
-    def _train(self, dataset):
-        """Train SVM
+    def _get_libsvm_param(self, kernel_type=None):
+        """Translate parameters into libsvm's `SVMParameter`
+
+        Parameters
+        ----------
+        kernel_type : int or None
+          libsvm kernel type ID to be used instead of the one of the
+          assigned kernel (e.g. `PRECOMPUTED`).
         """
-        targets_sa_name = self.get_space()    # name of targets sa
-        targets_sa = dataset.sa[targets_sa_name] # actual targets sa
-
-        # libsvm needs doubles
-        src = _data2ls(dataset)
-
-        # libsvm cannot handle literal labels
-        labels = self._attrmap.to_numeric(targets_sa.value).tolist()
-
-        svmprob = _svm.SVMProblem(labels, src )
-
         # Translate few params
         TRANSLATEDICT = {'epsilon': 'eps',
                          'tube_epsilon': 'p'}
@@ -151,14 +146,32 @@ class SVM(_SVM):
                 continue
             args.append( (argname, param.value) )
 
+        if kernel_type is None:
+            kernel_type = self.params.kernel.as_raw_ls() # Just an integer ID
+
         # ??? All those parameters should be fetched if present from
         # **kwargs and create appropriate parameters within .params or
         # .kernel_params
-        libsvm_param = _svm.SVMParameter(
-            kernel_type=self.params.kernel.as_raw_ls(),# Just an integer ID
-            svm_type=self._svm_type,
-            **dict(args))
-        
+        return _svm.SVMParameter(kernel_type=kernel_type,
+                                 svm_type=self._svm_type,
+                                 **dict(args))
+
+
+    def _train(self, dataset):
+        """Train SVM
+        """
+        targets_sa_name = self.get_space()    # name of targets sa
+        targets_sa = dataset.sa[targets_sa_name] # actual targets sa
+
+        # libsvm needs doubles
+        src = _data2ls(dataset)
+
+        # libsvm cannot handle literal labels
+        labels = self._attrmap.to_numeric(targets_sa.value).tolist()
+
+        svmprob = _svm.SVMProblem(labels, src )
+
+        libsvm_param = self._get_libsvm_param()
         """Store SVM parameters in libSVM compatible format."""
 
         if self.params.has_key('C'):#svm_type in [_svm.svmc.C_SVC]:
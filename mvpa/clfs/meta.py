@@ -25,6 +25,7 @@ import operator
 import numpy as np
 
 from mvpa.misc.args import group_kwargs
+from mvpa.misc.support import parallel_map
 from mvpa.base.param import Parameter
 
 from mvpa.generators.splitters import Splitter
@@ -36,6 +37,7 @@ from mvpa.base.state import ConditionalAttribute, ClassWithCollections, \
      Harvestable
 
 from mvpa.clfs.base import Classifier
+from mvpa.kernels.base import CachedKernel
 from mvpa.clfs.distance import cartesian_distance
 from mvpa.misc.transformers import first_axis_mean
 
@@ -52,6 +54,13 @@ if __debug__:
     from mvpa.base import debug
 
 
+def _get_kernel(clf):
+    """Kernel of a kernel-based classifier, or None"""
+    if clf.params.has_key('kernel'):
+        return clf.params.kernel
+    return getattr(clf, 'kernel', None)
+
+
 class BoostedClassifier(Classifier, Harvestable):
     """Classifier containing the farm of other classifiers.
 
@@ -69,7 +78,7 @@ class BoostedClassifier(Classifier, Harvestable):
 
     def __init__(self, clfs=None, propagate_ca=True,
                  harvest_attribs=None, copy_attribs='copy',
-                 **kwargs):
+                 nthreads=1, **kwargs):
         """Initialize the instance.
 
         Parameters
@@ -81,6 +90,11 @@ class BoostedClassifier(Classifier, Harvestable):
           It is in effect only when slaves get assigned - so if state
           is enabled not during construction, it would not necessarily
           propagate into slaves
+        nthreads : None or int
+          How many threads to use to train and predict with slave
+          classifiers concurrently.  If None -- all available cores will
+          be used.  Results are collected in the order of the slave
+          classifiers, so they do not depend on the number of threads.
         kwargs : dict
           dict of keyworded arguments which might get used
           by State or Classifier
@@ -97,6 +111,9 @@ class BoostedClassifier(Classifier, Harvestable):
         self.__propagate_ca = propagate_ca
         """Enable current enabled ca in slave classifiers"""
 
+        self.__nthreads = nthreads
+        """Number of threads to run slave classifiers with"""
+
         self._set_classifiers(clfs)
         """Store the list of classifiers"""
 
@@ -113,8 +130,7 @@ class BoostedClassifier(Classifier, Harvestable):
     def _train(self, dataset):
         """Train `BoostedClassifier`
         """
-        for clf in self.__clfs:
-            clf.train(dataset)
+        self._map_clfs(lambda clf: clf.train(dataset))
 
 
     def _posttrain(self, dataset):
@@ -143,7 +159,7 @@ class BoostedClassifier(Classifier, Harvestable):
     def _predict(self, dataset):
         """Predict using `BoostedClassifier`
         """
-        raw_predictions = [ clf.predict(dataset) for clf in self.__clfs ]
+        raw_predictions = self._map_clfs(lambda clf: clf.predict(dataset))
         self.ca.raw_predictions = raw_predictions
         assert(len(self.__clfs)>0)
         if self.ca.is_enabled("estimates"):
@@ -159,6 +175,17 @@ class BoostedClassifier(Classifier, Harvestable):
         return raw_predictions
 
 
+    def _map_clfs(self, func, args=None):
+        """Apply `func` to each of `args` (slave classifiers by default)
+
+        Up to `nthreads` threads are used.  Results are returned in the
+        order of `args`.
+        """
+        if args is None:
+            args = self.__clfs
+        return parallel_map(func, args, self.__nthreads)
+
+
     def _set_classifiers(self, clfs):
         """Set the classifiers used by the boosted classifier
 
@@ -203,6 +230,8 @@ class BoostedClassifier(Classifier, Harvestable):
     clfs = property(fget=lambda x:x.__clfs,
                     fset=_set_classifiers,
                     doc="Used classifiers")
+    nthreads = property(fget=lambda x:x.__nthreads,
+                        doc="Number of threads to run slave classifiers with")
 
 
 
@@ -947,21 +976,13 @@ class BinaryClassifier(ProxyClassifier):
         """Train `BinaryClassifier`
         """
         targets_sa_name = self.get_space()
-        idlabels = [(x, +1) for x in get_samples_by_attr(dataset, targets_sa_name,
-                                                         self.__poslabels)] + \
-                    [(x, -1) for x in get_samples_by_attr(dataset, targets_sa_name,
-                                                          self.__neglabels)]
-        # XXX we have to sort ids since at the moment Dataset.select_samples
-        #     doesn't take care about order
-        idlabels.sort()
+        targets = dataset.sa[targets_sa_name].value
+        pos = np.in1d(targets, self.__poslabels)
+        selected = pos | np.in1d(targets, self.__neglabels)
 
         # If we need all samples, why simply not perform on original
-        # data, an just store/restore labels. But it really should be done
-        # within Dataset.select_samples
-        if len(idlabels) == dataset.nsamples \
-            and [x[0] for x in idlabels] == range(dataset.nsamples):
-            # the last condition is not even necessary... just overly
-            # cautious
+        # data, an just store/restore labels.
+        if selected.all():
             datasetselected = dataset.copy(deep=False)   # no selection is needed
             if __debug__:
                 debug('CLFBIN',
@@ -970,17 +991,19 @@ class BinaryClassifier(ProxyClassifier):
                       " classification among labels %s/+1 and %s/-1" %
                       (self.__poslabels, self.__neglabels))
         else:
-            datasetselected = dataset[[ x[0] for x in idlabels ]]
+            # ids come out sorted, so the order of samples is preserved
+            datasetselected = dataset[np.where(selected)[0]]
+            pos = pos[selected]
             if __debug__:
                 debug('CLFBIN',
                       "Selected %d samples out of %d samples for binary " %
-                      (len(idlabels), dataset.nsamples) +
+                      (datasetselected.nsamples, dataset.nsamples) +
                       " classification among labels %s/+1 and %s/-1" %
                       (self.__poslabels, self.__neglabels) +
                       ". Selected %s" % datasetselected)
 
         # adjust the labels
-        datasetselected.sa[targets_sa_name].value = [ x[1] for x in idlabels ]
+        datasetselected.sa[targets_sa_name].value = np.where(pos, 1, -1)
 
         # now we got a dataset with only 2 labels
         if __debug__:
@@ -1062,6 +1085,18 @@ class MulticlassClassifier(CombinedClassifier):
         """
         targets_sa_name = self.get_space()
 
+        # cache the kernel once for all binary classifiers -- clones share
+        # the cache of a CachedKernel, and binary classifiers operate on
+        # subsets of the same samples.  Clones are made of a private copy
+        # of the template, so the cache does not get attached to it
+        template = self.__clf.clone()
+        kernel = _get_kernel(template)
+        if isinstance(kernel, CachedKernel) and not kernel.is_cached(dataset):
+            if __debug__:
+                debug("CLFMC", "Caching %s to be shared by binary classifiers"
+                      % kernel)
+            kernel.compute(dataset)
+
         # construct binary classifiers
         ulabels = dataset.sa[targets_sa_name].unique
         if self.__bclf_type == "1-vs-1":
@@ -1069,7 +1104,7 @@ class MulticlassClassifier(CombinedClassifier):
             biclfs = []
             for i in xrange(len(ulabels)):
                 for j in xrange(i+1, len(ulabels)):
-                    clf = self.__clf.clone()
+                    clf = template.clone()
                     biclfs.append(
                         BinaryClassifier(
                             clf,
@@ -1087,6 +1122,14 @@ class MulticlassClassifier(CombinedClassifier):
         CombinedClassifier._train(self, dataset)
 
 
+    def _untrain(self):
+        """Untrain and release binary classifiers (and their shared kernel
+        cache)
+        """
+        super(MulticlassClassifier, self)._untrain()
+        self.clfs = []
+
+
 
 class SplitClassifier(CombinedClassifier):
     """`BoostedClassifier` to work on splits of the data
@@ -1182,15 +1225,20 @@ class SplitClassifier(CombinedClassifier):
 
         self.ca.splits = []
 
-        for i, pset in enumerate(self.__partitioner.generate(dataset)):
-            if __debug__:
-                debug("CLFSPL", "Training classifier for split %d" % (i))
+        def gen_splits():
+            for i, pset in enumerate(self.__partitioner.generate(dataset)):
+                # split partitioned dataset
+                split = [d for d in self.__splitter.generate(pset)]
 
-            # split partitioned dataset
-            split = [d for d in self.__splitter.generate(pset)]
+                if ca.is_enabled("splits"):
+                    self.ca.splits.append(split)
 
-            if ca.is_enabled("splits"):
-                self.ca.splits.append(split)
+                yield i, split
+
+        def train_split(isplit):
+            i, split = isplit
+            if __debug__:
+                debug("CLFSPL", "Training classifier for split %d" % (i))
 
             clf = self.clfs[i]
 
@@ -1205,10 +1253,16 @@ class SplitClassifier(CombinedClassifier):
                 clf.testdataset = None
 
             if ca.is_enabled("stats"):
-                predictions = clf.predict(split[1])
-                self.ca.stats.add(split[1].sa[targets_sa_name].value,
-                                          predictions,
-                                          clf.ca.get('estimates', None))
+                return (split[1].sa[targets_sa_name].value,
+                        clf.predict(split[1]),
+                        clf.ca.get('estimates', None))
+
+        # train (possibly concurrently) and collect summaries in the
+        # order of splits
+        results = self._map_clfs(train_split, gen_splits())
+        for i, (clf, result) in enumerate(zip(self.clfs, results)):
+            if ca.is_enabled("stats"):
+                self.ca.stats.add(*result)
                 if __debug__:
                     dact = debug.active
                     if 'CLFSPL_' in dact:
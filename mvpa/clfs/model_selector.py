@@ -51,6 +51,15 @@ class ModelSelector(object):
     def __init__(self, parametric_model, dataset):
         """TODO:
         """
+        params = getattr(parametric_model, 'params', None)
+        if params is not None and params.has_key('ninducing') \
+               and params.ninducing is not None \
+               and params.ninducing < dataset.nsamples:
+            raise ValueError, \
+                  "Model selection requires gradients of the log marginal " \
+                  "likelihood which are not available for low-rank GPR " \
+                  "(ninducing=%d). Use exact GPR (ninducing=None) instead." \
+                  % params.ninducing
         self.parametric_model = parametric_model
         self.dataset = dataset
         self.hyperparameters_best = None
@@ -15,15 +15,27 @@ import numpy as np
 from mvpa.base import externals
 
 if externals.exists("scipy", raise_=True):
-    from scipy.linalg import lstsq
+    from scipy.linalg import lstsq, svd
 
+from mvpa.base.learner import SufficientStatsLearner
 from mvpa.clfs.base import Classifier, accepts_dataset_as_samples
+from mvpa.measures.base import FeaturewiseMeasure
+from mvpa.datasets.base import Dataset
 
-class RidgeReg(Classifier):
+if __debug__:
+    from mvpa.base import debug
+
+class RidgeReg(SufficientStatsLearner, Classifier):
     """Ridge regression `Classifier`.
 
     This ridge regression adds an intercept term so your labels do not
     have to be zero-centered.
+
+    Since the solution depends on the data only through X^T X and X^T y,
+    the regression could be trained incrementally (see
+    `SufficientStatsLearner`).  Regular training does not compute these
+    statistics -- they get computed from the training dataset only once
+    incremental training needs them.
     """
 
     __tags__ = ['ridge', 'regression', 'linear']
@@ -43,6 +55,7 @@ class RidgeReg(Classifier):
 
         # pylint happiness
         self.w = None
+        self._stats = None
 
         # It does not make sense to calculate a confusion matrix for a
         # ridge regression
@@ -69,31 +82,96 @@ class RidgeReg(Classifier):
     def _train(self, data):
         """Train the classifier using `data` (`Dataset`).
         """
-
         if self.__implementation == "direct":
-            # create matrices to solve with additional penalty term
-            # determine the lambda matrix
-            if self.__lm is None:
-                # Not specified, so calculate based on .05*nfeatures
-                Lambda = .05*data.nfeatures*np.eye(data.nfeatures)
+            stats = self._get_provided_stats(data)
+            if stats is None:
+                # augmented least squares problem is better conditioned
+                # than the normal equations -- statistics are needed only
+                # for incremental training
+                self.w = self._solve_augmented(data)
+                self._defer_stats(data)
             else:
-                # use the provided penalty
-                Lambda = self.__lm*np.eye(data.nfeatures)
-
-            # add the penalty term
-            a = np.concatenate( \
-                (np.concatenate((data.samples, np.ones((data.nsamples, 1))), 1),
-                    np.concatenate((Lambda, np.zeros((data.nfeatures, 1))), 1)))
-            b = np.concatenate((data.sa[self.get_space()].value,
-                               np.zeros(data.nfeatures)))
-
-            # perform the least sq regression and save the weights
-            self.w = lstsq(a, b)[0]
+                self._stats = stats
+                self._set_estimates()
         else:
             raise ValueError, "Unknown implementation '%s'" \
                               % self.__implementation
 
 
+    def _get_lm(self, nfeatures):
+        """Penalty term for a given number of features"""
+        if self.__lm is None:
+            # Not specified, so calculate based on .05*nfeatures
+            return .05 * nfeatures
+        # use the provided penalty
+        return self.__lm
+
+
+    def _solve_augmented(self, data):
+        """Solve the penalized least squares problem on the samples
+        """
+        # add the penalty term as additional rows of the data matrix
+        Lambda = self._get_lm(data.nfeatures) * np.eye(data.nfeatures)
+        a = np.concatenate( \
+            (np.concatenate((data.samples, np.ones((data.nsamples, 1))), 1),
+                np.concatenate((Lambda, np.zeros((data.nfeatures, 1))), 1)))
+        b = np.concatenate((data.sa[self.get_space()].value,
+                           np.zeros(data.nfeatures)))
+
+        # perform the least sq regression
+        return lstsq(a, b)[0]
+
+
+    def _compute_stats(self, data):
+        # additional column of ones to model the intercept
+        samples = np.concatenate((data.samples, np.ones((data.nsamples, 1))),
+                                 1)
+        targets = np.asanyarray(data.sa[self.get_space()].value)
+        return (data.nsamples,
+                np.dot(samples.T, samples),
+                np.dot(samples.T, targets))
+
+
+    def _merge_stats(self, stats1, stats2, subtract=False):
+        if subtract:
+            if stats2[0] >= stats1[0]:
+                raise ValueError, "Cannot remove all samples"
+            return tuple([s1 - s2 for s1, s2 in zip(stats1, stats2)])
+        return tuple([s1 + s2 for s1, s2 in zip(stats1, stats2)])
+
+
+    def _get_stats_nfeatures(self, stats):
+        return len(stats[1]) - 1
+
+
+    def _get_stats_nsamples(self, stats):
+        return stats[0]
+
+
+    def _set_estimates(self):
+        """Solve the penalized least squares problem given statistics
+        """
+        nsamples, xtx, xty = self._stats
+        nfeatures = len(xtx) - 1
+        lm = self._get_lm(nfeatures)
+
+        # add the penalty term (rows lm*I appended to the data matrix,
+        # leaving the intercept unpenalized) to the normal equations
+        penalty = np.zeros(len(xtx))
+        penalty[:nfeatures] = lm ** 2
+        a = xtx + np.diag(penalty)
+
+        # perform the least sq regression and save the weights
+        self.w = lstsq(a, xty)[0]
+
+
+    def _untrain(self):
+        self._stats = None
+        self._stats_ds = None
+        self.w = None
+        super(RidgeReg, self)._untrain()
+
+
     @accepts_dataset_as_samples
     def _predict(self, data):
         """
@@ -106,3 +184,106 @@ class RidgeReg(Classifier):
         self.ca.estimates = pred
         return pred
 
+
+
+
+class MultiRidgeReg(FeaturewiseMeasure):
+    """Ridge regressions of all features on a common design at once.
+
+    Every feature of a dataset (e.g. a voxel) is regressed on the same
+    design matrix (e.g. stimulus features of an encoding model), which
+    is stored in a samples attribute.  Regressions for all features and
+    all penalty terms get solved using a single SVD of the design, and
+    for each feature the penalty term with the lowest generalized
+    cross-validation (GCV) error gets selected.
+
+    Penalty terms are interpreted as in `RidgeReg`, i.e. lm**2 is added
+    to the diagonal of X^T X, and the intercept is not penalized.
+
+    Weight maps are returned as a dataset with a sample per regressor of
+    the design (indices in 'regressors' samples attribute).  Selected
+    penalty term and intercept of each feature are stored in 'lm' and
+    'intercept' feature attributes.
+    """
+
+    def __init__(self, space='design', lms=None, **kwargs):
+        """
+        Parameters
+        ----------
+        space : str
+          What samples attribute holds the (nsamples x nregressors) design
+          matrix.
+        lms : sequence of float, optional
+          Penalty terms to select from for each feature.
+          (Defaults to .05*nregressors)
+        """
+        FeaturewiseMeasure.__init__(self, auto_train=True, space=space,
+                                    **kwargs)
+        self._lms = lms
+
+
+    def __repr__(self, prefixes=None):
+        if prefixes is None:
+            prefixes = []
+        if self.get_space() != 'design':
+            prefixes = prefixes + ['space=%r' % (self.get_space())]
+        if self._lms is not None:
+            prefixes = prefixes + ['lms=%r' % (self._lms,)]
+        return super(MultiRidgeReg, self).__repr__(prefixes=prefixes)
+
+
+    def _call(self, dataset):
+        design = np.asanyarray(dataset.sa[self.get_space()].value, dtype=float)
+        if design.ndim == 1:
+            design = design[:, None]
+        nsamples, nregressors = design.shape
+        lms = self._lms
+        if lms is None:
+            lms = [.05 * nregressors]
+        lms = np.atleast_1d(np.asanyarray(lms, dtype=float))
+
+        # unpenalized intercept is equivalent to centering
+        xmean = design.mean(axis=0)
+        ymean = dataset.samples.mean(axis=0)
+        x = design - xmean
+        y = dataset.samples - ymean
+
+        u, s, vt = svd(x, full_matrices=False)
+        # discard components outside of the design's rank
+        nz = s > s.max() * max(x.shape) * np.finfo(s.dtype).eps
+        u, s, vt = u[:, nz], s[nz], vt[nz]
+        uty = np.dot(u.T, y)
+        s2 = s ** 2
+        # (nlms x ncomponents) shrinkage of the components
+        shrink = s2 / (s2 + lms[:, None] ** 2)
+
+        # GCV error for all penalty terms and features at once: residuals
+        # outside of the span of the design plus shrunk components
+        rss = (y ** 2).sum(axis=0) - (uty ** 2).sum(axis=0) \
+              + np.dot((1 - shrink) ** 2, uty ** 2)
+        dof = 1 - (shrink.sum(axis=1) + 1) / nsamples
+        # penalty terms leaving no degrees of freedom (too few samples)
+        # cannot be judged by GCV
+        valid = dof > np.finfo(float).eps
+        if not np.any(valid):
+            raise ValueError, \
+                  "GCV is undefined for all penalty terms %s since they " \
+                  "leave no degrees of freedom with %d samples. Provide " \
+                  "more samples or larger penalty terms." \
+                  % (lms, nsamples)
+        gcv = np.empty(rss.shape)
+        gcv[valid] = rss[valid] / (dof[valid, None] ** 2)
+        gcv[~valid] = np.inf
+        best = np.argmin(gcv, axis=0)
+        if __debug__:
+            debug("SA", "Selected penalty terms %s for %d features"
+                  % (np.bincount(best, minlength=len(lms)), len(best)))
+
+        # weights: V diag(s / (s^2 + lm^2)) U^T y for the selected lm
+        coef = (shrink / s)[best].T * uty
+        weights = np.dot(vt.T, coef)
+        intercept = ymean - np.dot(xmean, weights)
+
+        return Dataset(weights,
+                       sa={'regressors': np.arange(nregressors)},
+                       fa={'lm': lms[best], 'intercept': intercept})
@@ -11,16 +11,19 @@
 __docformat__ = 'restructuredtext'
 
 import numpy as np
+from functools import partial
 
 from mvpa.base import warning, externals
 from mvpa.clfs.base import Classifier, accepts_dataset_as_samples
-from mvpa.measures.base import Sensitivity
+from mvpa.measures.base import Measure, Sensitivity
+from mvpa.misc.errorfx import mean_mismatch_error
 from mvpa.misc.exceptions import ConvergenceError
 from mvpa.base.param import Parameter
 from mvpa.base.state import ConditionalAttribute
 from mvpa.datasets.base import Dataset
+from mvpa.generators.splitters import _get_split_masks
 
-__all__ = [ "SMLR", "SMLRWeights" ]
+__all__ = [ "SMLR", "SMLRWeights", "SMLRPathCrossValidation" ]
 
 
 _DEFAULT_IMPLEMENTATION = "Python"
@@ -28,6 +31,7 @@ if externals.exists('ctypes'):
     # Uber-fast C-version of the stepwise regression
     try:
         from mvpa.clfs.libsmlrc import stepwise_regression as _cStepwiseRegression
+        from mvpa.clfs.libsmlrc import openmp_enabled as _smlr_openmp_enabled
         _DEFAULT_IMPLEMENTATION = "C"
     except OSError, e:
         warning("Failed to load fast implementation of SMLR.  May be you "
@@ -42,6 +46,9 @@ else:
 if __debug__:
     from mvpa.base import debug
 
+# number of samples to convert to double at once
+_BLOCK_SIZE = 1024
+
 def _label2oneofm(labels, ulabels):
     """Convert labels to one-of-M form.
 
@@ -116,6 +123,13 @@ class SMLR(Classifier):
              doc="""Seed to be used to initialize random generator, might be
              used to replicate the run""")
 
+    nthreads = Parameter(1, allowedtype='None or int', min=1,
+             doc="""Number of threads to use for the weights updates in the C
+             implementation (if built with OpenMP), or None to use all
+             available cores.  Results for a given `seed` do not depend on
+             the number of threads.  Pays off only for large numbers of
+             samples.""")
+
     unsparsify = Parameter(False, allowedtype='bool',
              doc="""***EXPERIMENTAL*** Whether to unsparsify the weights via
              regression. Note that it likely leads to worse classifier
@@ -142,6 +156,11 @@ class SMLR(Classifier):
                     ' Using pure Python one')
             self.params.implementation = 'Python'
 
+        if self.params.nthreads != 1 and self.params.implementation == 'C' \
+               and not _smlr_openmp_enabled():
+            warning('SMLR: C implementation was built without OpenMP'
+                    ' support. Using a single thread')
+
         # pylint friendly initializations
         self._ulabels = None
         """Unigue labels from the training set."""
@@ -297,8 +316,15 @@ class SMLR(Classifier):
         return cycles
 
 
-    def _train(self, dataset):
-        """Train the classifier using `dataset` (`Dataset`).
+    def _get_training_data(self, dataset):
+        """Prepare everything necessary to run stepwise regression
+
+        Returns
+        -------
+        tuple
+          (samples; either they have a column of ones for the bias, or the
+          bias is implicit (C implementation); unique labels; targets in
+          one-of-M form; implementation of stepwise regression)
         """
         targets_sa_name = self.get_space()    # name of targets sa
         targets_sa = dataset.sa[targets_sa_name] # actual targets sa
@@ -306,40 +332,27 @@ class SMLR(Classifier):
         # Process the labels to turn into 1 of N encoding
         uniquelabels = targets_sa.unique
         labels = _label2oneofm(targets_sa.value, uniquelabels)
-        self._ulabels = uniquelabels.copy()
-
-        Y = labels
-        M = len(self._ulabels)
 
         # get the dataset information into easy vars
         X = dataset.samples
 
-        # see if we are adding a bias term
-        if self.params.has_bias:
-            if __debug__:
-                debug("SMLR_", "hstacking 1s for bias")
-
-            # append the bias term to the features
-            X = np.hstack((X, np.ones((X.shape[0], 1), dtype=X.dtype)))
-
         if self.params.implementation.upper() == 'C':
-            _stepwise_regression = _cStepwiseRegression
-            #
-            # TODO: avoid copying to non-contig arrays, use strides in ctypes?
-            if not (X.flags['C_CONTIGUOUS'] and X.flags['ALIGNED']):
-                if __debug__:
-                    debug("SMLR_",
-                          "Copying data to get it C_CONTIGUOUS/ALIGNED")
-                X = np.array(X, copy=True, dtype=np.double, order='C')
-
-            # currently must be double for the C code
-            if X.dtype != np.double:
+            # C implementation handles the bias implicitly and operates
+            # on single or double precision data with arbitrary strides,
+            # so no copy is necessary in most of the cases
+            if not X.dtype in (np.float32, np.float64):
                 if __debug__:
                     debug("SMLR_", "Converting data to double")
-                # must cast to double
                 X = X.astype(np.double)
+            elif not X.flags['ALIGNED']:
+                if __debug__:
+                    debug("SMLR_", "Copying data to get it ALIGNED")
+                X = np.array(X, copy=True)
+            _stepwise_regression = partial(_cStepwiseRegression,
+                                           has_bias=self.params.has_bias,
+                                           nthreads=self.params.nthreads or 0)
+            return X, True, uniquelabels, labels, _stepwise_regression
 
-        # set the feature dimensions
         elif self.params.implementation.upper() == 'PYTHON':
             _stepwise_regression = self._python_stepwise_regression
         else:
@@ -347,25 +360,51 @@ class SMLR(Classifier):
                   "Unknown implementation %s of stepwise_regression" % \
                   self.params.implementation
 
-        # set the feature dimensions
-        ns, nd = X.shape
+        # see if we are adding a bias term
+        if self.params.has_bias:
+            if __debug__:
+                debug("SMLR_", "hstacking 1s for bias")
 
-        # decide the size of weights based on num classes estimated
-        if self.params.fit_all_weights:
-            c_to_fit = M
-        else:
-            c_to_fit = M-1
+            # append the bias term to the features
+            X = np.hstack((X, np.ones((X.shape[0], 1), dtype=X.dtype)))
 
-        # Precompute what we can
-        auto_corr = ((M-1.)/(2.*M))*(np.sum(X*X, 0))
-        XY = np.dot(X.T, Y[:, :c_to_fit])
-        lambda_over_2_auto_corr = (self.params.lm/2.)/auto_corr
+        return X, False, uniquelabels, labels, _stepwise_regression
+
+
+    def _get_nd(self, X, implicit_bias):
+        """Number of weights per class"""
+        return X.shape[1] + int(implicit_bias and self.params.has_bias)
+
+
+    def _fit(self, stepwise_regression, X, implicit_bias, XY, auto_corr, M,
+             lm, w):
+        """Run stepwise regression for a given `lm`
+
+        Optimization starts from the weights `w` (e.g. a solution for a
+        different `lm`), which get updated in-place.
+
+        Returns
+        -------
+        int
+          Number of cycles it took to converge.
+        """
+        ns, nf = X.shape
+        lambda_over_2_auto_corr = (lm/2.)/auto_corr
 
         # set starting values
-        w = np.zeros((nd, c_to_fit), dtype=np.double)
-        Xw = np.zeros((ns, c_to_fit), dtype=np.double)
-        E = np.ones((ns, c_to_fit), dtype=np.double)
-        S = M*np.ones(ns, dtype=np.double)
+        Xw = np.zeros((ns, w.shape[1]), dtype=np.double)
+        if np.any(w):
+            # blockwise to not convert all the data to double at once
+            for start in xrange(0, ns, _BLOCK_SIZE):
+                Xw[start:start + _BLOCK_SIZE] = np.dot(
+                    np.asarray(X[start:start + _BLOCK_SIZE],
+                               dtype=np.double), w[:nf])
+            if len(w) > nf:
+                # implicit bias
+                Xw += w[nf]
+        E = np.exp(Xw)
+        # class(es) without fitted weights contribute exp(0)
+        S = np.sum(E, axis=1) + (M - w.shape[1])
 
         # set verbosity
         if __debug__:
@@ -375,30 +414,77 @@ class SMLR(Classifier):
             verbosity = 0
 
         # call the chosen version of stepwise_regression
-        cycles = _stepwise_regression(w,
-                                      X,
-                                      XY,
-                                      Xw,
-                                      E,
-                                      auto_corr,
-                                      lambda_over_2_auto_corr,
-                                      S,
-                                      M,
-                                      self.params.maxiter,
-                                      self.params.convergence_tol,
-                                      self.params.resamp_decay,
-                                      self.params.min_resamp,
-                                      verbosity,
-                                      self.params.seed)
+        cycles = stepwise_regression(w,
+                                     X,
+                                     XY,
+                                     Xw,
+                                     E,
+                                     auto_corr,
+                                     lambda_over_2_auto_corr,
+                                     S,
+                                     M,
+                                     self.params.maxiter,
+                                     self.params.convergence_tol,
+                                     self.params.resamp_decay,
+                                     self.params.min_resamp,
+                                     verbosity,
+                                     self.params.seed)
 
         if cycles >= self.params.maxiter:
             # did not converge
             raise ConvergenceError, \
                   "More than %d Iterations without convergence" % \
                   (self.params.maxiter)
+        return cycles
+
+
+    def _precompute(self, X, implicit_bias, Y, M):
+        """Precompute lm-independent terms of the stepwise regression"""
+        # decide the size of weights based on num classes estimated
+        if self.params.fit_all_weights:
+            c_to_fit = M
+        else:
+            c_to_fit = M-1
+        Y = Y[:, :c_to_fit]
+
+        # accumulate in double precision without creating temporary
+        # copies of the data
+        auto_corr = np.einsum('ij,ij->j', X, X, dtype=np.double)
+        if X.dtype == np.double:
+            XY = np.dot(X.T, Y)
+        else:
+            # sum samples of each class to not upcast the whole data
+            XY = np.empty((X.shape[1], c_to_fit), dtype=np.double)
+            for m in xrange(c_to_fit):
+                XY[:, m] = np.sum(X[Y[:, m] != 0], axis=0, dtype=np.double)
+        if self._get_nd(X, implicit_bias) > X.shape[1]:
+            # implicit bias term -- samples of all ones
+            auto_corr = np.hstack((auto_corr, [len(X)]))
+            XY = np.vstack((XY, np.sum(Y, axis=0)))
+        auto_corr *= ((M-1.)/(2.*M))
+        return auto_corr, XY, c_to_fit
+
+
+    def _train(self, dataset):
+        """Train the classifier using `dataset` (`Dataset`).
+        """
+        X, implicit_bias, uniquelabels, Y, _stepwise_regression = \
+           self._get_training_data(dataset)
+        self._ulabels = uniquelabels.copy()
+        M = len(self._ulabels)
+
+        # Precompute what we can
+        auto_corr, XY, c_to_fit = self._precompute(X, implicit_bias, Y, M)
+
+        w = np.zeros((self._get_nd(X, implicit_bias), c_to_fit),
+                     dtype=np.double)
+        cycles = self._fit(_stepwise_regression, X, implicit_bias,
+                           XY, auto_corr, M, self.params.lm, w)
 
         # see if unsparsify the weights
         if self.params.unsparsify:
+            if len(w) > X.shape[1]:
+                X = np.hstack((X, np.ones((X.shape[0], 1), dtype=X.dtype)))
             # unsparsify
             w = self._unsparsify_weights(X, w)
 
@@ -420,6 +506,60 @@ class SMLR(Classifier):
                   "min:max(data)=%f:%f, got min:max(w)=%f:%f" %
                   (np.min(X), np.max(X), np.min(w), np.max(w)))
 
+
+    def get_lm_path(self, dataset, lms):
+        """Compute weights for a sequence of penalty values
+
+        Optimization is performed for decreasing values of `lm` (i.e.
+        from sparse to dense solutions), each starting from the solution
+        for the previous value, while lm-independent terms are computed
+        only once.  Thus the whole path costs a small multiple of a single
+        training.  Classifier itself is not trained by this method.
+
+        Parameters
+        ----------
+        dataset : Dataset
+          Training data.
+        lms : sequence of float
+          Values of the penalty term lambda.
+
+        Returns
+        -------
+        ndarray
+          (len(lms) x nfeatures(+1 for bias) x nclasses(-1)) weights
+          (i.e. the same as SMLR would have in ``weights`` and ``biases``
+          after training with the corresponding ``lm``) in the order of
+          `lms`.  If `unsparsify` is set, weights get unsparsified, while
+          the sparse ones are used as the starting point for the next `lm`.
+        """
+        X, implicit_bias, uniquelabels, Y, _stepwise_regression = \
+           self._get_training_data(dataset)
+        M = len(uniquelabels)
+        auto_corr, XY, c_to_fit = self._precompute(X, implicit_bias, Y, M)
+
+        lms = np.asanyarray(lms, dtype=float)
+        nd = self._get_nd(X, implicit_bias)
+        path = np.zeros((len(lms), nd, c_to_fit), dtype=np.double)
+        w = np.zeros((nd, c_to_fit), dtype=np.double)
+        unsparsify = self.params.unsparsify
+        if unsparsify and nd > X.shape[1]:
+            Xu = np.hstack((X, np.ones((X.shape[0], 1), dtype=X.dtype)))
+        else:
+            Xu = X
+        # from the largest penalty (sparsest solution) to the smallest
+        for i in np.argsort(-lms, kind='mergesort'):
+            cycles = self._fit(_stepwise_regression, X, implicit_bias,
+                               XY, auto_corr, M, lms[i], w)
+            if unsparsify:
+                path[i] = self._unsparsify_weights(Xu, w)
+            else:
+                path[i] = w
+            if __debug__:
+                debug('SMLR', "path: lm=%g converged in %d cycles with %d "
+                      "non-zero weights" % (lms[i], cycles, np.sum(w != 0)))
+        return path
+
+
     def _unsparsify_weights(self, samples, weights):
         """Unsparsify weights via least squares regression."""
         # allocate for the new weights
@@ -479,6 +619,22 @@ class SMLR(Classifier):
     def _predict(self, data):
         """Predict the output for the provided data.
         """
+        values = self._compute_values(data, self.__weights_all)
+        self.ca.estimates = values
+
+        # generate predictions
+        predictions = np.asarray([self._ulabels[np.argmax(vals)]
+                                 for vals in values])
+        # no need to assign conditional attribute here -- would be done
+        # in Classifier._postpredict anyway
+        #self.predictions = predictions
+
+        return predictions
+
+
+    def _compute_values(self, data, weights_all):
+        """Compute probabilities of each class given all the weights
+        """
         # see if we are adding a bias term
         if self.params.has_bias:
             # append the bias term to the features
@@ -487,10 +643,10 @@ class SMLR(Classifier):
 
         # append the zeros column to the weights if necessary
         if self.params.fit_all_weights:
-            w = self.__weights_all
+            w = weights_all
         else:
-            w = np.hstack((self.__weights_all,
-                          np.zeros((self.__weights_all.shape[0], 1))))
+            w = np.hstack((weights_all,
+                          np.zeros((weights_all.shape[0], 1))))
 
         # determine the probability values for making the prediction
         dot_prod = np.dot(data, w)
@@ -504,17 +660,7 @@ class SMLR(Classifier):
                   (np.min(w), np.max(w), np.min(dot_prod), np.max(dot_prod),
                    np.min(E), np.max(E)))
 
-        values = E / S[:, np.newaxis].repeat(E.shape[1], axis=1)
-        self.ca.estimates = values
-
-        # generate predictions
-        predictions = np.asarray([self._ulabels[np.argmax(vals)]
-                                 for vals in values])
-        # no need to assign conditional attribute here -- would be done
-        # in Classifier._postpredict anyway
-        #self.predictions = predictions
-
-        return predictions
+        return E / S[:, np.newaxis].repeat(E.shape[1], axis=1)
 
 
     ##REF: Name was automagically refactored
@@ -568,3 +714,92 @@ class SMLRWeights(Sensitivity):
         # with the case of `fit_all_weights=False`
         return Dataset(weights,
                        sa={clf.get_space(): clf._ulabels[:len(weights)]})
+
+
+
+class SMLRPathCrossValidation(Measure):
+    """Cross-validate SMLR for a whole sequence of penalty values.
+
+    For every fold, SMLR weights are computed along the path of
+    decreasing `lm` values with warm starts (see `SMLR.get_lm_path`), so
+    tuning the sparsity costs only a small multiple of a single training
+    per fold.  The result is a dataset with one sample per fold and one
+    feature per `lm` value, i.e. the per-lm error curve of every fold.
+    """
+
+    best_lm = ConditionalAttribute(enabled=True, doc=
+       """Penalty value providing the lowest error averaged across all
+       folds (the largest one in case of ties)""")
+
+    weights = ConditionalAttribute(enabled=False, doc=
+       """Weights (including biases) along the path for every fold""")
+
+    is_trained = True
+    """Indicate that this measure is always trained."""
+
+    def __init__(self, clf, generator, lms, errorfx=mean_mismatch_error,
+                 **kwargs):
+        """
+        Parameters
+        ----------
+        clf : SMLR
+          Classifier which serves as a template: all its parameters besides
+          `lm` are used as is.
+        generator : Node
+          Generator used to partition the input dataset into multiple
+          instances.  The ``space`` of this generator determines the
+          attribute which is used to split each generated dataset into
+          training and testing sets.
+        lms : sequence of float
+          Penalty values to evaluate.
+        errorfx : callable
+          Custom implementation of an error function. The callable needs to
+          accept two arguments (1. predicted values, 2. target values).
+        """
+        Measure.__init__(self, **kwargs)
+        if not isinstance(clf, SMLR):
+            raise ValueError, "%s requires SMLR, got %s" \
+                  % (self.__class__.__name__, clf)
+        self._clf = clf
+        self._generator = generator
+        self._lms = np.asanyarray(lms, dtype=float)
+        self._errorfx = errorfx
+
+
+    def _call(self, ds):
+        clf = self._clf
+        generator = self._generator
+        errorfx = self._errorfx
+        lms = self._lms
+        targets_sa_name = clf.get_space()
+
+        errors = []
+        weights = []
+        for sds in generator.generate(ds):
+            train_mask, test_mask = _get_split_masks(sds,
+                                                     generator.get_space())
+            train = sds[train_mask]
+            test = sds[test_mask]
+            if __debug__:
+                debug('SMLR', "path: fold with %d training and %d testing "
+                      "samples" % (len(train), len(test)))
+
+            path = clf.get_lm_path(train, lms)
+            ulabels = train.sa[targets_sa_name].unique
+            targets = test.sa[targets_sa_name].value
+            errors.append(
+                [errorfx(ulabels[np.argmax(clf._compute_values(test.samples,
+                                                               w), axis=1)],
+                         targets)
+                 for w in path])
+            if self.ca.is_enabled('weights'):
+                weights.append(path)
+
+        errors = np.array(errors)
+        self.ca.weights = weights
+        mean_errors = np.mean(errors, axis=0)
+        best = np.where(mean_errors == np.min(mean_errors))[0]
+        self.ca.best_lm = np.max(lms[best])
+        return Dataset(errors,
+                       sa={'cvfolds': np.arange(len(errors))},
+                       fa={'lm': lms})
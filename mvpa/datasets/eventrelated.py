@@ -10,7 +10,6 @@
 
 __docformat__ = 'restructuredtext'
 
-import copy
 import numpy as np
 from mvpa.misc.support import Event, value2idx
 from mvpa.base.dataset import _expand_attribute
@@ -20,6 +19,48 @@ from mvpa.mappers.boxcar import BoxcarMapper
 from mvpa.base import warning
 
 
+def _values2idx(values, x, solv='round'):
+    """Convert values into indices of the closest matching array elements.
+
+    Same as `value2idx`, but for many values at once, and for an array `x`
+    that is sorted in ascending order.
+
+    Parameters
+    ----------
+    values : array
+      Values that are to be converted.
+    x : array
+      One-dimensional array sorted in ascending order.
+    solv : {'round', 'floor', 'ceil'}
+      Resolver strategie: absolute closest element (round), closest smaller
+      element (floor), or closest larger element (ceil).
+
+    Returns
+    -------
+    array of int
+    """
+    x = np.asanyarray(x)
+    values = np.asanyarray(values)
+    # first element larger or equal to value
+    above = np.searchsorted(x, values, side='left')
+    if solv == 'round':
+        # closest of the neighbors -- the smaller one in case of a tie
+        lower = np.maximum(above - 1, 0)
+        upper = np.minimum(above, len(x) - 1)
+        use_upper = np.abs(x[upper] - values) < np.abs(x[lower] - values)
+        idx = np.where(use_upper, upper, lower)
+    elif solv == 'ceil':
+        # no matching element -> first one (like value2idx)
+        idx = np.where(above < len(x), above, 0)
+    elif solv == 'floor':
+        # last element smaller or equal to value
+        idx = np.maximum(np.searchsorted(x, values, side='right') - 1, 0)
+    else:
+        raise ValueError("Unkown resolving method '%s'." % solv)
+    # first of identical elements
+    return np.searchsorted(x, x[idx], side='left')
+
+
 def find_events(**kwargs):
     """Detect changes in multiple synchronous sequences.
 
@@ -94,7 +135,7 @@ def find_events(**kwargs):
 
 
 def eventrelated_dataset(ds, events=None, time_attr=None, match='prev',
-                         eprefix='event'):
+                         eprefix='event', view=False):
     """Segment a dataset into a set of events.
 
     This function can be used to extract event-related samples from any
@@ -125,7 +166,12 @@ def eventrelated_dataset(ds, events=None, time_attr=None, match='prev',
       If not None, the ``onset`` and ``duration`` specs from the event list will
       be converted using information from this sample attribute. Its values will
       be treated as in-the-same-unit and are used to determine corresponding
-      samples from real-value onset and duration definitions.
+      samples from real-value onset and duration definitions.  Values should
+      be in ascending order, which allows for a fast conversion of all
+      events at once.  Otherwise (e.g. for time stamps restarting in each
+      run) each event gets matched against all the values separately, which
+      is considerably slower for many events, and no event extends beyond
+      a restart of the time stamps.
     match : {'prev', 'next', 'closest'}
       Strategy used to match real-value onsets to sample indices. 'prev' chooses
       the closes preceding samples, 'next' the closest following sample and
@@ -134,6 +180,11 @@ def eventrelated_dataset(ds, events=None, time_attr=None, match='prev',
       If not None, this prefix is used to name additional attributes generated
       by the underlying `~mvpa.mappers.boxcar.BoxcarMapper`. If it is set to
       None, no additional attributes will be created.
+    view : bool
+      If True and the event onsets are equally spaced (e.g. a regular grid
+      of trials), samples of the returned dataset are a read-only view on
+      the samples of the input dataset, so overlapping events do not
+      duplicate any data.  Otherwise, samples of all events are copied.
 
     Returns
     -------
@@ -182,34 +233,12 @@ def eventrelated_dataset(ds, events=None, time_attr=None, match='prev',
                      'next': 'ceil',
                      'closest': 'round'}[match]
 
-    if not time_attr is None:
-        tvec = ds.sa[time_attr].value
-        # we are asked to convert onset time into sample ids
-        descr_events = []
-        for ev in events:
-            # do not mess with the input data
-            ev = copy.deepcopy(ev)
-            # best matching sample
-            idx = value2idx(ev['onset'], tvec, conv_strategy)
-            # store offset of sample time and real onset
-            ev['orig_offset'] = ev['onset'] - tvec[idx]
-            # rescue the real onset into a new attribute
-            ev['orig_onset'] = ev['onset']
-            ev['orig_duration'] = ev['duration']
-            # figure out how many sample we need
-            ev['duration'] = \
-                    len(tvec[idx:][tvec[idx:] < ev['onset'] + ev['duration']])
-            # new onset is sample index
-            ev['onset'] = idx
-            descr_events.append(ev)
-    else:
-        descr_events = events
     # convert the event specs into the format expected by BoxcarMapper
     # take the first event as an example of contained keys
     evvars = {}
-    for k in descr_events[0]:
+    for k in events[0]:
         try:
-            evvars[k] = [e[k] for e in descr_events]
+            evvars[k] = np.asanyarray([e[k] for e in events])
         except KeyError:
             raise ValueError("Each event property must be present for all "
                              "events (could not find '%s')" % k)
@@ -218,6 +247,38 @@ def eventrelated_dataset(ds, events=None, time_attr=None, match='prev',
         if not p in evvars:
             raise ValueError("'%s' is a required property for all events."
                              % p)
+
+    if not time_attr is None:
+        tvec = ds.sa[time_attr].value
+        # we are asked to convert onset time into sample ids
+        onset = evvars['onset']
+        duration = evvars['duration']
+        restarts = np.diff(tvec) < 0
+        if np.any(restarts):
+            # not ascending -- match each event against all samples
+            idx = np.array([value2idx(o, tvec, conv_strategy)
+                            for o in onset], dtype=int)
+            # events end before time restarts
+            nsamples = []
+            for i, end in zip(idx, onset + duration):
+                stop = tvec[i:] >= end
+                stop[1:] |= restarts[i:]
+                nsamples.append(stop.any() and np.argmax(stop) or len(stop))
+            nsamples = np.array(nsamples, dtype=int)
+        else:
+            # best matching samples
+            idx = _values2idx(onset, tvec, conv_strategy)
+            nsamples = np.maximum(
+                np.searchsorted(tvec, onset + duration, side='left') - idx, 0)
+        # store offset of sample time and real onset
+        evvars['orig_offset'] = onset - tvec[idx]
+        # rescue the real onset into a new attribute
+        evvars['orig_onset'] = onset
+        evvars['orig_duration'] = duration
+        # how many sample we need
+        evvars['duration'] = nsamples
+        # new onset is sample index
+        evvars['onset'] = idx
     boxlength = max(evvars['duration'])
     if __debug__:
         if not max(evvars['duration']) == min(evvars['duration']):
@@ -225,7 +286,7 @@ def eventrelated_dataset(ds, events=None, time_attr=None, match='prev',
                     'provided Events.'% boxlength)
 
     # finally create, train und use the boxcar mapper
-    bcm = BoxcarMapper(evvars['onset'], boxlength, space=eprefix)
+    bcm = BoxcarMapper(evvars['onset'], boxlength, space=eprefix, view=view)
     bcm.train(ds)
     ds = ds.get_mapped(bcm)
     # at last reflatten the dataset
@@ -246,7 +307,7 @@ def eventrelated_dataset(ds, events=None, time_attr=None, match='prev',
             if not time_attr is None:
                 # but only if there was a conversion happining, since otherwise
                 # we get the same info from BoxcarMapper
-                ds.sa[a] = [e[a] for e in events]
+                ds.sa[a] = evvars['orig_' + a]
         else:
             ds.sa[a] = evvars[a]
     return ds
@@ -183,5 +183,5 @@ class Balancer(Node):
 
 
     def __str__(self):
-        return _str(self, self._pattr, n=self.nruns, limit=self._limit,
-                    assure=self._assure_permute)
+        return _str(self, str(self._amount), attr=self._attr, n=self.nruns,
+                    limit=self._limit, apply_selection=self._apply_selection)
@@ -148,3 +148,16 @@ class Splitter(Node):
                 split_ds.a.lastsplit = lastsplit
 
             yield split_ds
+
+
+
+def _get_split_masks(ds, attr):
+    """Masks of training and testing samples within a generated dataset
+
+    The same way as `Splitter` does by default: samples with the 1st unique
+    value of the sample attribute `attr` are used for training, the ones
+    with the 2nd value for testing.
+    """
+    splattr = ds.sa[attr]
+    train_value, test_value = splattr.unique[:2]
+    return splattr.value == train_value, splattr.value == test_value
@@ -25,6 +25,7 @@ import numpy as np
 from mvpa.base.types import is_datasetlike
 from mvpa.base.state import ClassWithCollections
 from mvpa.base.param import Parameter
+from mvpa.support.copy import deepcopy
 from mvpa.misc.sampleslookup import SamplesLookup # required for CachedKernel
 
 if __debug__:
@@ -184,11 +185,95 @@ class Kernel(ClassWithCollections):
         setattr(cls, 'as_raw_%s'%typename, methodraw)
 
 class NumpyKernel(Kernel):
-    """A Kernel object with internal representation as a 2d numpy array"""
+    """A Kernel object with internal representation as a 2d numpy array
+
+    If `chunk_mem` or `single_precision` is specified, the kernel matrix
+    gets computed block-wise, and only the upper triangle of blocks gets
+    computed for a kernel of the data with itself.
+    """
 
     _ATTRIBUTE_COLLECTIONS = Kernel._ATTRIBUTE_COLLECTIONS + ['ca']
     # enforce presence of params AND ca collections for gradients etc
 
+    chunk_mem = Parameter(None, min=1, allowedtype='None or int',
+        doc="""Memory budget (in bytes) for a single block of the kernel
+        matrix, which is computed block-wise then.  Temporaries of the
+        kernel function scale with the block size.  If None, the whole
+        matrix is computed at once.""")
+
+    single_precision = Parameter(False, allowedtype='bool',
+        doc="""Keep the data converted to float32 (halving its size),
+        while each block gets converted back to float64 for the actual
+        computation, so no precision is lost in accumulation.  Resultant
+        kernel matrix is stored in float64.""")
+
+    def compute(self, ds1, ds2=None):
+        """Compute the kernel, block-wise if requested by the parameters
+        """
+        params = self.params
+        if (params.chunk_mem is None and not params.single_precision) \
+               or not self._is_blockwise():
+            return Kernel.compute(self, ds1, ds2)
+        symmetric = ds2 is None or ds2 is ds1
+        if is_datasetlike(ds1):
+            ds1 = ds1.samples
+        if symmetric:
+            ds2 = ds1
+        elif is_datasetlike(ds2):
+            ds2 = ds2.samples
+        self._compute_blockwise(ds1, ds2, symmetric)
+
+    def _is_blockwise(self):
+        """Either kernel could be computed block-wise
+
+        Should be overridden by kernels which compute (e.g. gradients)
+        beyond the kernel matrix itself.
+        """
+        return True
+
+    def _compute_blockwise(self, d1, d2, symmetric):
+        """Compute kernel matrix block-by-block using _compute
+        """
+        params = self.params
+        n1, n2 = len(d1), len(d2)
+        if params.single_precision:
+            d1 = np.asanyarray(d1, dtype=np.float32)
+            if symmetric:
+                d2 = d1
+            else:
+                d2 = np.asanyarray(d2, dtype=np.float32)
+
+        # number of rows and columns per block
+        nelements = n1 * n2
+        if params.chunk_mem is not None:
+            nelements = max(1, params.chunk_mem // 8)
+        b1 = min(n1, max(1, int(np.sqrt(nelements))))
+        b2 = symmetric and b1 or min(n2, max(1, nelements // b1))
+        if __debug__:
+            debug('KRN', "Computing %dx%d kernel %s in blocks of %dx%d"
+                  % (n1, n2, self, b1, b2))
+
+        if params.single_precision:
+            upcast = lambda d: np.asanyarray(d, dtype=np.float64)
+        else:
+            upcast = lambda d: d
+
+        k = np.empty((n1, n2))
+        for i in xrange(0, n1, b1):
+            d1i = upcast(d1[i:i+b1])
+            # only upper triangle of blocks for symmetric kernel
+            for j in xrange(symmetric and i or 0, n2, b2):
+                self._compute(d1i, upcast(d2[j:j+b2]))
+                kij = self._k
+                if symmetric:
+                    if j == i:
+                        # assure exact symmetry of the diagonal block
+                        kij = np.triu(kij) + np.triu(kij, 1).T
+                    else:
+                        k[j:j+b2, i:i+b1] = kij.T
+                k[i:i+b1, j:j+b2] = kij
+        self._k = k
+
     def __array__(self):
         # By definintion, a NumpyKernel's internal representation is an array
         return self._k
@@ -283,6 +368,13 @@ class CachedKernel(NumpyKernel):
 
     The cache is asymmetric for lhs and rhs, so compute(d1, d2) does not create
     a cache usable for compute(d2, d1).
+
+    Copies of the kernel (e.g. within cloned classifiers) share the cache
+    instead of duplicating it.
+
+    With `disk_cache` (see `mvpa.kernels.cache.DiskKernelCache`) cached
+    kernel matrices are also stored on disk, so other processes (or
+    kernels) operating on the same data could reuse them.
     """
 
     # TODO: Figure out how to design objects like CrossValidation etc to
@@ -293,7 +385,7 @@ class CachedKernel(NumpyKernel):
         """Allows checking name of subkernel"""
         return self._kernel.__kernel_name__
 
-    def __init__(self, kernel=None, *args, **kwargs):
+    def __init__(self, kernel=None, disk_cache=None, *args, **kwargs):
         """Initialize `CachedKernel`
 
         Parameters
@@ -301,13 +393,44 @@ class CachedKernel(NumpyKernel):
         kernel : Kernel
           Base kernel to cache.  Any kernel which can be converted to a
           `NumpyKernel` is allowed
+        disk_cache : DiskKernelCache, optional
+          Persistent storage to look up kernel matrices in before computing
+          them, and to store computed ones to.
         """
         super(CachedKernel, self).__init__(*args, **kwargs)
         self._kernel = kernel
+        self._disk_cache = disk_cache
         self.params.update(self._kernel.params)
         self._rhsids = self._lhsids = self._kfull = None
         self._recomputed = None
 
+    def __deepcopy__(self, memo=None):
+        """Deep copy which shares the cache with the original
+
+        The cache only gets rebound, never modified in-place, so it is safe
+        to share it among copies.
+        """
+        if memo is None:
+            memo = {}
+        for cached in (self._kfull, self._lhsids, self._rhsids,
+                       self._disk_cache):
+            if cached is not None:
+                memo[id(cached)] = cached
+        result = self.__class__.__new__(self.__class__)
+        memo[id(self)] = result
+        result.__dict__.update(deepcopy(self.__dict__, memo))
+        return result
+
+    def is_cached(self, ds):
+        """Whether the cache covers all samples of `ds`"""
+        if self._lhsids is None or len(self.params.which_set()):
+            return False
+        try:
+            self._lhsids(ds)
+        except KeyError:
+            return False
+        return True
+
     def _cache(self, ds1, ds2=None):
         """Initializes internal lookups + _kfull via caching the kernel matrix
         """
@@ -322,10 +445,18 @@ class CachedKernel(NumpyKernel):
             self._rhsids = SamplesLookup(ds2)
 
         ckernel = self._kernel
-        ckernel.compute(ds1, ds2)
-        self._kfull = ckernel.as_raw_np()
-        ckernel.cleanup()
-        self._k = self._kfull
+        disk_cache = self._disk_cache
+        kfull = None
+        if disk_cache is not None:
+            key = disk_cache.get_key(ckernel, ds1, ds2)
+            kfull = disk_cache.get(key)
+        if kfull is None:
+            ckernel.compute(ds1, ds2)
+            kfull = ckernel.as_raw_np()
+            ckernel.cleanup()
+            if disk_cache is not None:
+                disk_cache.put(key, kfull)
+        self._k = self._kfull = kfull
 
         self._recomputed = True
         self.params.reset()
@@ -0,0 +1,210 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+#
+#   See COPYING file distributed along with the PyMVPA package for the
+#   copyright and license terms.
+#
+### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
+"""Persistent on-disk storage of kernel matrices
+
+"""
+
+__docformat__ = 'restructuredtext'
+
+import os
+import tempfile
+import hashlib
+import itertools
+from glob import glob
+
+import numpy as np
+
+from mvpa.base import cfg
+from mvpa.base.types import is_datasetlike
+from mvpa.base.collections import Collection
+
+if __debug__:
+    from mvpa.base import debug
+
+__all__ = ['DiskKernelCache']
+
+
+class DiskKernelCache(object):
+    """Content-addressed storage of kernel matrices on disk
+
+    Kernel matrices are stored as .npy files named after a hash of the
+    data and of the kernel (its class, parameters and other attributes),
+    so separate processes computing the same kernel on the same data
+    could reuse them.  Stored matrices are loaded as read-only memory
+    maps.  Whenever the total size of stored matrices exceeds
+    `max_bytes`, least recently used ones get removed.  Recency is
+    judged by modification times, which get updated upon every access,
+    while ties (e.g. on file systems with coarse time stamps) are broken
+    by the order of accesses within the process.
+
+    Attributes without a stable representation (e.g. `kernelfunc` of a
+    `CustomKernel`) make the kernel matrix reusable only within the
+    process which has computed it.
+
+    Examples
+    --------
+    >>> from mvpa.kernels.base import CachedKernel
+    >>> from mvpa.kernels.np import RbfKernel
+    >>> kernel = CachedKernel(RbfKernel(), disk_cache=DiskKernelCache())
+    """
+
+    def __init__(self, path=None, max_bytes=None):
+        """
+        Parameters
+        ----------
+        path : str, optional
+          Directory to store kernel matrices in.  Defaults to 'cache dir'
+          option of the 'kernels' section of the configuration, or to
+          'pymvpa_kernels' within the temporary directory.
+        max_bytes : int, optional
+          Maximal total size of stored kernel matrices.  Defaults to
+          'cache max bytes' option of the 'kernels' section of the
+          configuration, or to no limit.
+        """
+        if path is None:
+            path = cfg.get('kernels', 'cache dir',
+                           default=os.path.join(tempfile.gettempdir(),
+                                                'pymvpa_kernels'))
+        if max_bytes is None:
+            max_bytes = cfg.get_as_dtype('kernels', 'cache max bytes', int,
+                                         default=None)
+        self.path = path
+        self.max_bytes = max_bytes
+        # filename -> number of the last access within this process
+        self._accessed = {}
+        self._counter = itertools.count()
+        if not os.path.isdir(path):
+            try:
+                os.makedirs(path)
+            except OSError:
+                # might have been created by another process meanwhile
+                if not os.path.isdir(path):
+                    raise
+
+
+    def __repr__(self):
+        return "%s(path=%r, max_bytes=%r)" \
+               % (self.__class__.__name__, self.path, self.max_bytes)
+
+
+    def get_key(self, kernel, ds1, ds2=None):
+        """Hash identifying kernel matrix of `kernel` on `ds1` and `ds2`
+        """
+        h = hashlib.sha1()
+        h.update('%s.%s' % (kernel.__class__.__module__,
+                            kernel.__class__.__name__))
+        for name, param in sorted(kernel.params.iteritems()):
+            h.update(name)
+            _hash_value(h, param.value)
+        for name, value in sorted(kernel.__dict__.iteritems()):
+            if name in ('_k', '_collections', '_known_attribs') \
+               or name.startswith('_ClassWithCollections') \
+               or isinstance(value, Collection):
+                continue
+            h.update(name)
+            _hash_value(h, value)
+        for ds in (ds1, ds2):
+            if is_datasetlike(ds):
+                ds = ds.samples
+            _hash_value(h, ds)
+        return h.hexdigest()
+
+
+    def _get_filename(self, key):
+        return os.path.join(self.path, key + '.npy')
+
+
+    def get(self, key):
+        """Return memory-mapped kernel matrix, or None if not stored
+        """
+        filename = self._get_filename(key)
+        try:
+            # mark as recently used
+            os.utime(filename, None)
+            k = np.load(filename, mmap_mode='r')
+        except (IOError, OSError):
+            return None
+        self._accessed[filename] = self._counter.next()
+        if __debug__:
+            debug('KRN', "Loaded kernel matrix %s from %s" % (key, self.path))
+        return k
+
+
+    def put(self, key, k):
+        """Store kernel matrix `k` under `key`
+
+        Matrix gets written to a temporary file first, so concurrent
+        processes never see partially written matrices.
+        """
+        filename = self._get_filename(key)
+        fd, tmpname = tempfile.mkstemp(suffix='.tmp', dir=self.path)
+        f = os.fdopen(fd, 'wb')
+        try:
+            np.save(f, np.asanyarray(k))
+        finally:
+            f.close()
+        os.rename(tmpname, filename)
+        self._accessed[filename] = self._counter.next()
+        if __debug__:
+            debug('KRN', "Stored kernel matrix %s in %s" % (key, self.path))
+        self._evict(keep=filename)
+
+
+    def _evict(self, keep=None):
+        """Remove least recently used matrices to fit within `max_bytes`
+        """
+        if self.max_bytes is None:
+            return
+        entries = []
+        for filename in glob(os.path.join(self.path, '*.npy')):
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                # removed by another process meanwhile
+                continue
+            # matrices not accessed by this process go first among
+            # equally old ones
+            entries.append((stat.st_mtime, self._accessed.get(filename, -1),
+                            stat.st_size, filename))
+        total = sum([e[2] for e in entries])
+        for mtime, accessed, size, filename in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if filename == keep:
+                continue
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            self._accessed.pop(filename, None)
+            total -= size
+            if __debug__:
+                debug('KRN', "Evicted kernel matrix %s" % filename)
+
+
+    def clear(self):
+        """Remove all stored kernel matrices
+        """
+        for filename in glob(os.path.join(self.path, '*.npy')):
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+        self._accessed.clear()
+
+
+
+def _hash_value(h, value):
+    """Update hash `h` with a value of an arbitrary type"""
+    if isinstance(value, np.ndarray):
+        value = np.ascontiguousarray(value)
+        h.update('%s%s' % (value.dtype.str, value.shape))
+        h.update(buffer(value))
+    else:
+        h.update(repr(value))
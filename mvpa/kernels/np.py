@@ -169,6 +169,12 @@ class GeneralizedLinearKernel(NumpyKernel):
         self._Sigma_p = self._Sigma_p_orig
 
 
+    def _is_blockwise(self):
+        # gradients are computed for the full kernel only
+        return not (self.ca.is_enabled('gradients')
+                    or self.ca.is_enabled('gradientslog'))
+
+
     def _compute(self, data1, data2):
         """Compute kernel matrix.
         """
@@ -293,11 +299,16 @@ class ExponentialKernel(NumpyKernel):
         # XXX the following computation can be (maybe) made more
         # efficient since length_scale is squared and then
         # square-rooted uselessly.
-        # Weighted euclidean distance matrix:
-        self.wdm = np.sqrt(squared_euclidean_distance(
-            data1, data2, weight=(params.length_scale**-2)))
         self._k = \
-            params.sigma_f**2 * np.exp(-self.wdm)
+            params.sigma_f**2 * np.exp(-self._wdm(data1, data2))
+
+    def _wdm(self, data1, data2):
+        """Weighted euclidean distance matrix
+        """
+        # not stored along with the kernel matrix, since kernel could
+        # be computed block-wise
+        return np.sqrt(squared_euclidean_distance(
+            data1, data2, weight=(self.params.length_scale**-2)))
 
     def gradient(self, data1, data2):
         """Compute gradient of the kernel matrix. A must for fast
@@ -328,16 +339,17 @@ class ExponentialKernel(NumpyKernel):
             # return np.trace(np.dot(alphaalphaT_Kinv,K_grad_i))
             # Faster formula: np.trace(np.dot(A,B)) = (A*(B.T)).sum()
             return (alphaalphaT_Kinv*(K_grad_i.T)).sum()
+        wdm = self._wdm(data, data)
         grad_sigma_f = 2.0/self.sigma_f*self.kernel_matrix
         self.lml_gradient.append(lml_grad(grad_sigma_f))
         if np.isscalar(self.length_scale) or self.length_scale.size==1:
             # use the same length_scale for all dimensions:
-            K_grad_l = self.wdm*self.kernel_matrix*(self.length_scale**-1)
+            K_grad_l = wdm*self.kernel_matrix*(self.length_scale**-1)
             self.lml_gradient.append(lml_grad(K_grad_l))
         else:
             # use one length_scale for each dimension:
             for i in range(self.length_scale.size):
-                K_grad_i = (self.length_scale[i]**-3)*(self.wdm**-1)*self.kernel_matrix*np.subtract.outer(data[:,i],data[:,i])**2
+                K_grad_i = (self.length_scale[i]**-3)*(wdm**-1)*self.kernel_matrix*np.subtract.outer(data[:,i],data[:,i])**2
                 self.lml_gradient.append(lml_grad(K_grad_i))
                 pass
             pass
@@ -356,16 +368,17 @@ class ExponentialKernel(NumpyKernel):
             # return np.trace(np.dot(alphaalphaT_Kinv,K_grad_i))
             # Faster formula: np.trace(np.dot(A,B)) = (A*(B.T)).sum()
             return (alphaalphaT_Kinv*(K_grad_i.T)).sum()
+        wdm = self._wdm(data, data)
         grad_log_sigma_f = 2.0*self.kernel_matrix
         self.lml_gradient.append(lml_grad(grad_log_sigma_f))
         if np.isscalar(self.length_scale) or self.length_scale.size==1:
             # use the same length_scale for all dimensions:
-            K_grad_l = self.wdm*self.kernel_matrix
+            K_grad_l = wdm*self.kernel_matrix
             self.lml_gradient.append(lml_grad(K_grad_l))
         else:
             # use one length_scale for each dimension:
             for i in range(self.length_scale.size):
-                K_grad_i = (self.length_scale[i]**-2)*(self.wdm**-1)*self.kernel_matrix*np.subtract.outer(data[:,i],data[:,i])**2
+                K_grad_i = (self.length_scale[i]**-2)*(wdm**-1)*self.kernel_matrix*np.subtract.outer(data[:,i],data[:,i])**2
                 self.lml_gradient.append(lml_grad(K_grad_i))
                 pass
             pass
@@ -422,14 +435,20 @@ class SquaredExponentialKernel(NumpyKernel):
           data
           (Defaults to None)
         """
-        # weighted squared euclidean distance matrix:
-        self.wdm2 = squared_euclidean_distance(data1, data2, weight=(self.length_scale**-2))
-        self._k = self.sigma_f**2 * np.exp(-0.5*self.wdm2)
+        self._k = self.sigma_f**2 * np.exp(-0.5*self._wdm2(data1, data2))
         # XXX EO: old implementation:
         # self.kernel_matrix = \
         #     self.sigma_f * np.exp(-squared_euclidean_distance(
         #         data1, data2, weight=0.5 / (self.length_scale ** 2)))
 
+    def _wdm2(self, data1, data2):
+        """Weighted squared euclidean distance matrix
+        """
+        # not stored along with the kernel matrix, since kernel could
+        # be computed block-wise
+        return squared_euclidean_distance(
+            data1, data2, weight=(self.length_scale**-2))
+
     def set_hyperparameters(self, hyperparameter):
         """Set hyperaparmeters from a vector.
 
@@ -451,11 +470,12 @@ class SquaredExponentialKernel(NumpyKernel):
             # return np.trace(np.dot(alphaalphaT_Kinv,K_grad_i))
             # Faster formula: np.trace(np.dot(A,B)) = (A*(B.T)).sum()
             return (alphaalphaT_Kinv*(K_grad_i.T)).sum()
+        wdm2 = self._wdm2(data, data)
         grad_sigma_f = 2.0/self.sigma_f*self.kernel_matrix
         self.lml_gradient.append(lml_grad(grad_sigma_f))
         if np.isscalar(self.length_scale) or self.length_scale.size==1:
             # use the same length_scale for all dimensions:
-            K_grad_l = self.wdm2*self.kernel_matrix*(1.0/self.length_scale)
+            K_grad_l = wdm2*self.kernel_matrix*(1.0/self.length_scale)
             self.lml_gradient.append(lml_grad(K_grad_l))
         else:
             # use one length_scale for each dimension:
@@ -478,11 +498,12 @@ class SquaredExponentialKernel(NumpyKernel):
             # return np.trace(np.dot(alphaalphaT_Kinv,K_grad_i))
             # Faster formula: np.trace(np.dot(A,B)) = (A*(B.T)).sum()
             return (alphaalphaT_Kinv*(K_grad_i.T)).sum()
+        wdm2 = self._wdm2(data, data)
         K_grad_log_sigma_f = 2.0*self.kernel_matrix
         self.lml_gradient.append(lml_grad(K_grad_log_sigma_f))
         if np.isscalar(self.length_scale) or self.length_scale.size==1:
             # use the same length_scale for all dimensions:
-            K_grad_log_l = self.wdm2*self.kernel_matrix
+            K_grad_log_l = wdm2*self.kernel_matrix
             self.lml_gradient.append(lml_grad(K_grad_log_l))
         else:
             # use one length_scale for each dimension:
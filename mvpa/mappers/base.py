@@ -338,6 +338,47 @@ class ChainMapper(ChainNode):
         return _str(self, '-'.join([str(n) for n in self]).replace('Mapper', ''))
 
 
+
+def _get_feature_blocks(shape, nbytes=None, itemsize=8):
+    """Slices splitting features into blocks of limited size
+
+    Parameters
+    ----------
+    shape : tuple
+      Shape (nsamples x nfeatures) of the samples array.
+    nbytes : int or None
+      Maximal size of a block of all samples of `itemsize` bytes each.
+      If None, a single block of all features is returned.
+    itemsize : int
+    """
+    nsamples, nfeatures = shape[:2]
+    if nbytes is None:
+        return [slice(None)]
+    bsize = max(1, nbytes // (itemsize * max(1, nsamples)))
+    return [slice(start, start + bsize)
+            for start in xrange(0, nfeatures, bsize)]
+
+
+def _get_output_samples(shape, dtype, outfile=None):
+    """Allocate an array for mapped samples
+
+    Parameters
+    ----------
+    shape : tuple
+    dtype : dtype
+    outfile : str or None
+      If given, the array is memory-mapped to this file (in .npy format,
+      so it could be loaded again via np.load), otherwise it resides
+      in memory.
+    """
+    if outfile is None:
+        return np.empty(shape, dtype=dtype)
+    if __debug__:
+        debug('MAP', "Mapping samples into memory-mapped file %s" % outfile)
+    return np.lib.format.open_memmap(outfile, mode='w+', dtype=dtype,
+                                     shape=shape)
+
+
 # XXX implement a 'CombinedMapper' (analog to ex-CombinedFeatureSelection) that
 # can a dataset to multiple child-mappers and hstacks the results into a single
 # output dataset
@@ -35,7 +35,8 @@ class BoxcarMapper(Mapper):
     #       utility functionality (outside BoxcarMapper) could be used to merge
     #       arbitrary sample attributes into the samples matrix (with
     #       appropriate mapper adjustment, e.g. CombinedMapper).
-    def __init__(self, startpoints, boxlength, offset=0, **kwargs):
+    def __init__(self, startpoints, boxlength, offset=0, view=False,
+                 **kwargs):
         """
         Parameters
         ----------
@@ -47,6 +48,11 @@ class BoxcarMapper(Mapper):
         offset : int
           The offset between the provided starting point and the actual start
           of the boxcar.
+        view : bool
+          If True and the boxcars are equally spaced, forward-mapped samples
+          are a read-only view on the input samples, so overlapping boxcars
+          do not duplicate any data. Otherwise, all boxcars are copied into
+          a new array.
         """
         Mapper.__init__(self, **kwargs)
         self._outshape = None
@@ -68,44 +74,32 @@ class BoxcarMapper(Mapper):
 
         self.boxlength = int(boxlength)
         self.offset = offset
-        self.__selectors = None
+        self.view = view
 
-        # build a list of list where each sublist contains the indexes of to be
-        # averaged data elements
-        self.__selectors = [ slice(i + offset, i + offset + boxlength) \
-                             for i in startpoints ]
 
-
-    def __reduce__(self):
-        # python < 2.6 cannot copy slices, we will use the constructor the get
-        # them back and additionally reapply the stae of the object (except for
-        # the bad bad slices)
-        state = self.__dict__.copy()
-        badguy = '_%s__selectors' % self.__class__.__name__
-        if badguy in state:
-            del state[badguy]
-        return (self.__class__,
-                    (self.startpoints, self.boxlength, self.offset),
-                    state)
+    def _check_boxes(self, nsamples):
+        """Raise ValueError if any boxcar exceeds `nsamples` input samples"""
+        starts = self.startpoints + self.offset
+        illegal = np.logical_or(starts < 0,
+                                starts + self.boxlength > nsamples)
+        if np.any(illegal):
+            raise ValueError('Illegal box (start: %i, offset: %i, '
+                  'length: %i) with total input sample being %i.' \
+                  % (self.startpoints[illegal][0], self.offset,
+                     self.boxlength, nsamples))
 
 
     @accepts_dataset_as_samples
     def _train(self, data):
-        startpoints = self.startpoints
-        boxlength = self.boxlength
-        if __debug__:
-            offset = self.offset
-            for sp in startpoints:
-                if ( sp + offset + boxlength - 1 > len(data)-1 ) \
-                   or ( sp + offset < 0 ):
-                    raise ValueError('Illegal box (start: %i, offset: %i, '
-                          'length: %i) with total input sample being %i.' \
-                          % (sp, offset, boxlength, len(data)))
-        self._outshape = (len(startpoints), boxlength) + data.shape[1:]
+        self._check_boxes(len(data))
+        self._outshape = (len(self.startpoints), self.boxlength) \
+                         + data.shape[1:]
 
 
     def __repr__(self):
         s = super(BoxcarMapper, self).__repr__()
+        if self.view:
+            s = s.replace("(", "(view=True, ", 1)
         return s.replace("(", "(boxlength=%d, offset=%d, startpoints=%s, " %
                          (self.boxlength, self.offset, str(self.startpoints)),
                          1)
@@ -145,7 +139,40 @@ class BoxcarMapper(Mapper):
         """
         # NOTE: _forward_dataset() relies on the assumption that the following
         # also works with 1D arrays and still yields sane results
-        return np.vstack([data[box][np.newaxis] for box in self.__selectors])
+        return self._get_boxcars(data, self.view)
+
+
+    def _get_boxcars(self, data, view=False):
+        """Array of all boxcars, i.e. (#startpoint, boxlength, ...)
+
+        Parameters
+        ----------
+        data : array
+        view : bool
+          If True, equally spaced boxcars are returned as a read-only view
+          on `data`.
+        """
+        data = np.asanyarray(data)
+        boxlength = self.boxlength
+        self._check_boxes(len(data))
+        starts = self.startpoints + self.offset
+        if view and data.dtype != np.dtype('object'):
+            steps = np.unique(np.diff(starts))
+            if len(starts) and len(steps) <= 1 and not np.any(steps < 0):
+                # equally spaced boxcars -- a single strided window
+                if len(steps):
+                    step = steps[0]
+                else:
+                    step = 0
+                boxes = np.lib.stride_tricks.as_strided(
+                            data[starts[0]:],
+                            shape=(len(starts), boxlength) + data.shape[1:],
+                            strides=(step * data.strides[0],) + data.strides)
+                # overlapping boxcars share memory
+                boxes.flags.writeable = False
+                return boxes
+        # gather all boxcars into a single array at once
+        return data[starts[:, np.newaxis] + np.arange(boxlength)]
 
 
     def _forward_dataset(self, dataset):
@@ -164,9 +191,9 @@ class BoxcarMapper(Mapper):
         # map old sample attributes -- which simply get stacked into one for all
         # boxcar elements/samples
         for k in dataset.sa:
-            # using _forward_data() instead of forward(), since we know that
+            # using _get_boxcars() instead of forward(), since we know that
             # this implementation can actually deal with 1D-arrays
-            mds.sa[k] = self._forward_data(dataset.sa[k].value)
+            mds.sa[k] = self._get_boxcars(dataset.sa[k].value)
         # create the box offset attribute if space name is given
         if self.get_space():
             if len(msamp.shape) > 2:
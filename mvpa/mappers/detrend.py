@@ -19,7 +19,8 @@ if externals.exists('scipy', raise_=True):
     from scipy.special import legendre
 
 from mvpa.base.dochelpers import _str, borrowkwargs
-from mvpa.mappers.base import Mapper
+from mvpa.mappers.base import Mapper, _get_feature_blocks, \
+     _get_output_samples
 
 
 class PolyDetrendMapper(Mapper):
@@ -71,7 +72,8 @@ class PolyDetrendMapper(Mapper):
     >>> np.sum(np.abs(mds)) < 0.00001
     True
     """
-    def __init__(self, polyord=1, chunks_attr=None, opt_regs=None, **kwargs):
+    def __init__(self, polyord=1, chunks_attr=None, opt_regs=None,
+                 block_bytes=None, outfile=None, **kwargs):
         """
         Parameters
         ----------
@@ -104,14 +106,28 @@ class PolyDetrendMapper(Mapper):
           name is already present in the input dataset its values are interpreted
           as sample coordinates in the space that should be spanned by the
           polynomials.
+        block_bytes : int or None
+          If provided, samples are processed in blocks of features, so
+          that temporary copies of the samples do not exceed (roughly) the
+          given number of bytes.  In combination with memory-mapped
+          samples and `outfile` this allows detrending of datasets that
+          do not fit into memory.
+        outfile : str or None
+          If provided, detrended samples are written into a memory-mapped
+          array in this file (.npy format), instead of being kept in
+          memory.  Ignored for in-place detrending.
         """
         self.__chunks_attr = chunks_attr
         self.__polyord = polyord
         self.__opt_reg = opt_regs
+        self.__block_bytes = block_bytes
+        self.__outfile = outfile
 
         # things that come from train()
         self._polycoords = None
         self._regs = None
+        self._basis = None
+        self._chunk_regs = None
 
         # secret switch to perform in-place detrending
         self._secret_inplace_detrend = False
@@ -122,11 +138,17 @@ class PolyDetrendMapper(Mapper):
 
     def __repr__(self):
         s = super(PolyDetrendMapper, self).__repr__()
+        add_args = ''
+        if self.__block_bytes is not None:
+            add_args += 'block_bytes=%s, ' % repr(self.__block_bytes)
+        if self.__outfile is not None:
+            add_args += 'outfile=%s, ' % repr(self.__outfile)
         return s.replace("(",
-                         "(polyord=%i, chunks_attr=%s, opt_regs=%s, "
+                         "(polyord=%i, chunks_attr=%s, opt_regs=%s, %s"
                           % (self.__polyord,
                              repr(self.__chunks_attr),
-                             repr(self.__opt_reg)),
+                             repr(self.__opt_reg),
+                             add_args),
                          1)
 
 
@@ -186,6 +208,7 @@ class PolyDetrendMapper(Mapper):
         opt_reg = self.__opt_reg
         inspace = self.get_space()
         self._polycoords = None
+        self._regs = self._basis = self._chunk_regs = None
 
         # global detrending is desired
         if chunks_attr is None:
@@ -223,6 +246,7 @@ class PolyDetrendMapper(Mapper):
                 # filled below -- we know that those polycoords are going to
                 # be ints
                 self._polycoords = np.empty(len(ds), dtype='int')
+            chunk_regs = []
             for n, chunk in enumerate(uchunks):
                 # get the indices for that chunk
                 cinds = ds.sa[chunks_attr].value == chunk
@@ -232,9 +256,20 @@ class PolyDetrendMapper(Mapper):
                 if update_polycoords and not polycoords is None:
                     self._polycoords[cinds] = polycoords
                 # create each polyord with the value for that chunk
-                for n in range(polyord[n] + 1):
-                    newreg = np.zeros((len(ds), 1))
-                    newreg[cinds, 0] = legendre(n)(polycoords_scaled)
+                creg = np.array([legendre(o)(polycoords_scaled)
+                                 for o in range(polyord[n] + 1)]).T
+                chunk_regs.append((_get_slicer(cinds), creg))
+
+            if opt_reg is None:
+                # chunks do not share any regressor, so each one could be
+                # detrended separately
+                self._chunk_regs = [(slicer, _get_basis(creg))
+                                    for slicer, creg in chunk_regs]
+            else:
+                # optional regressors span across chunks -- need full design
+                for slicer, creg in chunk_regs:
+                    newreg = np.zeros((len(ds), creg.shape[1]))
+                    newreg[slicer] = creg
                     reg.append(newreg)
 
         # if we don't handle in inspace, there is no need to store polycoords
@@ -247,13 +282,17 @@ class PolyDetrendMapper(Mapper):
             for oreg in opt_reg:
                 reg.append(ds.sa[oreg].value[np.newaxis].T)
 
-        # combine the regs (time x reg)
-        self._regs = np.hstack(reg)
+        if len(reg):
+            # combine the regs (time x reg)
+            self._regs = np.hstack(reg)
+            # regressors depend only on the structure of the dataset, so
+            # their basis could be reused for any data
+            self._basis = _get_basis(self._regs)
 
 
     def _forward_dataset(self, ds):
         # auto-train the mapper if not yet done
-        if self._regs is None:
+        if self._regs is None and self._chunk_regs is None:
             self.train(ds)
 
         if self._secret_inplace_detrend:
@@ -264,18 +303,23 @@ class PolyDetrendMapper(Mapper):
 
         # local binding
         regs = self._regs
+        chunk_regs = self._chunk_regs
         inspace = self.get_space()
         polycoords = self._polycoords
+        if regs is None:
+            nregs = sum([len(basis) for slicer, basis in chunk_regs])
+        else:
+            nregs = len(regs)
 
         # is it possible to map that dataset?
-        if inspace is None and len(regs) != len(ds):
+        if inspace is None and nregs != len(ds):
             raise ValueError("Cannot detrend the dataset, since it neither "
                              "provides location information of its samples "
                              "in the space spanned by the polynomials, "
                              "nor does it match the number of samples this "
                              "this mapper has been trained on. (got: %i "
                              " and was trained on %i)."
-                             % (len(ds), len(regs)))
+                             % (len(ds), nregs))
         # do we have to handle the polynomial space somehow?
         if not inspace is None:
             if inspace in ds.sa:
@@ -301,35 +345,77 @@ class PolyDetrendMapper(Mapper):
                 # let's put that information into the output dataset
                 mds.sa[inspace] = self._polycoords
 
-        # regression for each feature
-        fit = np.linalg.lstsq(regs, ds.samples)
-        # actually we are only interested in the solution
-        # res[0] is (nregr x nfeatures)
-        y = fit[0]
         # remove all and keep only the residuals
+        samples = ds.samples
         if self._secret_inplace_detrend:
             # if we are in evil mode do evil
 
             # cast the data to float, since in-place operations below do not
             # upcast!
-            if np.issubdtype(mds.samples.dtype, np.integer):
-                mds.samples = mds.samples.astype('float')
-
-            mds.samples -= np.dot(regs, y)
+            if np.issubdtype(samples.dtype, np.integer):
+                samples = samples.astype('float')
+            out = samples
         else:
-            # important to assign to ensure COW behavior
-            mds.samples = ds.samples - np.dot(regs, y)
+            out = _get_output_samples(samples.shape, 'float', self.__outfile)
+
+        # block by block of features to limit the memory demands, e.g. for
+        # memory-mapped samples
+        nbytes = self.__block_bytes
+        for fb in _get_feature_blocks(samples.shape, nbytes):
+            block = out[:, fb]
+            if not out is samples:
+                block[:] = samples[:, fb]
+            if regs is None:
+                for slicer, basis in chunk_regs:
+                    csamples = block[slicer]
+                    _residualize(csamples, basis, nbytes)
+                    if not isinstance(slicer, slice):
+                        # fancy indexing provided a copy
+                        block[slicer] = csamples
+            else:
+                _residualize(block, self._basis, nbytes)
 
+        # important to assign to ensure COW behavior
+        mds.samples = out
         return mds
 
 
-
     def _forward_data(self, data):
         raise RuntimeError("%s cannot map plain data."
                            % self.__class__.__name__)
 
 
 
+def _get_basis(regs):
+    """Orthonormal basis (nsamples x rank) of the space spanned by regressors
+    """
+    u, s, vt = np.linalg.svd(regs, full_matrices=False)
+    return u[:, s > s.max() * max(regs.shape) * np.finfo(s.dtype).eps]
+
+
+def _residualize(samples, basis, nbytes=None):
+    """In-place removal of the projection onto basis from samples
+
+    Features are processed in blocks, so temporaries stay within `nbytes`
+    (32MB by default).
+    """
+    if nbytes is None:
+        nbytes = 2**25
+    for fb in _get_feature_blocks(samples.shape, nbytes):
+        block = samples[:, fb]
+        block -= np.dot(basis, np.dot(basis.T, block))
+
+
+def _get_slicer(mask):
+    """Slice for a mask selecting a contiguous range, otherwise indices
+    """
+    idx = np.flatnonzero(mask)
+    if len(idx) and idx[-1] - idx[0] + 1 == len(idx):
+        return slice(idx[0], idx[-1] + 1)
+    return idx
+
+
+
 @borrowkwargs(PolyDetrendMapper, '__init__')
 def poly_detrend(ds, **kwargs):
     """In-place polynomial detrending.
@@ -103,12 +103,28 @@ class FxMapper(Mapper):
                                % self.__class__.__name__)
         # apply fx along samples axis for each feature
         if self.__axis == 'samples':
-            mdata = np.apply_along_axis(self.__fx, 0, data, *self.__fxargs)
+            mdata = self._apply_fx(data, 0)
         # apply fx along features axis for each sample
         elif self.__axis == 'features':
-            mdata = np.apply_along_axis(self.__fx, 1, data, *self.__fxargs)
+            mdata = self._apply_fx(data, 1)
         return np.atleast_2d(mdata)
 
+
+    def _apply_fx(self, data, axis):
+        """Apply fx to each 1D slice of data along the given axis
+
+        Functions known to take an `axis` argument, and elementwise ufuncs,
+        are called once for all the data instead of once per slice.
+        """
+        fx = self.__fx
+        if not len(self.__fxargs):
+            if fx in _axis_fxs:
+                return fx(data, axis=axis)
+            if isinstance(fx, np.ufunc) and fx.nin == 1 and fx.nout == 1:
+                # elementwise -- the axis does not matter
+                return fx(data)
+        return np.apply_along_axis(fx, axis, data, *self.__fxargs)
+
     @borrowdoc(Mapper)
     def _forward_dataset(self, ds):
         if self.__uattrs is None:
@@ -173,6 +189,15 @@ class FxMapper(Mapper):
         # mapper should operate on
         self.__attrcombs = dict(zip(self.__uattrs,
                                 [col[attr].unique for attr in self.__uattrs]))
+
+        # known reducers could process all groups at once
+        reducer = _segment_reducers.get(self.__fx)
+        if not reducer is None and not len(self.__fxargs) \
+           and np.issubdtype(ds.samples.dtype, np.number) \
+           and np.all([col[attr].value.dtype != np.dtype('object')
+                       for attr in self.__uattrs]):
+            return self._forward_dataset_segments(ds, col, axis, reducer)
+
         # let it generate all combinations of unique elements in any attr
         for comb in _orthogonal_permutations(self.__attrcombs):
             selector = reduce(np.multiply,
@@ -191,8 +216,7 @@ class FxMapper(Mapper):
                         'a sign of a disbalanced dataset %s.' % (comb, ds))
                 continue
 
-            fxed_samples = np.apply_along_axis(self.__fx, axis, samples,
-                                              *self.__fxargs)
+            fxed_samples = self._apply_fx(samples, axis)
             mdata.append(fxed_samples)
             if not self.__attrfx is None:
                 # and now all samples attributes
@@ -208,6 +232,54 @@ class FxMapper(Mapper):
         return mdata, attrs
 
 
+    def _forward_dataset_segments(self, ds, col, axis, reducer):
+        """Grouped mapping with a reducer processing all groups at once
+
+        Group keys are factorized once, samples (or features) are sorted by
+        group, and the reducer operates on all contiguous segments in a
+        single call.  Groups are returned in the same order as by the
+        generic implementation.
+        """
+        # factorize combinations of attribute values into group codes
+        luts = []
+        gcodes = 0
+        for attr in self.__uattrs:
+            uvalues = col[attr].unique
+            luts.append(dict(zip(uvalues, range(len(uvalues)))))
+            gcodes = gcodes * len(uvalues) \
+                     + np.searchsorted(uvalues, col[attr].value)
+
+        # sort once -- stable to keep order within a group
+        order = np.argsort(gcodes, kind='mergesort')
+        gcodes = gcodes[order]
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(gcodes)) + 1))
+        bounds = np.concatenate((starts, [len(gcodes)]))
+        segments = dict(zip(gcodes[starts], range(len(starts))))
+
+        # figure out the order of the groups in the output
+        selected = []
+        for comb in _orthogonal_permutations(self.__attrcombs):
+            code = 0
+            for attr, lut in zip(self.__uattrs, luts):
+                code = code * len(lut) + lut[comb[attr]]
+            if not code in segments:
+                warning('There were no samples for combination %s. It might be '
+                        'a sign of a disbalanced dataset %s.' % (comb, ds))
+                continue
+            selected.append(segments[code])
+
+        mdata = reducer(ds.samples.take(order, axis=axis), bounds, axis)
+        mdata = mdata.take(selected, axis=axis)
+
+        attrs = dict(zip(col.keys(), [[] for i in col]))
+        if not self.__attrfx is None:
+            for attr in col:
+                values = col[attr].value[order]
+                attrs[attr] = [self.__attrfx(values[bounds[i]:bounds[i + 1]])
+                               for i in selected]
+        return mdata, attrs
+
+
     def _forward_dataset_full(self, ds):
         # simply map the all of the data
         mdata = self._forward_data(ds.samples)
@@ -352,6 +424,81 @@ def _uniquemerge2literal(attrs):
         return None
 
 
+def _get_segment_counts(bounds, axis):
+    """Segment lengths shaped to broadcast against reduced data"""
+    counts = np.diff(bounds)
+    if axis == 0:
+        return counts[:, None]
+    return counts[None]
+
+
+def _segment_sum(data, bounds, axis):
+    """Sum of each segment `bounds[i]:bounds[i+1]` along `axis`"""
+    return np.add.reduceat(data, bounds[:-1], axis=axis)
+
+
+def _segment_mean(data, bounds, axis):
+    """Mean of each segment `bounds[i]:bounds[i+1]` along `axis`"""
+    if np.issubdtype(data.dtype, np.integer):
+        dtype = np.float64
+    else:
+        dtype = data.dtype
+    return np.add.reduceat(data, bounds[:-1], axis=axis, dtype=dtype) \
+           / _get_segment_counts(bounds, axis).astype(dtype)
+
+
+def _segment_max(data, bounds, axis):
+    """Maximum of each segment `bounds[i]:bounds[i+1]` along `axis`"""
+    return np.maximum.reduceat(data, bounds[:-1], axis=axis)
+
+
+def _segment_min(data, bounds, axis):
+    """Minimum of each segment `bounds[i]:bounds[i+1]` along `axis`"""
+    return np.minimum.reduceat(data, bounds[:-1], axis=axis)
+
+
+def _segment_std(data, bounds, axis):
+    """Standard deviation of each segment `bounds[i]:bounds[i+1]` along `axis`
+    """
+    means = _segment_mean(data, bounds, axis)
+    dev = data - np.repeat(means, np.diff(bounds), axis=axis)
+    dev *= dev
+    return np.sqrt(np.add.reduceat(dev, bounds[:-1], axis=axis)
+                   / _get_segment_counts(bounds, axis).astype(dev.dtype))
+
+
+def _segment_median(data, bounds, axis):
+    """Median of each segment `bounds[i]:bounds[i+1]` along `axis`"""
+    slicer = [slice(None)] * data.ndim
+    medians = []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        slicer[axis] = slice(start, stop)
+        medians.append(np.median(data[tuple(slicer)], axis=axis))
+    medians = np.array(medians)
+    if axis == 0:
+        return medians
+    return medians.T
+
+
+# functions which compute the same along an axis of an array (given as `axis`
+# argument) as they do for each of its 1D slices
+_axis_fxs = set([np.sum, np.mean, np.max, np.min, np.std, np.var,
+                 np.median, np.prod, np.ptp, np.any, np.all,
+                 sum_of_abs, max_of_abs])
+
+
+# functions applied along an axis by FxMapper, which have an equivalent
+# operating on all contiguous groups at once
+_segment_reducers = {
+    np.sum: _segment_sum,
+    np.mean: _segment_mean,
+    np.max: _segment_max,
+    np.min: _segment_min,
+    np.std: _segment_std,
+    np.median: _segment_median,
+    }
+
+
 def _orthogonal_permutations(a_dict):
     """
     Takes a dictionary with lists as values and returns all permutations
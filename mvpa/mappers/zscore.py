@@ -14,7 +14,8 @@ import numpy as np
 
 from mvpa.base import warning
 from mvpa.base.dochelpers import _str, borrowkwargs
-from mvpa.mappers.base import accepts_dataset_as_samples, Mapper
+from mvpa.mappers.base import accepts_dataset_as_samples, Mapper, \
+     _get_feature_blocks, _get_output_samples
 from mvpa.datasets.base import Dataset
 from mvpa.datasets.miscfx import get_nsamples_per_attr, get_samples_by_attr
 from mvpa.support import copy
@@ -49,7 +50,7 @@ class ZScoreMapper(Mapper):
     Reverse-mapping is currently not implemented.
     """
     def __init__(self, params=None, param_est=None, chunks_attr='chunks',
-                 dtype='float64', **kwargs):
+                 dtype='float64', block_bytes=None, outfile=None, **kwargs):
         """
         Parameters
         ----------
@@ -73,6 +74,16 @@ class ZScoreMapper(Mapper):
         dtype : Numpy dtype, optional
           Target dtype that is used for upcasting, in case integer data is to be
           Z-scored.
+        block_bytes : int or None
+          If provided, samples are processed in blocks of features, so
+          that temporary copies of the samples do not exceed (roughly) the
+          given number of bytes.  In combination with memory-mapped
+          samples and `outfile` this allows Z-scoring of datasets that
+          do not fit into memory.
+        outfile : str or None
+          If provided, Z-scored samples are written into a memory-mapped
+          array in this file (.npy format), instead of being kept in
+          memory.  Ignored for in-place Z-scoring.
         """
         Mapper.__init__(self, **kwargs)
 
@@ -81,6 +92,8 @@ class ZScoreMapper(Mapper):
         self.__param_est = param_est
         self.__params_dict = None
         self.__dtype = dtype
+        self.__block_bytes = block_bytes
+        self.__outfile = outfile
 
         # secret switch to perform in-place z-scoring
         self._secret_inplace_zscore = False
@@ -97,6 +110,10 @@ class ZScoreMapper(Mapper):
             add_args += ['chunks_attr=%s' % repr(self.__chunks_attr)]
         if self.__dtype != 'float64':
             add_args += ['dtype=%s' % repr(self.__dtype)]
+        if self.__block_bytes is not None:
+            add_args += ['block_bytes=%s' % repr(self.__block_bytes)]
+        if self.__outfile is not None:
+            add_args += ['outfile=%s' % repr(self.__outfile)]
         if add_args:
             return s.replace("(", '(%s, ' % ", ".join(add_args))
         else:
@@ -126,23 +143,45 @@ class ZScoreMapper(Mapper):
             if not param_est is None:
                 est_attr, est_attr_values = param_est
                 # which samples to use for estimation
-                est_ids = set(get_samples_by_attr(ds, est_attr,
-                                                  est_attr_values))
+                est_ids = get_samples_by_attr(ds, est_attr, est_attr_values)
             else:
                 est_ids = slice(None)
 
+            # estimate block by block of features to limit the memory
+            # demands, e.g. for memory-mapped samples
+            samples = ds.samples
+            fblocks = _get_feature_blocks(samples.shape, self.__block_bytes)
+
             # now we can either do it one for all, or per chunk
             if not chunks_attr is None:
-                # per chunk estimate
-                params = {}
-                for c in ds.sa[chunks_attr].unique:
-                    slicer = np.where(ds.sa[chunks_attr].value == c)[0]
-                    if not isinstance(est_ids, slice):
-                        slicer = list(est_ids.intersection(set(slicer)))
-                    params[c] = self._compute_params(ds.samples[slicer])
+                uchunks, inverse = np.unique(ds.sa[chunks_attr].value,
+                                             return_inverse=True)
+                if not self._overrides('_compute_params'):
+                    # per chunk estimate -- all chunks at once
+                    stats = [_grouped_mean_std(samples[:, fb][est_ids],
+                                               inverse[est_ids], len(uchunks))
+                             for fb in fblocks]
+                    means = np.hstack([m for m, s in stats])
+                    stds = np.hstack([s for m, s in stats])
+                    params = dict([(c, (means[i], stds[i]))
+                                   for i, c in enumerate(uchunks)])
+                else:
+                    # custom estimates -- one chunk at a time
+                    ids = np.arange(len(samples))[est_ids]
+                    est_inverse = inverse[est_ids]
+                    params = {}
+                    for i, c in enumerate(uchunks):
+                        rows = ids[est_inverse == i]
+                        stats = [self._compute_params(samples[rows, fb])
+                                 for fb in fblocks]
+                        params[c] = (np.hstack([m for m, s in stats]),
+                                     np.hstack([s for m, s in stats]))
             else:
                 # global estimate
-                params = {'__all__': self._compute_params(ds.samples[est_ids])}
+                stats = [self._compute_params(samples[:, fb][est_ids])
+                         for fb in fblocks]
+                params = {'__all__': (np.hstack([m for m, s in stats]),
+                                      np.hstack([s for m, s in stats]))}
 
 
         self.__params_dict = params
@@ -171,25 +210,62 @@ class ZScoreMapper(Mapper):
             # shallow copy to put the new stuff in
             mds = ds.copy(deep=False)
 
-        # cast the data to float, since in-place operations below do not upcast!
-        if np.issubdtype(mds.samples.dtype, np.integer):
-            mds.samples = mds.samples.astype(dtype)
-
-        if '__all__' in params:
-            # we have a global parameter set
-            mds.samples = self._zscore(mds.samples, *params['__all__'])
+        samples = mds.samples
+        if self._secret_inplace_zscore:
+            # cast the data to float, since in-place operations below do not
+            # upcast!
+            if np.issubdtype(samples.dtype, np.integer):
+                samples = samples.astype(dtype)
+            out = samples
         else:
+            # the shallow copy shares the samples -- Z-score into a separate
+            # array, to not alter the source dataset
+            if np.issubdtype(samples.dtype, np.integer):
+                odtype = dtype
+            else:
+                odtype = samples.dtype
+            out = _get_output_samples(samples.shape, odtype, self.__outfile)
+
+        if not '__all__' in params:
             # per chunk z-scoring
-            for c in mds.sa[chunks_attr].unique:
+            uchunks, inverse = np.unique(mds.sa[chunks_attr].value,
+                                         return_inverse=True)
+            for c in uchunks:
                 if not c in params:
                     raise RuntimeError(
                         "%s has no parameters for chunk '%s'. It probably "
                         "wasn't present in the training dataset!?"
                         % (self.__class__.__name__, c))
-                slicer = np.where(mds.sa[chunks_attr].value == c)[0]
-                mds.samples[slicer] = self._zscore(mds.samples[slicer],
-                                                   *params[c])
+            bounds = _get_group_bounds(inverse)
+
+        nfeatures = samples.shape[1]
+        for fb in _get_feature_blocks(samples.shape, self.__block_bytes):
+            block = out[:, fb]
+            if not out is samples:
+                block[:] = samples[:, fb]
+            if '__all__' in params:
+                # we have a global parameter set
+                self._zscore(block,
+                             *_slice_params(params['__all__'], fb, nfeatures))
+            elif bounds is not None:
+                # contiguous chunks -- z-score views in-place
+                for c, start, stop in zip(uchunks[inverse[bounds[:-1]]],
+                                          bounds[:-1], bounds[1:]):
+                    self._zscore(block[start:stop],
+                                 *_slice_params(params[c], fb, nfeatures))
+            elif self._overrides('_zscore'):
+                # scattered chunks with custom z-scoring -- one at a time
+                for i, c in enumerate(uchunks):
+                    rows = np.where(inverse == i)[0]
+                    block[rows] = self._zscore(
+                        block[rows], *_slice_params(params[c], fb, nfeatures))
+            else:
+                # scattered chunks -- broadcast parameters over the samples
+                self._zscore_grouped(block, inverse,
+                                     [_slice_params(params[c], fb, nfeatures)
+                                      for c in uchunks])
 
+        mds.samples = out
         return mds
 
 
@@ -230,6 +306,49 @@ class ZScoreMapper(Mapper):
         return (np.mean(samples, axis=0), np.std(samples, axis=0))
 
 
+    def _overrides(self, name):
+        """Either method `name` is reimplemented in a derived class
+
+        Grouped computations for all chunks at once are equivalent only
+        to the default `_compute_params` and `_zscore`.
+        """
+        return getattr(self.__class__, name).im_func \
+               is not getattr(ZScoreMapper, name).im_func
+
+
+    def _zscore_grouped(self, samples, inverse, params):
+        """Z-score samples in-place given parameters of their groups
+
+        Parameters
+        ----------
+        samples : ndarray
+        inverse : ndarray
+          Index of the group (into `params`) for each sample.
+        params : list of tuple(mean, std)
+        """
+        nfeatures = samples.shape[1]
+        means = np.zeros((len(params), nfeatures))
+        scales = np.ones((len(params), nfeatures))
+        for i, (mean, std) in enumerate(params):
+            if not (np.isscalar(mean) or nfeatures == len(mean)):
+                raise RuntimeError("mean should be a per-feature vector. "
+                                   "Got: %r" % (mean,))
+            if not (np.isscalar(std) or nfeatures == len(std)):
+                raise RuntimeError("std should be a per-feature vector.")
+            means[i] = mean
+            # invariant features get only de-meaned, unless the std is a
+            # zero scalar which zeroes them out (see _zscore)
+            std = np.asanyarray(std, dtype=float)
+            if std.ndim == 0 and std == 0:
+                scales[i] = 0
+            else:
+                scales[i] = np.where(std != 0, 1.0 / np.where(std != 0,
+                                                              std, 1), 1)
+        samples -= means[inverse]
+        samples *= scales[inverse]
+        return samples
+
+
     def _zscore(self, samples, mean, std):
         # de-mean
         if np.isscalar(mean) or samples.shape[1] == len(mean):
@@ -255,6 +374,88 @@ class ZScoreMapper(Mapper):
 
 
 
+def _slice_params(params, fslice, nfeatures):
+    """Restrict Z-scoring parameters to a block of features
+
+    Parameters
+    ----------
+    params : tuple(mean, std)
+    fslice : slice
+    nfeatures : int
+      Total number of features.
+    """
+    if fslice == slice(None):
+        return params
+    sliced = []
+    for p in params:
+        if not np.isscalar(p):
+            if len(p) != nfeatures:
+                raise RuntimeError("Z-scoring parameters should be "
+                                   "per-feature vectors. Got: %r" % (p,))
+            p = np.asanyarray(p)[fslice]
+        sliced.append(p)
+    return tuple(sliced)
+
+
+def _get_group_bounds(inverse):
+    """Boundaries of contiguous groups, or None if groups are scattered
+
+    Parameters
+    ----------
+    inverse : ndarray
+      Group index for each sample.
+    """
+    if not len(inverse):
+        return None
+    change = np.flatnonzero(inverse[1:] != inverse[:-1]) + 1
+    if len(change) + 1 != len(np.unique(inverse)):
+        # some group occurs more than once
+        return None
+    return np.concatenate(([0], change, [len(inverse)]))
+
+
+def _grouped_mean_std(samples, inverse, ngroups):
+    """Per-group means and standard deviations within a single pass
+
+    Statistics are accumulated in float64 (regardless of the dtype of
+    the samples), and deviations are taken from the group means, so
+    they are numerically stable.  Contiguous groups are processed as
+    views, scattered ones are gathered one at a time.
+
+    Parameters
+    ----------
+    samples : ndarray
+    inverse : ndarray
+      Group index (in range(ngroups)) for each sample.
+    ngroups : int
+    """
+    means = np.empty((ngroups, samples.shape[1]))
+    means.fill(np.nan)
+    stds = means.copy()
+    if not len(samples):
+        return means, stds
+    bounds = _get_group_bounds(inverse)
+    if bounds is None:
+        # group samples via a single sort of their indices
+        order = np.argsort(inverse, kind='mergesort')
+        inverse = inverse[order]
+        bounds = _get_group_bounds(inverse)
+    else:
+        order = None
+    for group, start, stop in zip(inverse[bounds[:-1]],
+                                  bounds[:-1], bounds[1:]):
+        if order is None:
+            block = samples[start:stop]
+        else:
+            block = samples[order[start:stop]]
+        mean = block.mean(axis=0, dtype=np.float64)
+        # squared deviations from the group mean
+        dev = np.subtract(block, mean, dtype=np.float64)
+        means[group] = mean
+        stds[group] = np.sqrt(np.einsum('ij,ij->j', dev, dev) / len(block))
+    return means, stds
+
+
 @borrowkwargs(ZScoreMapper, '__init__')
 def zscore(ds, **kwargs):
     """In-place Z-scoring of a `Dataset` or `ndarray`.
@@ -22,7 +22,7 @@ __docformat__ = 'restructuredtext'
 import numpy as np
 import mvpa.support.copy as copy
 
-from mvpa.base.learner import Learner
+from mvpa.base.learner import Learner, SufficientStatsLearner
 from mvpa.base.state import ConditionalAttribute
 from mvpa.misc.args import group_kwargs
 from mvpa.misc.attrmap import AttributeMap
@@ -267,7 +267,7 @@ class RepeatedMeasure(Measure):
 
         # run the node an all generated datasets
         results = []
-        for i, sds in enumerate(generator.generate(ds)):
+        for i, sds in enumerate(self._generate(ds)):
             if ca.is_enabled("datasets"):
                 # store dataset in ca
                 ca.datasets.append(sds)
@@ -302,6 +302,14 @@ class RepeatedMeasure(Measure):
         return results
 
 
+    def _generate(self, ds):
+        """Yield the datasets to run the node on.
+
+        Maybe overwritten in subclasses to provide datasets differently.
+        """
+        return self._generator.generate(ds)
+
+
     def _repetition_postcall(self, ds, node, result):
         """Post-processing handler for each repetition.
 
@@ -349,7 +357,7 @@ class CrossValidation(RepeatedMeasure):
 
     # TODO move conditional attributes from CVTE into this guy
     def __init__(self, learner, generator, errorfx=mean_mismatch_error,
-                 **kwargs):
+                 reuse_stats=False, **kwargs):
         """
         Parameters
         ----------
@@ -365,6 +373,18 @@ class CrossValidation(RepeatedMeasure):
         errorfx : callable
           Custom implementation of an error function. The callable needs to
           accept two arguments (1. predicted values, 2. target values).
+        reuse_stats : bool
+          If the learner is fully determined by additive sufficient
+          statistics (see `SufficientStatsLearner`, e.g. GNB, LDA, RidgeReg,
+          BLR), compute those only once for every block of samples sharing
+          the same role across all folds (e.g. a chunk), and obtain the
+          training statistics of each fold by combining them (e.g.
+          subtracting the testing chunk from the total), so that all folds
+          together cost roughly a single training.  All folds get
+          generated upfront then.  The generator must not alter the
+          samples.  Falls back to regular training whenever the
+          training dataset of a fold is not a union of such blocks, or its
+          targets were changed (e.g. permuted).
         """
         # compile the appropriate repeated measure to do cross-validation from
         # pieces
@@ -383,6 +403,10 @@ class CrossValidation(RepeatedMeasure):
         RepeatedMeasure.__init__(self, tm, generator, space='sa.cvfolds',
                                  **kwargs)
 
+        self.__learner = learner
+        self.__reuse_stats = reuse_stats
+        self.__folds = None
+
         for ca in ['stats', 'training_stats']:
             if self.ca.is_enabled(ca):
                 # enforce ca if requested
@@ -395,7 +419,37 @@ class CrossValidation(RepeatedMeasure):
     def _call(self, ds):
         # always untrain to wipe out previous stats
         self.untrain()
-        return super(CrossValidation, self)._call(ds)
+        learner = self.__learner
+        if not self.__reuse_stats:
+            return super(CrossValidation, self)._call(ds)
+        if not isinstance(learner, SufficientStatsLearner):
+            warning("%s cannot reuse statistics across folds, since %s is "
+                    "not a SufficientStatsLearner" % (self, learner))
+            return super(CrossValidation, self)._call(ds)
+        targets = np.asanyarray(ds.sa[learner.get_space()].value)
+        if learner.__is_regression__ and not targets.dtype.kind in 'biuf':
+            # mapping of literal targets might differ across folds
+            return super(CrossValidation, self)._call(ds)
+
+        # mark samples to be able to figure out what learner is trained on
+        ds = ds.copy(deep=False)
+        ds.sa[_BlockStatsProvider.idattr] = np.arange(len(ds))
+        # blocks are determined by all folds, thus generate them at once,
+        # and run on the very same folds
+        self.__folds = list(self._generator.generate(ds))
+        learner._set_stats_provider(
+            _BlockStatsProvider(ds, self.__folds, self._generator.get_space()))
+        try:
+            return super(CrossValidation, self)._call(ds)
+        finally:
+            self.__folds = None
+            learner._set_stats_provider(None)
+
+
+    def _generate(self, ds):
+        if self.__folds is not None:
+            return self.__folds
+        return super(CrossValidation, self)._generate(ds)
 
 
     def _repetition_postcall(self, ds, node, result):
@@ -415,6 +469,87 @@ class CrossValidation(RepeatedMeasure):
 
 
 
+class _BlockStatsProvider(object):
+    """Provide statistics of a learner for unions of blocks of samples.
+
+    A block is a set of samples sharing the same role (e.g. training or
+    testing) in every dataset yielded by the generator.  Statistics are
+    computed only once per block, and statistics of any union of blocks
+    are obtained by combining them.
+    """
+
+    idattr = 'cv_sample_ids'
+    """Sample attribute storing the index of a sample in the original
+    dataset"""
+
+    def __init__(self, ds, folds, space):
+        """
+        Parameters
+        ----------
+        ds : Dataset
+          Dataset with sample attribute `idattr`.
+        folds : list of Dataset
+          Datasets generated from `ds`.
+        space : str
+          Sample attribute defining the role of samples in `folds`.
+        """
+        self._ds = ds
+        # roles of every sample across all generated datasets (None if
+        # a sample is not part of a generated dataset)
+        roles = []
+        for sds in folds:
+            role = [None] * len(ds)
+            for i, r in zip(sds.sa[self.idattr].value, sds.sa[space].value):
+                role[i] = r
+            roles.append(role)
+        descriptions = zip(*roles)
+        description2block = dict([(d, i) for i, d in
+                                  enumerate(sorted(set(descriptions)))])
+        self._sample2block = np.array([description2block[d]
+                                       for d in descriptions])
+        self._block_counts = np.bincount(self._sample2block)
+        self._block_stats = None
+        self._total_stats = None
+        if __debug__:
+            debug('CV', "Reusing statistics of %d blocks of samples "
+                  "across %d folds" % (len(self._block_counts), len(roles)))
+
+
+    def __call__(self, learner, ds):
+        if not ds.sa.has_key(self.idattr):
+            return None
+        ids = ds.sa[self.idattr].value
+        space = learner.get_space()
+        if np.any(ds.sa[space].value != self._ds.sa[space].value[ids]):
+            # targets were altered (e.g. permuted)
+            return None
+        blocks = np.unique(self._sample2block[ids])
+        if len(np.unique(ids)) != len(ids) \
+               or np.sum(self._block_counts[blocks]) != len(ids):
+            # not a union of the blocks
+            return None
+
+        if self._block_stats is None:
+            self._block_stats = [
+                learner._compute_stats(self._ds[self._sample2block == b])
+                for b in xrange(len(self._block_counts))]
+        block_stats = self._block_stats
+        merge = learner._merge_stats
+
+        missing = np.setdiff1d(np.arange(len(block_stats)), blocks)
+        if len(missing) < len(blocks) - 1:
+            # cheaper to subtract from the total
+            if self._total_stats is None:
+                self._total_stats = reduce(merge, block_stats)
+            stats = self._total_stats
+            for b in missing:
+                stats = merge(stats, block_stats[b], subtract=True)
+        else:
+            stats = reduce(merge, [block_stats[b] for b in blocks])
+        return stats
+
+
+
 class TransferMeasure(Measure):
     """Train and run a measure on two different parts of a dataset.
 
@@ -11,7 +11,9 @@
 __docformat__ = 'restructuredtext'
 
 import numpy as np
-import re, os
+import re, os, sys
+import threading
+import Queue
 
 # for SmartVersion
 from distutils.version import Version
@@ -667,3 +669,78 @@ def get_nelements_per_value(data):
         result[l] += 1
 
     return result
+
+
+def get_nthreads(nthreads):
+    """Resolve the number of threads to use
+
+    Parameters
+    ----------
+    nthreads : None or int
+      If None -- number of available cores.
+    """
+    if nthreads is None:
+        try:
+            import multiprocessing
+            nthreads = multiprocessing.cpu_count()
+        except (ImportError, NotImplementedError):
+            nthreads = 1
+    return max(1, nthreads)
+
+
+def parallel_map(func, args, nthreads=1):
+    """Apply `func` to each of `args` using a pool of threads
+
+    Results are returned in the order of `args`, so they do not depend on
+    the number of threads.  The first exception raised by `func` (in the
+    order of `args`) gets re-raised after all threads are done.  Only pays
+    off if `func` spends most of the time outside of the Python interpreter
+    (e.g. in numpy or ctypes calls).
+
+    Parameters
+    ----------
+    func : callable
+      Takes a single argument.
+    args : iterable
+      Arguments to apply `func` to.  Consumed lazily only if a single
+      thread is used.
+    nthreads : None or int
+      Number of threads to use.  If None -- number of available cores.
+    """
+    nthreads = get_nthreads(nthreads)
+    if nthreads <= 1:
+        return [func(arg) for arg in args]
+
+    args = list(args)
+    nthreads = min(nthreads, len(args))
+
+    results = [None] * len(args)
+    errors = [None] * len(args)
+    queue = Queue.Queue()
+    for i, arg in enumerate(args):
+        queue.put((i, arg))
+
+    def worker():
+        while True:
+            try:
+                i, arg = queue.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                results[i] = func(arg)
+            except:
+                errors[i] = sys.exc_info()
+
+    if __debug__:
+        debug('PARALLEL', "Mapping %s over %d arguments using %d threads"
+              % (func, len(args), nthreads))
+    threads = [threading.Thread(target=worker) for i in xrange(nthreads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for error in errors:
+        if error is not None:
+            raise error[0], error[1], error[2]
+    return results
@@ -71,20 +71,20 @@ def second_axis_mean(x):
     return np.mean(x, axis=1)
 
 
-def sum_of_abs(x):
-    """Sum of absolute values along the 2nd axis
+def sum_of_abs(x, axis=None):
+    """Sum of absolute values (along the given axis, or of all of them)
 
     Use cases:
      - to combine multiple sensitivities to get sense about
        what features are most influential
     """
-    return np.abs(x).sum()
+    return np.abs(x).sum(axis=axis)
 
 
-def max_of_abs(x):
-    """Max of absolute values along the 2nd axis
+def max_of_abs(x, axis=None):
+    """Max of absolute values (along the given axis, or of all of them)
     """
-    return np.abs(x).max()
+    return np.abs(x).max(axis=axis)
 
 
 ##REF: Name was automagically refactored
@@ -69,6 +69,8 @@ from mvpa.clfs.stats import *
 from mvpa.clfs.similarity import *
 if externals.exists('libsvm') or externals.exists('shogun'):
     from mvpa.clfs.svm import *
+if externals.exists('libsvm'):
+    from mvpa.clfs.libsvmc.cpath import *
 from mvpa.clfs.transerror import *
 from mvpa.clfs.warehouse import *
 
@@ -14,6 +14,7 @@ import numpy as np
 from mvpa.testing.tools import ok_, assert_raises, assert_false, assert_equal, \
         assert_true, assert_array_equal
 
+from mvpa.support.copy import deepcopy
 from mvpa.mappers.boxcar import BoxcarMapper
 from mvpa.datasets import Dataset
 
@@ -140,3 +141,45 @@ def test_datasetmapping():
     assert_array_equal(rds.sa.multidim, ds.sa.multidim[rds.sa.timepoints])
     # but feature attributes should be fully recovered
     assert_array_equal(rds.fa.fid, ds.fa.fid)
+
+
+def test_boxcar_view():
+    data = np.arange(60).reshape(20, 3)
+    for sp in ([1, 4, 7, 10], [3], [2, 2, 2], [5, 1, 8]):
+        bcm = BoxcarMapper(sp, 6, offset=1, view=True)
+        bcm.train(data)
+        trans = bcm.forward(data)
+        # same content as a copy
+        copied = BoxcarMapper(sp, 6, offset=1).forward(data)
+        assert_array_equal(trans, copied)
+        ok_(not np.may_share_memory(copied, data))
+        if sp == [5, 1, 8]:
+            # not equally spaced
+            ok_(not np.may_share_memory(trans, data))
+        else:
+            ok_(np.may_share_memory(trans, data))
+            assert_false(trans.flags.writeable)
+            # flattening keeps the view
+            flat = trans.reshape(len(trans), -1)
+            ok_(np.may_share_memory(flat, data))
+
+    # datasets get view samples, but copied sample attributes
+    ds = Dataset(data, sa={'targets': np.arange(20)})
+    mds = BoxcarMapper([0, 5, 10], 8, view=True).forward(ds)
+    ok_(np.may_share_memory(mds.samples, ds.samples))
+    ok_(mds.sa.targets.flags.writeable)
+    assert_array_equal(mds.sa.targets[1], np.arange(5, 13))
+
+    # copies keep all the settings
+    bcm = deepcopy(BoxcarMapper([1, 4], 3, offset=1, view=True))
+    assert_array_equal(bcm.startpoints, [1, 4])
+    assert_equal((bcm.boxlength, bcm.offset, bcm.view), (3, 1, True))
+    assert_array_equal(bcm.forward(data),
+                       BoxcarMapper([1, 4], 3, offset=1).forward(data))
+
+    # boxes outside of the data are never silently accepted
+    for view in (False, True):
+        bcm = BoxcarMapper([-1, 2], 3, view=view)
+        assert_raises(ValueError, bcm.forward, data)
+        bcm = BoxcarMapper([15, 18], 3, view=view)
+        assert_raises(ValueError, bcm.forward, data)
@@ -29,12 +29,15 @@ from mvpa.misc.errorfx import mean_mismatch_error
 
 from mvpa.base.learner import DegenerateInputError, FailedToTrainError, \
         FailedToPredictError
+from mvpa.clfs.knn import kNN
 from mvpa.clfs.meta import CombinedClassifier, \
      BinaryClassifier, MulticlassClassifier, \
      SplitClassifier, MappedClassifier, FeatureSelectionClassifier, \
      TreeClassifier, RegressionAsClassifier
 from mvpa.measures.base import TransferMeasure, ProxyMeasure, CrossValidation
 from mvpa.mappers.flatten import mask_mapper
+from mvpa.kernels.base import CachedKernel
+import mvpa.kernels.np as npK
 from mvpa.misc.attrmap import AttributeMap
 from mvpa.mappers.fx import mean_sample, BinaryFxNode
 
@@ -404,6 +407,25 @@ class ClassifiersTests(unittest.TestCase):
         self.failUnlessEqual(clf.descr, "DESCR")
 
 
+    def test_boosted_nthreads(self):
+        ds = datasets['uni4small']
+        for mk_clf in (lambda **kw: MulticlassClassifier(
+                           clf=kNN(k=3), enable_ca=['training_stats'], **kw),
+                       lambda **kw: SplitClassifier(
+                           clf=kNN(k=3),
+                           enable_ca=['stats', 'training_stats'], **kw)):
+            clf1, clf3 = mk_clf(), mk_clf(nthreads=3)
+            self.failUnlessEqual(clf3.nthreads, 3)
+            clf1.train(ds)
+            clf3.train(ds)
+            assert_array_equal(clf1.predict(ds), clf3.predict(ds))
+            # summaries get merged in the order of slave classifiers
+            self.failUnlessEqual(str(clf1.ca.training_stats),
+                                 str(clf3.ca.training_stats))
+            if isinstance(clf1, SplitClassifier):
+                self.failUnlessEqual(str(clf1.ca.stats), str(clf3.ca.stats))
+
+
     def test_mapped_classifier(self):
         samples = np.array([ [ 0,  0, -1], [ 1, 0, 1],
                             [-1, -1,  1], [-1, 0, 1],
@@ -616,6 +638,33 @@ class ClassifiersTests(unittest.TestCase):
         # TODO: test combiners, e.g. MaximalVote and ca they store
 
 
+    def test_multiclass_kernel_cache(self):
+        class KernelClassifier(SameSignClassifier):
+            """Dummy classifier computing its kernel upon training"""
+            def __init__(self, kernel, **kwargs):
+                SameSignClassifier.__init__(self, **kwargs)
+                self.kernel = kernel
+
+            def _train(self, data):
+                self.kernel.compute(data)
+
+        ds = datasets['uni3small']
+        ck = CachedKernel(kernel=npK.RbfKernel(sigma=1.5))
+        mclf = MulticlassClassifier(clf=KernelClassifier(ck))
+        mclf.train(ds)
+        # binary classifiers share a single kernel matrix
+        kfull = mclf.clfs[0].clf.kernel._kfull
+        assert_equal(kfull.shape, (len(ds), len(ds)))
+        for bclf in mclf.clfs:
+            ok_(bclf.clf.kernel._kfull is kfull)
+            self.failIf(bclf.clf.kernel._recomputed)
+        # which is not attached to the template
+        ok_(ck._kfull is None)
+        # and gets released
+        mclf.untrain()
+        assert_equal(len(mclf.clfs), 0)
+
+
     # XXX meta should also work but TODO
     @sweepargs(clf=clfswh['svm', '!meta'])
     def test_svms(self, clf):
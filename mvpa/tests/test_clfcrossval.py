@@ -8,12 +8,20 @@
 ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
 """Unit tests for PyMVPA classifier cross-validation"""
 
+import random
+
 from mvpa.testing.tools import assert_equal, ok_, assert_array_equal
 
 from mvpa.base.node import ChainNode
 from mvpa.generators.partition import NFoldPartitioner
 from mvpa.generators.permutation import AttributePermutator
+from mvpa.generators.resampling import Balancer
 from mvpa.measures.base import CrossValidation
+from mvpa.misc.errorfx import corr_error, mean_mismatch_error
+from mvpa.clfs.gnb import GNB
+from mvpa.clfs.gda import LDA
+from mvpa.clfs.ridge import RidgeReg
+from mvpa.clfs.blr import BLR
 
 from mvpa.testing import *
 from mvpa.testing.datasets import pure_multivariate_signal, get_mv_pattern
@@ -80,6 +88,61 @@ class CrossValidationTests(unittest.TestCase):
         self.failUnless( pmean < 0.58 and pmean > 0.42 )
 
 
+    def test_reuse_stats(self):
+        data = get_mv_pattern(3)
+        # regression targets
+        data.sa['signal'] = data.targets + np.random.normal(size=len(data))
+
+        for clf_, errorfx in ((GNB, mean_mismatch_error),
+                              (LDA, mean_mismatch_error),
+                              (lambda: RidgeReg(space='signal'), corr_error),
+                              (lambda: BLR(space='signal'), corr_error)):
+            for generator in (NFoldPartitioner(), NFoldPartitioner(cvtype=2)):
+                cv = CrossValidation(clf_(), generator, errorfx=errorfx,
+                                     enable_ca=['stats'])
+                clf = clf_()
+                # count the actual statistics computations
+                ncalls = []
+                compute_stats = clf._compute_stats
+                def counted_compute_stats(ds):
+                    ncalls.append(len(ds))
+                    return compute_stats(ds)
+                clf._compute_stats = counted_compute_stats
+                cv_reuse = CrossValidation(clf, generator, errorfx=errorfx,
+                                           reuse_stats=True,
+                                           enable_ca=['stats'])
+                res = cv(data)
+                res_reuse = cv_reuse(data)
+                assert_array_almost_equal(res.samples, res_reuse.samples)
+                assert_array_equal(res.sa.cvfolds, res_reuse.sa.cvfolds)
+                assert_equal(str(cv.ca.stats), str(cv_reuse.ca.stats))
+                # single pass through the data
+                assert_equal(sum(ncalls), len(data))
+                # provider is removed after cross-validation
+                ok_(clf._stats_provider is None)
+
+        # with permuted targets it has to fall back to regular training
+        generator = ChainNode([NFoldPartitioner(),
+                               AttributePermutator('targets', count=2)],
+                              space='partitions')
+        clf = GNB()
+        cv_reuse = CrossValidation(clf, generator, reuse_stats=True)
+        res_reuse = cv_reuse(data)
+        # folds were trained on all but one chunk
+        assert_equal(clf.ca.trained_nsamples, 100)
+        assert_equal(len(res_reuse), 12)
+
+        # random generators yield the same folds as without reusing
+        generator = ChainNode([NFoldPartitioner(),
+                               Balancer(amount=0.8, limit=None, count=2,
+                                        apply_selection=True)],
+                              space='partitions')
+        random.seed(1)
+        res = CrossValidation(GNB(), generator)(data)
+        random.seed(1)
+        res_reuse = CrossValidation(GNB(), generator, reuse_stats=True)(data)
+        assert_array_equal(res.samples, res_reuse.samples)
+
 
 def suite():
     return unittest.makeSuite(CrossValidationTests)
@@ -50,6 +50,11 @@ def test_erdataset():
     assert_equal(len(erds.a.mapper), 2)
     assert_true(isinstance(erds.a.mapper[0], BoxcarMapper))
     assert_true(isinstance(erds.a.mapper[1], FlattenMapper))
+    # regular events could be a view on the input samples
+    erds_view = eventrelated_dataset(ds, evs, view=True)
+    assert_array_equal(erds_view.samples, erds.samples)
+    ok_(np.may_share_memory(erds_view.samples, ds.samples))
+    ok_(not np.may_share_memory(erds.samples, ds.samples))
     #
     # now check the same dataset with event descretization
     tr = 2.5
@@ -90,3 +95,48 @@ def test_erdataset():
                                                nfeatures))
     assert_array_equal(rds.sa.myattr, np.repeat(results.sa.myattr,
                                                expected_nsamples))
+
+
+def test_erdataset_time_conversion():
+    from mvpa.misc.support import value2idx
+    tvec = np.cumsum(np.random.uniform(0.5, 1.5, size=50))
+    ds = dataset_wizard(np.arange(100).reshape(50, 2), targets=1, chunks=1)
+    ds.sa['time'] = tvec
+    # onsets before, in between, exactly at, and halfway between samples
+    onsets = np.concatenate(([tvec[0] - 1, tvec[3], tvec[20] - 0.7],
+                             (tvec[5:30:3] + tvec[6:31:3]) / 2,
+                             np.random.uniform(tvec[0], tvec[-6], size=20)))
+    evs = [{'onset': o, 'duration': 3.1, 'targets': i}
+           for i, o in enumerate(onsets)]
+    for match, strategy in (('prev', 'floor'), ('next', 'ceil'),
+                            ('closest', 'round')):
+        erds = eventrelated_dataset(ds, evs, time_attr='time', match=match)
+        # same as converting each event separately
+        idx = [value2idx(o, tvec, strategy) for o in onsets]
+        duration = [len(tvec[i:][tvec[i:] < o + 3.1])
+                    for i, o in zip(idx, onsets)]
+        assert_array_equal(erds.sa.event_onsetidx, idx)
+        assert_array_equal(erds.sa.orig_offset, onsets - tvec[idx])
+        assert_array_equal(erds.sa.onset, onsets)
+        assert_array_equal(erds.sa.duration, [3.1] * len(onsets))
+        assert_array_equal(erds.sa.targets, np.arange(len(onsets)))
+        assert_equal(erds.a.mapper[0].boxlength, max(duration))
+    # all events need all properties
+    assert_raises(ValueError, eventrelated_dataset, ds,
+                  evs + [{'onset': 3, 'duration': 1}], time_attr='time')
+
+    # time restarting in each run
+    tvec = np.concatenate((np.arange(25) * 2.0, np.arange(25) * 2.0 + 0.5))
+    ds.sa['time'] = tvec
+    onsets = [3.0, 20.4, 40.6]
+    evs = [{'onset': o, 'duration': 3.1} for o in onsets]
+    for match, strategy in (('prev', 'floor'), ('next', 'ceil'),
+                            ('closest', 'round')):
+        erds = eventrelated_dataset(ds, evs, time_attr='time', match=match)
+        idx = [value2idx(o, tvec, strategy) for o in onsets]
+        assert_array_equal(erds.sa.event_onsetidx, idx)
+        assert_array_equal(erds.sa.orig_offset, onsets - tvec[idx])
+        # events do not extend into the next run
+        assert_equal(erds.a.mapper[0].boxlength, 2)
+    # closest samples are in the second run
+    assert_array_equal(erds.sa.event_onsetidx, [26, 35, 45])
@@ -83,6 +83,61 @@ def test_featuregroup_mapper():
     assert_array_equal(mds.sa.chunks, np.arange(3))
 
 
+def test_grouped_reducers():
+    rng = np.random.RandomState(1)
+    ds = Dataset(rng.normal(size=(30, 4)))
+    ds.sa['targets'] = rng.randint(3, size=30)
+    ds.sa['chunks'] = np.repeat(['a', 'b', 'c'], 10)
+    # leave one combination empty
+    ds.sa.targets[(ds.sa.targets == 2) & (ds.sa.chunks == 'b')] = 1
+    ds.fa['roi'] = [2, 0, 2, 1]
+    for fx in (np.sum, np.mean, np.max, np.min, np.std, np.median):
+        for axis, uattrs, data in (('samples', ['targets', 'chunks'], ds),
+                                   ('features', ['roi'], ds),
+                                   ('samples', ['chunks'],
+                                    ds.copy(deep=False, sa=['chunks']))):
+            # wrapping fx into a function makes FxMapper use the generic
+            # implementation
+            generic = FxMapper(axis, lambda x: fx(x), uattrs=uattrs)
+            fast = FxMapper(axis, fx, uattrs=uattrs)
+            gds, fds = generic.forward(data), fast.forward(data)
+            assert_array_almost_equal(fds.samples, gds.samples)
+            for col in ('sa', 'fa'):
+                for attr in getattr(gds, col).keys():
+                    assert_array_equal(getattr(fds, col)[attr].value,
+                                       getattr(gds, col)[attr].value)
+    # integer samples are averaged as floats
+    ids = Dataset(np.arange(12).reshape(6, 2), sa={'chunks': [0, 1] * 3})
+    assert_array_equal(mean_group_sample(['chunks']).forward(ids).samples,
+                       [[4, 5], [6, 7]])
+
+
+def test_axis_fx():
+    ds = Dataset(np.random.normal(size=(7, 11)))
+    ds.fa['roi'] = np.arange(11) % 3
+    for axis, fx, uattrs in (('samples', np.mean, None),
+                             ('samples', sum_of_abs, None),
+                             ('samples', max_of_abs, None),
+                             ('features', np.absolute, None),
+                             ('features', np.median, None),
+                             ('features', np.std, ['roi'])):
+        m = FxMapper(axis, fx, uattrs=uattrs)
+        # same as applying the function to each slice separately
+        ref = FxMapper(axis, lambda x: fx(x), uattrs=uattrs)
+        assert_array_almost_equal(m.forward(ds).samples,
+                                  ref.forward(ds).samples)
+        if uattrs is None:
+            assert_array_almost_equal(m.forward(ds.samples),
+                                      ref.forward(ds.samples))
+    # convenience mappers
+    assert_array_almost_equal(sumofabs_sample().forward(ds).samples,
+                              [np.abs(ds.samples).sum(axis=0)])
+    # extra arguments are passed to each slice
+    m = FxMapper('samples', np.percentile, fxargs=(50,))
+    assert_array_almost_equal(m.forward(ds).samples,
+                              [np.median(ds.samples, axis=0)])
+
+
 def test_fxmapper():
     origdata = np.arange(24).reshape(3,8)
     ds = Dataset(origdata.copy())
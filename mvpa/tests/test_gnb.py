@@ -14,6 +14,7 @@ from mvpa.testing import *
 from mvpa.testing.datasets import *
 
 from mvpa.clfs.gnb import GNB
+from mvpa.clfs.gda import LDA, QDA
 from mvpa.measures.base import TransferMeasure
 from mvpa.generators.splitters import Splitter
 
@@ -56,6 +57,82 @@ class GNBTests(unittest.TestCase):
                         d1 = np.sum(v, axis=1) - 1.0
                         self.failUnless(np.max(np.abs(d1)) < 1e-5)
 
+    def test_gnb_estimates(self):
+        ds = datasets['uni4large']
+        X = ds.samples
+        for cv in (True, False):
+            gnb = GNB(common_variance=cv)
+            gnb.train(ds)
+            # compare against the plain per-class estimates
+            variances = []
+            for il, l in enumerate(ds.UT):
+                Xl = X[ds.targets == l]
+                assert_array_almost_equal(gnb.means[il], Xl.mean(axis=0))
+                variances.append(Xl.var(axis=0))
+                if cv:
+                    variances[-1] = variances[-1] * len(Xl) / len(X)
+            if cv:
+                variances = [np.sum(variances, axis=0)] * len(ds.UT)
+            assert_array_almost_equal(gnb.variances, variances)
+
+            # single precision estimates are close and lead to the same
+            # predictions
+            gnb32 = GNB(common_variance=cv, single_precision=True)
+            gnb32.train(ds)
+            assert_equal(gnb32.means.dtype, np.float32)
+            assert_array_almost_equal(gnb32.means, gnb.means, decimal=4)
+            assert_array_almost_equal(gnb32.variances, gnb.variances,
+                                      decimal=4)
+            assert_array_equal(gnb32.predict(X), gnb.predict(X))
+
+    def test_incremental(self):
+        ds = datasets['uni4large'][:, :10]
+        # part of the classes is missing in the first batch
+        first = np.logical_and(ds.chunks < 3, ds.targets != ds.UT[-1])
+        ds1 = ds[first]
+        ds2 = ds[np.logical_not(first)]
+
+        for clf_ in (lambda: GNB(), lambda: GNB(common_variance=True),
+                     LDA, QDA):
+            clf = clf_()
+            clf.train(ds)
+
+            clf_inc = clf_()
+            # untrained one simply gets trained
+            clf_inc.partial_train(ds1)
+            clf_inc.partial_train(ds2)
+            assert_array_equal(clf_inc.ulabels, clf.ulabels)
+            assert_array_almost_equal(clf_inc.means, clf.means)
+            assert_array_almost_equal(clf_inc.priors, clf.priors)
+            assert_equal(clf_inc.ca.trained_nsamples, ds.nsamples)
+            assert_array_equal(clf_inc.predict(ds), clf.predict(ds))
+            assert_array_almost_equal(clf_inc.ca.estimates, clf.ca.estimates)
+
+            # shards trained independently
+            clf1, clf2 = clf_(), clf_()
+            clf1.train(ds1)
+            clf2.train(ds2)
+            clf1.merge(clf2)
+            assert_array_equal(clf1.predict(ds), clf.predict(ds))
+            assert_array_almost_equal(clf1.ca.estimates, clf.ca.estimates)
+
+            # removal of the batch
+            clf_inc.partial_untrain(ds2)
+            # only conditional attributes describing training data are reset
+            ok_(clf_inc.ca.is_set('predictions'))
+            assert_array_equal(clf_inc.ca.trained_targets, ds1.UT)
+            assert_equal(clf_inc.ca.trained_nsamples, ds1.nsamples)
+            clf1.train(ds1)
+            assert_array_equal(clf_inc.ulabels, clf1.ulabels)
+            assert_array_almost_equal(clf_inc.means, clf1.means)
+            assert_array_equal(clf_inc.predict(ds), clf1.predict(ds))
+            assert_array_almost_equal(clf_inc.ca.estimates, clf1.ca.estimates)
+
+            self.failUnlessRaises(ValueError, clf_inc.partial_untrain, ds2)
+            self.failUnlessRaises(ValueError, clf_inc.partial_train,
+                                  ds[:, :5])
+            self.failUnlessRaises(ValueError, clf_inc.partial_untrain, ds1)
+
 def suite():
     return unittest.makeSuite(GNBTests)
 
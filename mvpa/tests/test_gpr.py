@@ -10,7 +10,7 @@
 
 from mvpa.misc import data_generators
 from mvpa.kernels.np import GeneralizedLinearKernel
-from mvpa.clfs.gpr import GPR
+from mvpa.clfs.gpr import GPR, GPRLinearWeights
 
 from mvpa.testing import *
 from mvpa.testing.tools import assert_array_equal, assert_array_almost_equal
@@ -32,6 +32,124 @@ class GPRTests(unittest.TestCase):
     def test_linear(self):
         pass
 
+    def test_low_rank(self):
+        dataset = data_generators.linear1d_gaussian_noise(size=200)
+        clf = GPR(GeneralizedLinearKernel(), sigma_noise=0.1,
+                  enable_ca=['predicted_variances', 'log_marginal_likelihood'])
+        clf_lr = GPR(GeneralizedLinearKernel(), sigma_noise=0.1, ninducing=20,
+                     enable_ca=['predicted_variances',
+                                'log_marginal_likelihood'])
+        clf.train(dataset)
+        clf_lr.train(dataset)
+        # rank of the linear kernel is lower than the number of inducing
+        # points, so approximation is exact
+        assert_array_almost_equal(clf_lr.predict(dataset.samples),
+                                  clf.predict(dataset.samples), decimal=3)
+        assert_array_almost_equal(clf_lr.ca.log_marginal_likelihood,
+                                  clf.ca.log_marginal_likelihood, decimal=2)
+        # subset-of-regressors underestimates variances
+        ok_(np.all(clf_lr.ca.predicted_variances
+                   <= clf.ca.predicted_variances + 1e-6))
+        ok_(np.all(clf_lr.ca.predicted_variances >= 0.1**2))
+
+        # linear weights are available
+        assert_array_almost_equal(
+            clf_lr.get_sensitivity_analyzer()(dataset).samples,
+            clf.get_sensitivity_analyzer()(dataset).samples, decimal=3)
+        self.failUnlessRaises(ValueError,
+                              clf_lr.compute_gradient_log_marginal_likelihood)
+        self.failUnlessRaises(ValueError,
+                              GPRLinearWeights(clf_lr, enable_ca=['variances'],
+                                               force_train=False),
+                              dataset)
+
+        # non-linear kernel approximates reasonably
+        clf = GPR(sigma_noise=0.1)
+        clf_lr = GPR(sigma_noise=0.1, ninducing=100)
+        clf.train(dataset)
+        clf_lr.train(dataset)
+        ok_(np.corrcoef(clf.predict(dataset.samples),
+                        clf_lr.predict(dataset.samples))[0, 1] > 0.99)
+
+        # too many inducing points -- exact GPR
+        clf_lr = GPR(GeneralizedLinearKernel(), sigma_noise=0.1,
+                     ninducing=1000)
+        clf_lr.train(dataset)
+        ok_(clf_lr._inducing_fv is None)
+
+        # inducing points are reproducible given a seed
+        clf_lr = GPR(sigma_noise=0.1, ninducing=20, seed=3)
+        clf_lr.train(dataset)
+        inducing_fv = clf_lr._inducing_fv
+        clf_lr.train(dataset)
+        assert_array_equal(clf_lr._inducing_fv, inducing_fv)
+        clf_lr.params.seed = 4
+        clf_lr.train(dataset)
+        ok_(np.any(clf_lr._inducing_fv != inducing_fv))
+
+    def test_cache_eigen(self):
+        dataset = data_generators.linear1d_gaussian_noise(size=50)
+        clf = GPR(sigma_noise=0.1, lm=1e-6,
+                  enable_ca=['predicted_variances', 'log_marginal_likelihood'])
+        clf_eig = GPR(sigma_noise=0.1, lm=1e-6, cache_eigen=True,
+                      enable_ca=['predicted_variances',
+                                 'log_marginal_likelihood'])
+        self.failUnlessRaises(RuntimeError,
+                              clf_eig.compute_log_marginal_likelihood_grid,
+                              [0.1])
+        for sigma_noise in (0.1, 0.5):
+            clf.params.sigma_noise = clf_eig.params.sigma_noise = sigma_noise
+            clf.train(dataset)
+            clf_eig.train(dataset)
+            assert_array_almost_equal(clf_eig.predict(dataset.samples),
+                                      clf.predict(dataset.samples))
+            assert_array_almost_equal(clf_eig.ca.predicted_variances,
+                                      clf.ca.predicted_variances)
+            assert_array_almost_equal(clf_eig.ca.log_marginal_likelihood,
+                                      clf.ca.log_marginal_likelihood)
+            lml = clf.ca.log_marginal_likelihood
+        # eigendecomposition was computed only once
+        eigen_cache = clf_eig._eigen_cache
+        clf_eig.train(dataset)
+        ok_(clf_eig._eigen_cache is eigen_cache)
+
+        # whole grid at once
+        grid = clf_eig.compute_log_marginal_likelihood_grid(
+            [0.05, 0.1, 0.5], lm=[0, 1e-6])
+        assert_equal(grid.shape, (3, 2))
+        assert_array_almost_equal(grid[2, 1], lml)
+        ok_(grid[2, 0] != grid[2, 1])
+
+    def test_batched_linear_weights(self):
+        dataset = data_generators.linear1d_gaussian_noise(size=30)
+        dataset.samples = np.hstack((dataset.samples,
+                                     np.random.randn(len(dataset), 2)))
+        perms = np.array([np.random.permutation(dataset.targets)
+                          for i in xrange(5)]).T
+
+        clf = GPR(GeneralizedLinearKernel(), sigma_noise=0.1)
+        sens = GPRLinearWeights(clf, targets=lambda ds: perms)(dataset)
+        assert_equal(sens.shape, (5, 3))
+        # the same as training on each permutation separately
+        for i in xrange(5):
+            ds = dataset.copy()
+            ds.targets = perms[:, i]
+            assert_array_almost_equal(
+                GPRLinearWeights(clf)(ds).samples[0], sens.samples[i])
+
+        # low-rank GPR reuses decomposition for the inducing points
+        clf = GPR(GeneralizedLinearKernel(), sigma_noise=0.1, ninducing=10)
+        sens = GPRLinearWeights(clf, targets=perms)(dataset)
+        assert_equal(sens.shape, (5, 3))
+        for i in xrange(5):
+            ds = dataset.copy()
+            ds.targets = perms[:, i]
+            clf.train(ds)
+            assert_array_almost_equal(clf.compute_alphas(perms)[:, i],
+                                      clf._alpha)
+            assert_array_almost_equal(
+                GPRLinearWeights(clf)(ds).samples[0], sens.samples[i])
+
 
 def suite():
     return unittest.makeSuite(GPRTests)
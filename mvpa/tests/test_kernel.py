@@ -8,6 +8,10 @@
 ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
 """Unit tests for PyMVPA kernels"""
 
+import os
+import shutil
+import tempfile
+from glob import glob
 import numpy as np
 
 from mvpa.testing import *
@@ -19,7 +23,9 @@ from mvpa.clfs.distance import squared_euclidean_distance, \
      pnorm_w, pnorm_w_python
 
 import mvpa.kernels.np as npK
-from mvpa.kernels.base import PrecomputedKernel, CachedKernel
+from mvpa.kernels.base import PrecomputedKernel, CachedKernel, CustomKernel
+from mvpa.kernels.cache import DiskKernelCache
+from mvpa.support.copy import deepcopy
 try:
     import mvpa.kernels.sg as sgK
     _has_sg = True
@@ -112,6 +118,45 @@ class KernelTests(unittest.TestCase):
         self.failUnless((lk._k == 30).all(),
                         "Failure computing LinearKernel")
 
+    def test_blockwise_kernels(self):
+        d1 = np.random.randn(23, 4)
+        d2 = np.random.randn(11, 4)
+        for kclass in (npK.LinearKernel, npK.RbfKernel,
+                       npK.GeneralizedLinearKernel,
+                       npK.SquaredExponentialKernel, npK.Matern_3_2Kernel,
+                       npK.RationalQuadraticKernel):
+            k = kclass()
+            # 3x3 and 2x4 blocks
+            kb = kclass(chunk_mem=8*10)
+            kf = kclass(single_precision=True, chunk_mem=8*10)
+            for args in ((d1,), (d1, d2), (d2, d1)):
+                k.compute(*args)
+                kb.compute(*args)
+                kf.compute(*args)
+                assert_array_almost_equal(kb._k, k._k, decimal=12)
+                assert_array_almost_equal(kf._k, k._k, decimal=4)
+                assert_equal(kf._k.dtype, np.float64)
+            # symmetric one is symmetric
+            kb.compute(d1)
+            assert_array_equal(kb._k, kb._k.T)
+
+        # float32 data still gets accumulated in float64: distances among
+        # points far from the origin would be lost in float32
+        d = (1e3 + np.random.randn(30, 50)).astype(np.float32).astype(float)
+        for kclass in (npK.RbfKernel, npK.SquaredExponentialKernel):
+            k = kclass()
+            kf = kclass(single_precision=True, chunk_mem=8*100)
+            k.compute(d)
+            kf.compute(d)
+            ok_(np.std(k._k) > 0.01)
+            assert_array_almost_equal(kf._k, k._k, decimal=6)
+
+        # gradients get computed on the full kernel only
+        k = npK.GeneralizedLinearKernel(chunk_mem=8*10,
+                                        enable_ca=['gradients'])
+        k.compute(d1)
+        assert_equal(k.ca.gradients['Sigma_p'].shape, (23, 23))
+
     def test_precomputed_kernel(self):
         """Statistic Kernels"""
         d = np.random.randn(50, 50)
@@ -164,6 +209,102 @@ class KernelTests(unittest.TestCase):
                         "CachedKernel did not recompute old data which had\n" +\
                         "previously been computed, but had the cache overriden")
 
+    def test_cached_kernel_copy(self):
+        d = Dataset(np.random.randn(20, 5))
+        ck = CachedKernel(kernel=npK.RbfKernel(sigma=1.5))
+        ok_(not ck.is_cached(d))
+        ck.compute(d)
+        ok_(ck.is_cached(d))
+        ok_(ck.is_cached(d[5:]))
+        ok_(not ck.is_cached(Dataset(np.random.randn(20, 5))))
+
+        # copies share the cache
+        ck2 = deepcopy(ck)
+        ok_(ck2._kfull is ck._kfull)
+        ok_(ck2.is_cached(d))
+        ck2.compute(d[::2])
+        self.failIf(ck2._recomputed)
+        assert_array_equal(ck2._k, ck._kfull[::2, ::2])
+        # but the rest is independent
+        ck2.params.sigma = 3.5
+        ok_(not ck2.is_cached(d))
+        self.failUnlessEqual(ck.params.sigma, 1.5)
+        ck2.compute(d)
+        ok_(ck2._recomputed)
+        ok_(ck2._kfull is not ck._kfull)
+
+    def test_disk_cached_kernel(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            d = Dataset(np.random.randn(20, 5))
+            ncalls = [0]
+            def kernelfunc(a, b):
+                ncalls[0] += 1
+                return np.dot(a, b.T)
+            cache = DiskKernelCache(tempdir)
+
+            ck = CachedKernel(kernel=npK.RbfKernel(sigma=1.5),
+                              disk_cache=cache)
+            ck.compute(d)
+            k = ck._k.copy()
+            # another kernel on the same data reuses stored matrix
+            ck2 = CachedKernel(kernel=npK.RbfKernel(sigma=1.5),
+                               disk_cache=DiskKernelCache(tempdir))
+            ck2.compute(d)
+            ok_(isinstance(ck2._kfull, np.memmap))
+            assert_array_equal(ck2._k, k)
+            ck2.compute(d[::2])
+            assert_array_equal(ck2._k, k[::2, ::2])
+            # but not of a different kernel or data
+            ck2 = CachedKernel(kernel=npK.RbfKernel(sigma=2.5),
+                               disk_cache=cache)
+            ck2.compute(d)
+            self.failIf(isinstance(ck2._kfull, np.memmap))
+            ck2.compute(Dataset(np.random.randn(20, 5)))
+            self.failIf(isinstance(ck2._kfull, np.memmap))
+            assert_equal(len(os.listdir(tempdir)), 3)
+
+            # kernels with the same parameters but different attributes
+            for i in xrange(2):
+                ck = CachedKernel(CustomKernel(kernelfunc=kernelfunc),
+                                  disk_cache=cache)
+                ck.compute(d)
+            assert_equal(ncalls[0], 1)
+            ck = CachedKernel(CustomKernel(kernelfunc=lambda a, b: a),
+                              disk_cache=cache)
+            ck.compute(d)
+            assert_equal(ncalls[0], 1)
+            assert_array_equal(ck._k, d.samples)
+
+            # least recently used matrices get evicted
+            cache.clear()
+            cache.max_bytes = 2 * k.nbytes + 1000
+            for i in xrange(3):
+                CachedKernel(kernel=npK.RbfKernel(sigma=1.5 + i),
+                             disk_cache=cache).compute(d)
+            assert_equal(len(os.listdir(tempdir)), 2)
+            # order of accesses matters even with the same time stamps
+            for filename in glob(os.path.join(tempdir, '*.npy')):
+                os.utime(filename, (0, 0))
+            ck = CachedKernel(kernel=npK.RbfKernel(sigma=2.5),
+                              disk_cache=cache)
+            ck.compute(d)
+            ok_(isinstance(ck._kfull, np.memmap))
+            for filename in glob(os.path.join(tempdir, '*.npy')):
+                os.utime(filename, (0, 0))
+            ck = CachedKernel(kernel=npK.RbfKernel(sigma=1.5),
+                              disk_cache=cache)
+            ck.compute(d)
+            self.failIf(isinstance(ck._kfull, np.memmap))
+            # sigma=3.5 was used least recently
+            ck = CachedKernel(kernel=npK.RbfKernel(sigma=3.5),
+                              disk_cache=cache)
+            ck.compute(d)
+            self.failIf(isinstance(ck._kfull, np.memmap))
+        finally:
+            shutil.rmtree(tempdir, ignore_errors=True)
+
+
     if _has_sg:
         # Unit tests which require shogun kernels
         # Note - there is a loss of precision from double to float32 in SG
@@ -14,7 +14,8 @@ from mvpa.testing import *
 from mvpa.testing.datasets import pure_multivariate_signal
 
 from mvpa.clfs.knn import kNN
-from mvpa.clfs.distance import one_minus_correlation
+from mvpa.clfs.distance import one_minus_correlation, \
+     squared_euclidean_distance, k_nearest_neighbors
 
 class KNNTests(unittest.TestCase):
 
@@ -63,6 +64,72 @@ class KNNTests(unittest.TestCase):
         self.failUnless(clf.ca.distances.fa['chunks'] is train.sa['chunks'])
         self.failUnless(clf.ca.distances.fa.chunks is train.sa.chunks)
 
+    def test_knn_votes(self):
+        train = pure_multivariate_signal( 40, 3 )
+        test = pure_multivariate_signal( 20, 3 )
+        dists = ((test.samples[:, None] - train.samples[None]) ** 2).sum(-1)
+
+        for k in (1, 5, 1000):
+            for voting in ('majority', 'weighted'):
+                clf = kNN(k=k, voting=voting)
+                clf.train(train)
+                p = clf.predict(test.samples)
+                votes = clf.ca.estimates
+                # votes must agree with a plain sort-based selection
+                k_ = min(k, train.nsamples)
+                knns = dists.argsort(axis=1)[:, :k_]
+                counts = np.array([[np.sum(train.targets[knn] == l)
+                                    for l in train.UT] for knn in knns])
+                if voting == 'majority':
+                    assert_array_equal(votes, counts)
+                else:
+                    assert_array_almost_equal(votes / votes.sum(axis=1)[:, None],
+                                              counts / float(k_))
+                assert_array_equal(p, train.UT[np.argmax(votes, axis=1)])
+
+        # with imbalanced classes votes get weighted by class frequency
+        ids = np.r_[np.where(train.targets == train.UT[0])[0],
+                    np.where(train.targets == train.UT[1])[0][:10]]
+        itrain = train[ids]
+        clf = kNN(k=5, voting='weighted')
+        clf.train(itrain)
+        clf.predict(test.samples)
+        knns = dists[:, ids].argsort(axis=1)[:, :5]
+        counts = np.array([[np.sum(itrain.targets[knn] == l)
+                            for l in itrain.UT] for knn in knns])
+        freqs = np.array([np.mean(itrain.targets == l) for l in itrain.UT])
+        assert_array_almost_equal(clf.ca.estimates, counts * (1 - freqs))
+
+        # no test samples -- no predictions
+        assert_equal(len(clf.predict(test.samples[:0])), 0)
+
+    def test_knn_memory_limit(self):
+        train = pure_multivariate_signal( 40, 3 )
+        test = pure_multivariate_signal( 20, 3 )
+        dists = squared_euclidean_distance(train.samples, test.samples).T
+
+        for k in (1, 5, 1000):
+            k_ = min(k, train.nsamples)
+            # tiny limit enforces blocking along both datasets
+            for limit in (None, 1, 1000, 10**9):
+                ids, kdists = k_nearest_neighbors(train.samples, test.samples,
+                                                  k, memory_limit=limit)
+                assert_equal(ids.shape, (test.nsamples, k_))
+                assert_array_almost_equal(np.sort(kdists, axis=1),
+                                          np.sort(dists, axis=1)[:, :k_])
+                assert_array_almost_equal(
+                    kdists, dists[np.arange(len(dists))[:, None], ids])
+
+            clf = kNN(k=k)
+            clf.train(train)
+            clf_blocked = kNN(k=k, memory_limit=100)
+            clf_blocked.train(train)
+            assert_array_equal(clf.predict(test.samples),
+                               clf_blocked.predict(test.samples))
+            assert_array_almost_equal(clf.ca.estimates,
+                                      clf_blocked.ca.estimates)
+
+
 def suite():
     return unittest.makeSuite(KNNTests)
 
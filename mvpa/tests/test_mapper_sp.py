@@ -8,14 +8,20 @@
 ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
 """Unit tests for detrending mapper (requiring SciPy)."""
 
+import os
+import shutil
+import tempfile
+from time import time
 import numpy as np
 
+from mvpa.base import cfg
 from mvpa.testing.tools import *
 
 skip_if_no_external('scipy')
 
 from mvpa.datasets import Dataset, dataset_wizard
-from mvpa.mappers.detrend import PolyDetrendMapper, poly_detrend
+from mvpa.mappers.detrend import PolyDetrendMapper, poly_detrend, \
+     _residualize
 
 def test_polydetrend():
     samples_forwhole = np.array( [[1.0, 2, 3, 4, 5, 6],
@@ -122,3 +128,125 @@ def test_polydetrend():
     # but if done inplace that is no longer true
     poly_detrend(ds, chunks_attr='chunks', polyord=1, space='time')
     assert_array_equal(ds, mds)
+
+
+def _get_blockdiag_regs(chunks, polyord):
+    """Dense design of Legendre polynomials for every chunk"""
+    regs = []
+    for c in np.unique(chunks):
+        polycoords = np.linspace(-1, 1, np.sum(chunks == c))
+        for o in range(polyord + 1):
+            reg = np.zeros(len(chunks))
+            reg[chunks == c] = np.polynomial.legendre.legval(
+                                    polycoords, [0] * o + [1])
+            regs.append(reg)
+    return np.array(regs).T
+
+
+def test_polydetrend_chunkwise():
+    # many chunks, one of them not contiguous
+    chunks = np.repeat(np.arange(10), 20)
+    chunks[[5, 7]] = 9
+    ds = Dataset(np.random.randn(len(chunks), 7) + np.arange(7),
+                 sa={'chunks': chunks})
+    dm = PolyDetrendMapper(chunks_attr='chunks', polyord=2)
+    mds = dm.forward(ds)
+    # no dense design is needed
+    ok_(dm._regs is None)
+
+    # compare to a regression on the full block-diagonal design
+    regs = _get_blockdiag_regs(chunks, 2)
+    target = ds.samples - np.dot(regs, np.linalg.lstsq(regs, ds.samples)[0])
+    assert_array_almost_equal(mds.samples, target)
+
+    # optional regressors need the full design
+    ds.sa['motion'] = np.random.randn(len(ds))
+    dm = PolyDetrendMapper(chunks_attr='chunks', polyord=2,
+                           opt_regs=['motion'])
+    mds = dm.forward(ds)
+    ok_(dm._chunk_regs is None)
+    regs = np.hstack((regs, ds.sa.motion[:, None]))
+    target = ds.samples - np.dot(regs, np.linalg.lstsq(regs, ds.samples)[0])
+    assert_array_almost_equal(mds.samples, target)
+
+    # in-place with integer data
+    ds = Dataset(np.arange(40).reshape(20, 2), sa={'chunks': chunks[::10]})
+    poly_detrend(ds, chunks_attr='chunks', polyord=0)
+    ok_(np.issubdtype(ds.samples.dtype, np.floating))
+    assert_array_almost_equal(ds.samples[chunks[::10] == 0].sum(axis=0), 0)
+
+
+def test_polydetrend_chunkwise_speedup():
+    # benchmark against regression on the dense block-diagonal design
+    # (how chunks were detrended before)
+    chunks = np.repeat(np.arange(40), 150)
+    ds = Dataset(np.random.randn(len(chunks), 500), sa={'chunks': chunks})
+
+    t0 = time()
+    regs = _get_blockdiag_regs(chunks, 2)
+    target = ds.samples - np.dot(regs, np.linalg.lstsq(regs, ds.samples)[0])
+    dense_time = time() - t0
+
+    t0 = time()
+    mds = PolyDetrendMapper(chunks_attr='chunks', polyord=2).forward(ds)
+    chunkwise_time = time() - t0
+
+    assert_array_almost_equal(mds.samples, target)
+    if cfg.getboolean('tests', 'labile', default='yes'):
+        ok_(chunkwise_time < dense_time,
+            msg="Chunk-wise detrending took %.2fs while regression on the "
+                "dense design took %.2fs" % (chunkwise_time, dense_time))
+
+
+def test_polydetrend_reuse():
+    ds = Dataset(np.random.randn(50, 30) + np.arange(50)[:, None])
+    dm = PolyDetrendMapper(polyord=2)
+    mds = dm.forward(ds)
+    # trained basis is reused for any dataset of the same structure
+    ds2 = Dataset(np.random.randn(50, 30))
+    assert_array_almost_equal(dm.forward(ds2),
+                              PolyDetrendMapper(polyord=2).forward(ds2))
+    assert_array_equal(dm.forward(ds), mds)
+
+    # processing in feature blocks makes no difference
+    samples = ds.samples.copy()
+    _residualize(samples, dm._basis, nbytes=8 * 50 * 7)
+    assert_array_almost_equal(samples, mds.samples)
+
+    # in-place keeps the samples array and its dtype
+    ds = Dataset(ds.samples.astype('float32'))
+    samples = ds.samples
+    poly_detrend(ds, polyord=2)
+    ok_(ds.samples is samples)
+    assert_equal(ds.samples.dtype, np.float32)
+    assert_array_almost_equal(ds.samples, mds.samples, decimal=4)
+
+
+def test_polydetrend_memmapped():
+    tempdir = tempfile.mkdtemp()
+    try:
+        samples = np.cumsum(np.random.normal(size=(60, 23)), axis=0)
+        infile = os.path.join(tempdir, 'in.npy')
+        np.save(infile, samples)
+        chunks = np.repeat(np.arange(3), 20)
+        for chunks_attr, opt_regs in ((None, None), ('chunks', None),
+                                      ('chunks', ['motion'])):
+            ds = dataset_wizard(np.load(infile, mmap_mode='r'),
+                                chunks=chunks)
+            ds.sa['motion'] = np.random.normal(size=60)
+            target = PolyDetrendMapper(polyord=2, chunks_attr=chunks_attr,
+                                       opt_regs=opt_regs).forward(ds)
+            outfile = os.path.join(tempdir, 'out.npy')
+            # few features per block
+            dm = PolyDetrendMapper(polyord=2, chunks_attr=chunks_attr,
+                                   opt_regs=opt_regs,
+                                   block_bytes=8 * 60 * 5, outfile=outfile)
+            mds = dm.forward(ds)
+            ok_(isinstance(mds.samples, np.memmap))
+            assert_array_almost_equal(mds.samples, target.samples)
+            # source is untouched and result is on disk
+            assert_array_equal(ds.samples, samples)
+            del mds
+            assert_array_almost_equal(np.load(outfile), target.samples)
+    finally:
+        shutil.rmtree(tempdir)
@@ -8,7 +8,8 @@
 ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
 """Unit tests for PyMVPA ridge regression classifier"""
 
-from mvpa.clfs.ridge import RidgeReg
+from mvpa.clfs.ridge import RidgeReg, MultiRidgeReg
+from mvpa.datasets.base import Dataset
 from scipy.stats import pearsonr
 from mvpa.testing import *
 from mvpa.testing.datasets import datasets
@@ -53,6 +54,74 @@ class RidgeRegTests(unittest.TestCase):
 
         self.failUnless((p == clf.ca.predictions).all())
 
+    def test_ridge_reg_incremental(self):
+        data = datasets['dumb']
+        clf = RidgeReg(lm=0.5)
+        ncalls = []
+        compute_stats = clf._compute_stats
+        def counted_compute_stats(ds):
+            ncalls.append(len(ds))
+            return compute_stats(ds)
+        clf._compute_stats = counted_compute_stats
+
+        # regular training does not compute statistics
+        clf.train(data[:6])
+        assert_equal(ncalls, [])
+        # but they get computed once needed
+        clf.partial_train(data[6:])
+        assert_equal(ncalls, [6, len(data) - 6])
+        clf_full = RidgeReg(lm=0.5)
+        clf_full.train(data)
+        assert_array_almost_equal(clf.w, clf_full.w)
+
+        clf_full.partial_untrain(data[6:])
+        clf.train(data[:6])
+        assert_array_almost_equal(clf_full.w, clf.w)
+
+    def test_multi_ridge_reg(self):
+        rs = np.random.RandomState(1)
+        design = rs.randn(40, 3)
+        w = rs.randn(3, 25)
+        ds = Dataset(np.dot(design, w) + 2 + 0.1 * rs.randn(40, 25),
+                     sa={'design': design})
+        # some features are just noise
+        ds.samples[:, :5] = 10 * rs.randn(40, 5)
+
+        res = MultiRidgeReg(lms=[0.1])(ds)
+        assert_equal(res.shape, (3, 25))
+        assert_array_equal(res.sa.regressors, np.arange(3))
+        # the same as separate regressions
+        for i in (0, 10, 24):
+            clf = RidgeReg(lm=0.1)
+            clf.train(Dataset(design, sa={'targets': ds.samples[:, i]}))
+            assert_array_almost_equal(res.samples[:, i], clf.w[:3])
+            assert_almost_equal(res.fa.intercept[i], clf.w[3])
+
+        # selection of penalty terms
+        lms = np.array([0.01, 3, 100])
+        res = MultiRidgeReg(lms=lms)(ds)
+        # GCV computed directly from the hat matrices
+        x = np.hstack((design, np.ones((40, 1))))
+        gcv = []
+        for lm in lms:
+            penalty = np.diag([lm ** 2] * 3 + [0])
+            hat = np.dot(x, np.linalg.solve(np.dot(x.T, x) + penalty, x.T))
+            rss = ((ds.samples - np.dot(hat, ds.samples)) ** 2).sum(axis=0)
+            gcv.append(rss / (40 - np.trace(hat)) ** 2)
+        assert_array_equal(res.fa.lm, lms[np.argmin(gcv, axis=0)])
+        ok_(np.all(res.fa.lm[5:] < 100))
+        assert_array_almost_equal(res.samples[:, 5:], w[:, 5:], decimal=1)
+
+    def test_multi_ridge_reg_few_samples(self):
+        # 3 samples leave 2 components of the centered design
+        design = np.random.randn(3, 5)
+        ds = Dataset(np.random.randn(3, 4), sa={'design': design})
+        # no penalty leaves no degrees of freedom
+        self.failUnlessRaises(ValueError, MultiRidgeReg(lms=[0]), ds)
+        res = MultiRidgeReg(lms=[0, 100])(ds)
+        assert_array_equal(res.fa.lm, 100)
+        ok_(np.all(np.isfinite(res.samples)))
+
 
 def suite():
     return unittest.makeSuite(RidgeRegTests)
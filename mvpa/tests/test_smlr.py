@@ -13,7 +13,10 @@ import numpy as np
 from mvpa.testing import *
 from mvpa.testing.datasets import datasets
 
-from mvpa.clfs.smlr import SMLR
+from mvpa.datasets.base import Dataset
+from mvpa.clfs.smlr import SMLR, SMLRPathCrossValidation
+from mvpa.generators.partition import NFoldPartitioner
+from mvpa.measures.base import CrossValidation
 from mvpa.misc.data_generators import normal_feature_dataset
 
 
@@ -68,6 +71,99 @@ class SMLRTests(unittest.TestCase):
         self.failUnless(sens.shape == (len(data.UT) - 1, data.nfeatures))
 
 
+    def test_smlr_lm_path(self):
+        data = normal_feature_dataset(perlabel=10, nlabels=3, nfeatures=10,
+                                      nchunks=5, snr=3)
+        lms = [0.1, 10.0, 1.0]
+        for impl in ('C', 'Python'):
+            clf = SMLR(implementation=impl, convergence_tol=1e-6, seed=1)
+            path = clf.get_lm_path(data, lms)
+            ok_(not clf.trained)
+            assert_equal(path.shape, (3, data.nfeatures + 1, 3))
+            for lm, w in zip(lms, path):
+                clf_lm = SMLR(implementation=impl, convergence_tol=1e-6,
+                              seed=1, lm=lm)
+                clf_lm.train(data)
+                assert_array_almost_equal(w[:-1], clf_lm.weights, decimal=3)
+                assert_array_almost_equal(w[-1], clf_lm.biases, decimal=3)
+            # more penalty -- more sparsity
+            nonzero = (path != 0).sum(axis=1).sum(axis=1)
+            ok_(nonzero[1] <= nonzero[2] <= nonzero[0])
+
+            # unsparsified weights along the path
+            clf = SMLR(implementation=impl, convergence_tol=1e-6, seed=1,
+                       unsparsify=True)
+            upath = clf.get_lm_path(data, lms)
+            for lm, w in zip(lms, upath):
+                clf_lm = SMLR(implementation=impl, convergence_tol=1e-6,
+                              seed=1, lm=lm, unsparsify=True)
+                clf_lm.train(data)
+                assert_array_almost_equal(w[:-1], clf_lm.weights, decimal=3)
+
+        clf = SMLR(convergence_tol=1e-6, seed=1)
+        cvp = SMLRPathCrossValidation(clf, NFoldPartitioner(), lms,
+                                      enable_ca=['weights'])
+        res = cvp(data)
+        assert_equal(res.shape, (5, 3))
+        assert_array_equal(res.fa.lm, lms)
+        assert_equal(len(cvp.ca.weights), 5)
+        ok_(cvp.ca.best_lm in lms)
+        for lm, errors in zip(lms, res.samples.T):
+            cv = CrossValidation(SMLR(convergence_tol=1e-6, seed=1, lm=lm),
+                                 NFoldPartitioner())
+            assert_array_almost_equal(cv(data).samples[:, 0], errors)
+
+
+    def test_smlr_data_layouts(self):
+        data = normal_feature_dataset(perlabel=10, nlabels=3, nfeatures=10,
+                                      nchunks=5, snr=3)
+        def train(impl, samples, has_bias=True, convergence_tol=1e-6):
+            clf = SMLR(implementation=impl, convergence_tol=convergence_tol,
+                       seed=1, has_bias=has_bias)
+            clf.train(Dataset(samples, sa=data.sa.copy()))
+            return clf
+
+        for has_bias in (True, False):
+            clf = train('C', data.samples, has_bias)
+            clf_py = train('Python', data.samples, has_bias)
+            assert_array_almost_equal(clf.weights, clf_py.weights, decimal=3)
+            # Fortran-ordered and non-contiguous data
+            for samples in (np.asfortranarray(data.samples),
+                            np.repeat(data.samples, 2, axis=1)[:, ::2]):
+                assert_array_almost_equal(
+                    train('C', samples, has_bias).weights, clf.weights,
+                    decimal=3)
+            # integer data gets converted (tight convergence is not
+            # reachable for all such data)
+            isamples = np.round(data.samples * 10).astype(int)
+            assert_array_almost_equal(
+                train('C', isamples, has_bias, 1e-3).weights,
+                train('C', isamples.astype(float), has_bias, 1e-3).weights)
+            # single precision gets processed without upcasting the data
+            clf32 = train('C', data.samples.astype(np.float32), has_bias)
+            assert_array_almost_equal(clf32.weights, clf.weights, decimal=2)
+            if has_bias:
+                assert_array_almost_equal(clf32.biases, clf.biases,
+                                          decimal=2)
+            assert_array_equal(clf32.predict(data.samples),
+                               clf.predict(data.samples))
+
+
+    def test_smlr_nthreads(self):
+        # enough samples to get split across multiple blocks
+        data = normal_feature_dataset(perlabel=150, nlabels=4, nfeatures=10,
+                                      nchunks=5, snr=3)
+        weights = []
+        for nthreads in (1, 2, 3, None):
+            clf = SMLR(implementation='C', convergence_tol=1e-6, seed=1,
+                       nthreads=nthreads)
+            clf.train(data)
+            weights.append(clf.weights)
+        # exactly the same results regardless of the number of threads
+        for w in weights[1:]:
+            assert_array_equal(w, weights[0])
+
+
 def suite():
     return unittest.makeSuite(SMLRTests)
 
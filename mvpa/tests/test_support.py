@@ -100,6 +100,28 @@ class SupportFxTests(unittest.TestCase):
                              [0, 3, 6, 8])
 
 
+    def test_parallel_map(self):
+        args = range(20)
+        for nthreads in (1, 3, None):
+            self.failUnlessEqual(parallel_map(lambda x: x**2, args, nthreads),
+                                 [x**2 for x in args])
+            # generators are fine as well
+            self.failUnlessEqual(
+                parallel_map(lambda x: -x, iter(args), nthreads),
+                [-x for x in args])
+            self.failUnlessEqual(parallel_map(abs, [], nthreads), [])
+
+        def fail_odd(x):
+            if x % 2:
+                raise ValueError(x)
+        try:
+            parallel_map(fail_odd, args, nthreads=4)
+            self.fail("Exception should have been re-raised")
+        except ValueError, e:
+            # first one in the order of args
+            self.failUnlessEqual(e.args, (1,))
+
+
     def test_map_overlap(self):
         mo = MapOverlap()
 
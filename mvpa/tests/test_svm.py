@@ -8,13 +8,16 @@
 ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ### ##
 """Unit tests for SVM classifier"""
 
+import random
 import numpy as np
 
 from mvpa.testing import *
 from mvpa.testing.clfs import *
 from mvpa.testing.datasets import *
 
+from mvpa.base.node import ChainNode
 from mvpa.generators.partition import NFoldPartitioner
+from mvpa.generators.resampling import Balancer
 from mvpa.datasets.miscfx import get_nsamples_per_attr
 from mvpa.clfs.meta import ProxyClassifier
 from mvpa.measures.base import CrossValidation
@@ -158,6 +161,54 @@ class SVMTests(unittest.TestCase):
 
 
 
+    def test_cpath_crossvalidation(self):
+        skip_if_no_external('libsvm')
+        from mvpa.clfs.libsvmc.cpath import CPathCrossValidation
+        from mvpa.kernels.libsvm import RbfLSKernel
+
+        ds = datasets['uni2medium']
+        Cs = [-10.0, 0.01, 1.0]
+        for clf in (libsvm.SVM(), libsvm.SVM(kernel=RbfLSKernel())):
+            cpcv = CPathCrossValidation(clf, NFoldPartitioner(), Cs)
+            res = cpcv(ds)
+            assert_equal(res.shape, (len(ds.UC), len(Cs)))
+            assert_array_equal(res.fa.C, Cs)
+            # must match plain cross-validation for every C
+            for i, C in enumerate(Cs):
+                clf_ = clf.clone()
+                clf_.params.C = C
+                cv = CrossValidation(clf_, NFoldPartitioner())
+                assert_array_almost_equal(res.samples[:, i],
+                                          cv(ds).samples[:, 0])
+            assert_true(cpcv.ca.best_C in Cs)
+
+        # generators might subsample datasets
+        gen = ChainNode([NFoldPartitioner(),
+                         Balancer(amount=0.6, limit=None,
+                                  apply_selection=True)],
+                        space='partitions')
+        clf = libsvm.SVM()
+        random.seed(3)
+        res = CPathCrossValidation(clf, gen, Cs)(ds)
+        for i, C in enumerate(Cs):
+            clf_ = clf.clone()
+            clf_.params.C = C
+            random.seed(3)
+            assert_array_almost_equal(
+                res.samples[:, i],
+                CrossValidation(clf_, gen)(ds).samples[:, 0])
+
+        # only LIBSVM SVMs with C are supported
+        assert_raises(ValueError, CPathCrossValidation,
+                      libsvm.SVM(svm_impl='NU_SVC'), NFoldPartitioner(), Cs)
+        # per-class C values and weights are not supported
+        assert_raises(ValueError, CPathCrossValidation,
+                      libsvm.SVM(C=[1.0, 2.0]), NFoldPartitioner(), Cs)
+        assert_raises(ValueError, CPathCrossValidation,
+                      libsvm.SVM(weight=[1.0, 2.0], weight_label=[0, 1]),
+                      NFoldPartitioner(), Cs)
+
+
     def test_sillyness(self):
         """Test if we raise exceptions on incorrect specifications
         """
@@ -9,6 +9,10 @@
 """Unit tests for PyMVPA ZScore mapper"""
 
 
+import os
+import shutil
+import tempfile
+
 from mvpa.base import externals
 
 from mvpa.support.copy import deepcopy
@@ -137,3 +141,124 @@ def test_zscore():
     zm = ZScoreMapper(params={0: (2,1), 1: (12,1)})
     zm.train(ds)                        # train
     assert_array_almost_equal(zm.forward(ds), np.transpose([check + check]))
+
+
+def test_zscore_chunks_grouped():
+    # contiguous and interleaved chunks must give identical results to a
+    # plain per-chunk z-scoring
+    rng = np.random.RandomState(3)
+    samples = rng.normal(size=(60, 7)) * 3 + 100
+    samples[:, 2] = 5                   # invariant feature
+    chunks = np.repeat(np.arange(4), 15)
+    targets = np.tile(np.arange(3), 20)
+    for order in (np.arange(60), rng.permutation(60)):
+        for dtype in ('float64', 'float32'):
+            ds = dataset_wizard(samples[order].astype(dtype),
+                                targets=targets[order], chunks=chunks[order])
+            for param_est in (None, ('targets', [0, 2])):
+                zm = ZScoreMapper(param_est=param_est)
+                zm.train(ds)
+                orig = ds.samples.copy()
+                zds = zm.forward(ds)
+                assert_equal(zds.samples.dtype, np.dtype(dtype))
+                # source must stay intact
+                assert_array_equal(ds.samples, orig)
+                target = orig.astype('float64')
+                for c in range(4):
+                    sel = ds.sa.chunks == c
+                    est = sel.copy()
+                    if param_est is not None:
+                        est &= ds.sa.targets != 1
+                    mean = target[est].mean(axis=0)
+                    std = target[est].std(axis=0)
+                    std[std == 0] = 1
+                    target[sel] = (target[sel] - mean) / std
+                assert_array_almost_equal(zds.samples, target,
+                                          decimal=dtype == 'float32' and 4
+                                                  or 10)
+
+    # scalar params per chunk on interleaved chunks, including zero std
+    ds = dataset_wizard(np.arange(8, dtype='float64').reshape(4, 2),
+                        targets=1, chunks=[0, 1, 0, 1])
+    zm = ZScoreMapper(params={0: (1, 2), 1: (0, 0)})
+    zm.train(ds)
+    assert_array_almost_equal(zm.forward(ds).samples,
+                              [[-0.5, 0], [0, 0], [1.5, 2], [0, 0]])
+    # chunk without parameters
+    zm = ZScoreMapper(params={0: (1, 2)})
+    zm.train(ds)
+    assert_raises(RuntimeError, zm.forward, ds)
+
+
+def test_zscore_chunks_custom():
+    # derived classes with custom estimates or z-scoring are respected
+    # chunk-wise as well
+    class RobustZScoreMapper(ZScoreMapper):
+        def _compute_params(self, samples):
+            return (np.median(samples, axis=0), np.ones(samples.shape[1]))
+
+    class ShiftingZScoreMapper(ZScoreMapper):
+        def _zscore(self, samples, mean, std):
+            samples -= mean + 1
+            return samples
+
+    rng = np.random.RandomState(4)
+    samples = rng.normal(size=(30, 3))
+    chunks = rng.permutation(np.repeat(np.arange(3), 10))
+    ds = dataset_wizard(samples, targets=1, chunks=chunks)
+    medians = [np.median(samples[chunks == c], axis=0) for c in range(3)]
+    means = [np.mean(samples[chunks == c], axis=0) for c in range(3)]
+
+    zm = RobustZScoreMapper(block_bytes=8 * 30 * 2)
+    zm.train(ds)
+    zds = zm.forward(ds)
+    for c in range(3):
+        assert_array_almost_equal(zds.samples[chunks == c],
+                                  samples[chunks == c] - medians[c])
+    zm = ShiftingZScoreMapper()
+    zm.train(ds)
+    zds = zm.forward(ds)
+    for c in range(3):
+        assert_array_almost_equal(zds.samples[chunks == c],
+                                  samples[chunks == c] - means[c] - 1)
+
+
+def test_zscore_memmapped():
+    tempdir = tempfile.mkdtemp()
+    try:
+        rng = np.random.RandomState(5)
+        samples = rng.normal(size=(40, 23)).astype('float32') * 4 + 10
+        infile = os.path.join(tempdir, 'in.npy')
+        np.save(infile, samples)
+        chunks = np.repeat(np.arange(4), 10)
+        for chunks, param_est in ((chunks, None),
+                                  (rng.permutation(chunks), None),
+                                  (chunks, ('targets', [1]))):
+            for chunks_attr in ('chunks', None):
+                ds = dataset_wizard(np.load(infile, mmap_mode='r'),
+                                    targets=np.arange(40) % 2,
+                                    chunks=chunks)
+                zm = ZScoreMapper(chunks_attr=chunks_attr,
+                                  param_est=param_est)
+                zm.train(ds)
+                target = zm.forward(ds)
+                outfile = os.path.join(tempdir, 'out.npy')
+                # few features per block
+                zmb = ZScoreMapper(chunks_attr=chunks_attr,
+                                   param_est=param_est,
+                                   block_bytes=8 * 40 * 5, outfile=outfile)
+                zmb.train(ds)
+                zds = zmb.forward(ds)
+                ok_(isinstance(zds.samples, np.memmap))
+                assert_equal(zds.samples.dtype, np.float32)
+                assert_array_almost_equal(zds.samples, target.samples)
+                # source is untouched and result is on disk
+                assert_array_equal(ds.samples, samples)
+                del zds
+                assert_array_almost_equal(np.load(outfile), target.samples)
+        # per-feature parameters must match the number of features
+        zm = ZScoreMapper(params=(np.zeros(25), 1), block_bytes=8 * 40 * 5)
+        zm.train(ds)
+        assert_raises(RuntimeError, zm.forward, ds)
+    finally:
+        shutil.rmtree(tempdir)
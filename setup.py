@@ -50,6 +50,19 @@ if sys.argv.count('--no-libsvm'):
     sys.argv.remove('--no-libsvm')
     bind_libsvm = None
 
+# multi-threaded SMLR is built with OpenMP unless disabled explicitly
+# (not supported by default compilers on Mac and Windows)
+smlrc_openmp = not sys.platform in ('darwin', 'win32')
+if sys.argv.count('--no-openmp'):
+    sys.argv.remove('--no-openmp')
+    smlrc_openmp = False
+
+smlrc_extra_compile_args = []
+smlrc_extra_link_args = list(extra_link_args)
+if smlrc_openmp:
+    smlrc_extra_compile_args.append('-fopenmp')
+    smlrc_extra_link_args.append('-fopenmp')
+
 # if requested:
 if bind_libsvm == 'local':
     # we will provide libsvm sources later on # if libsvm.a is available locally -- use it
@@ -94,7 +107,8 @@ smlrc_ext = Extension(
     #library_dirs = library_dirs,
     libraries = ['m'],
     # extra_compile_args = ['-O0'],
-    extra_link_args = extra_link_args,
+    extra_compile_args = smlrc_extra_compile_args,
+    extra_link_args = smlrc_extra_link_args,
     language = 'c')
 
 ext_modules = [smlrc_ext]